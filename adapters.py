@@ -2,7 +2,8 @@ import os, hmac, hashlib, requests, time
 from typing import Tuple, Optional
 
 # ✅ 公開 REST 統一走 _rest_json（含 202/429/5xx 退避與多 host 輪詢）
-from utils import _rest_json, now_ts_ms, SESSION, TIME_OFFSET_MS, ws_best_price, EXCHANGE_INFO
+from utils import _rest_json, now_ts_ms, SESSION, TIME_OFFSET_MS, ws_best_price, EXCHANGE_INFO, rest_call
+from rate_limiter import endpoint_weight
 
 # ✅ 這兩個常數要從 config 匯入（不是 utils）
 from config import USE_TESTNET, ORDER_TIMEOUT_SEC, BINANCE_FUTURES_BASE, BINANCE_FUTURES_TEST_BASE
@@ -14,8 +15,10 @@ except NameError:
 
 try:
     from ws_client import ws_best_price as _ws_best_price
+    from ws_client import ws_exec_price as _ws_exec_price
 except Exception:
     _ws_best_price = None
+    _ws_exec_price = None
 
 def _public_get_json(path: str, params=None, timeout=5, tries=3):
     """
@@ -47,6 +50,17 @@ class SimAdapter:
         price = float(data.get("price"))
         return price  # ✅ 修正：不要再回 r.json()
 
+    def exit_price(self, symbol: str, side: str) -> float:
+        """平倉可成交價：LONG 平倉吃 bid、SHORT 平倉吃 ask；最佳買賣價過期時退回 best_price"""
+        if _ws_exec_price:
+            try:
+                p = _ws_exec_price(symbol, "SELL" if side == "LONG" else "BUY")
+                if p is not None:
+                    return float(p)
+            except Exception:
+                pass
+        return self.best_price(symbol)
+
     def place_bracket(self, symbol, side, qty, entry, sl, tp):
         self.open = {"symbol": symbol, "side": side, "qty": qty,
                      "entry": entry, "sl": sl, "tp": tp}
@@ -56,7 +70,7 @@ class SimAdapter:
         if not self.open:
             return False, None, None
         try:
-            p = self.best_price(self.open["symbol"])
+            p = self.exit_price(self.open["symbol"], self.open["side"])
         except Exception:
             return False, None, None
         side = self.open["side"]
@@ -89,7 +103,7 @@ class SimAdapter:
 
         approx_exit_price = entry
         try:
-            approx_exit_price = self.best_price(symbol)
+            approx_exit_price = self.exit_price(symbol, side)
         except Exception:
             pass
 
@@ -140,21 +154,27 @@ class LiveAdapter:
         params["timestamp"] = now_ts_ms() + int(TIME_OFFSET_MS)
         params.setdefault("recvWindow", 60000)
         qs = self._sign(params)
-        r = SESSION.post(f"{self.base}{path}?{qs}",
-                         headers={"X-MBX-APIKEY": self.key}, timeout=10)
+        r = rest_call("POST", f"{self.base}{path}?{qs}", endpoint_weight(path, params),
+                      headers={"X-MBX-APIKEY": self.key}, timeout=10)
         if not r.ok:
             print(f"[API ERROR] POST {path} returned {r.status_code}")
             print(f"Server msg: {r.text}")
         r.raise_for_status()
         return r.json()
 
-    def _get(self, path, params):
+    def _get(self, path, params, tries: int = 3):
+        """簽名 GET（冪等）：5xx 退避後重送，每次都重新簽名並經 rest_call 計權重；POST/DELETE 不重送（5xx 時結果未知）"""
         params = dict(params or {})
-        params["timestamp"] = now_ts_ms() + int(TIME_OFFSET_MS)
         params.setdefault("recvWindow", 60000)
-        qs = self._sign(params)
-        r = SESSION.get(f"{self.base}{path}?{qs}",
-                        headers={"X-MBX-APIKEY": self.key}, timeout=10)
+        for attempt in range(tries):
+            params["timestamp"] = now_ts_ms() + int(TIME_OFFSET_MS)
+            qs = self._sign(params)
+            r = rest_call("GET", f"{self.base}{path}?{qs}", endpoint_weight(path, params),
+                          headers={"X-MBX-APIKEY": self.key}, timeout=10)
+            if r.status_code < 500 or attempt == tries - 1:
+                break
+            print(f"[API ERROR] {path} returned {r.status_code}, retrying ({attempt + 1}/{tries - 1})...")
+            time.sleep(0.4 * 2 ** attempt)
         if not r.ok:
             print(f"[API ERROR] {path} returned {r.status_code}")
             print(f"Server msg: {r.text}")
@@ -166,8 +186,8 @@ class LiveAdapter:
         params["timestamp"] = now_ts_ms() + int(TIME_OFFSET_MS)
         params.setdefault("recvWindow", 60000)
         qs = self._sign(params)
-        r = SESSION.delete(f"{self.base}{path}?{qs}",
-                           headers={"X-MBX-APIKEY": self.key}, timeout=10)
+        r = rest_call("DELETE", f"{self.base}{path}?{qs}", endpoint_weight(path, params),
+                      headers={"X-MBX-APIKEY": self.key}, timeout=10)
         if not r.ok:
             print(f"[API ERROR] DELETE {path} returned {r.status_code}")
             print(f"Server msg: {r.text}")
@@ -196,20 +216,20 @@ class LiveAdapter:
         order_side = "BUY" if side == "LONG" else "SELL"
 
         # 從緩存獲取該幣種的精度
-        try:
-            prec = EXCHANGE_INFO[symbol]
-            qty_prec = prec['quantityPrecision']
-            price_prec = prec['pricePrecision']
-        except KeyError:
-            qty_prec, price_prec = 0, 4  # Fallback
+        # 下單字串直接由整數格線產生（輸入已對齊時結果就是該值，不經 f"{x:.nf}" 的 float 捨入）
+        rule = EXCHANGE_INFO.get(symbol)
+        if rule is not None:
+            fmt_qty, fmt_price = rule.qty_grid.format, rule.price_grid.format
+        else:
+            fmt_qty, fmt_price = (lambda v: f"{v:.0f}"), (lambda v: f"{v:.4f}")  # Fallback
 
         entry_params = {
             "symbol": symbol,
             "side": order_side,
             "type": "LIMIT",
             "timeInForce": "GTC",
-            "quantity": f"{qty:.{qty_prec}f}",
-            "price": f"{entry:.{price_prec}f}",
+            "quantity": fmt_qty(qty),
+            "price": fmt_price(entry),
             "newClientOrderId": f"entry_{int(time.time())}"
         }
         entry_res = self._post("/fapi/v1/order", entry_params)
@@ -237,7 +257,7 @@ class LiveAdapter:
             "symbol": symbol,
             "side": exit_side,
             "type": "TAKE_PROFIT_MARKET",
-            "stopPrice": f"{tp:.{price_prec}f}",
+            "stopPrice": fmt_price(tp),
             "closePosition": "true",
             "workingType": "CONTRACT_PRICE"
         })
@@ -245,7 +265,7 @@ class LiveAdapter:
             "symbol": symbol,
             "side": exit_side,
             "type": "STOP_MARKET",
-            "stopPrice": f"{sl:.{price_prec}f}",
+            "stopPrice": fmt_price(sl),
             "closePosition": "true",
             "workingType": "CONTRACT_PRICE"
         })
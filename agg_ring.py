@@ -0,0 +1,236 @@
+# file: agg_ring.py
+"""
+逐筆成交（aggTrade）的固定容量欄式環形緩衝：取代每筆一個 tuple 的 deque。
+
+- 四條 typed array：ts（int64 ms）、price / qty（float64）、side（int8，1=taker 買、0=taker 賣）
+- 與 bar_buffer.BarRing 相同的鏡像寫法（slot 與 slot+capacity 各寫一份）→ 任何「最近 n 筆」
+  都是一段連續記憶體，可直接回傳 memoryview
+- since(ts_ms)：在 ts 欄上 bisect 找起點，回傳 ts >= ts_ms 的零複製視窗；ts 須非遞減，
+  亂序到達的成交時間會被抬到目前最後一筆（aggTrade 的 T 本來就單調）
+- 記憶體固定：每格 2 *（8+8+8+1）= 50 bytes；容量 6000 → 每個 symbol 約 293 KiB，
+  300 個 symbol 約 86 MiB 上限（tuple + deque 版滿載約 3 倍，見 tools/bench_agg_ring.py）
+- 讀取端持有的視窗在之後 capacity - len(視窗) 次 append 內不會被覆寫
+- window_ms > 0：寫入時同步維護「最近 window_ms 內」的買/賣量與 px*qty 累計（過期或即將被覆寫的
+  成交在 append 時扣掉），window_sums() 讀取為 O(1)（只補扣上一筆之後才過期的少數成交）；
+  每 capacity 筆整段重算一次，避免加減累積浮點誤差
+- 發布：每次 append 寫完陣列後，以「一次 tuple 指派」發布 (seq, last_ts, 視窗累計)；讀取端只看這個
+  tuple，不會看到寫到一半的成交。snapshot() 依發布的 seq 複製視窗，複製完再確認寫入端沒有繞回
+  覆寫（seqlock 式檢查，被覆寫就重讀），回傳唯讀複本 + 同一 seq 的累計；讀取端不需要鎖
+"""
+from array import array
+from bisect import bisect_left
+from typing import NamedTuple, Optional
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 為可選依賴；沒有時只提供 memoryview
+    np = None
+
+
+class AggWindow(NamedTuple):
+    """一段時間窗內的成交（皆為同長度 memoryview，由舊到新）。"""
+    ts: memoryview
+    price: memoryview
+    qty: memoryview
+    side: memoryview    # 1 = taker 買（is_buy）、0 = taker 賣
+
+
+class WindowSums(NamedTuple):
+    buy_qty: float
+    buy_notional: float     # Σ px*qty（買）；/ buy_qty = 買方 VWAP
+    sell_qty: float
+    sell_notional: float
+
+
+class AggSnapshot(NamedTuple):
+    """同一個發布版本的成交視窗與累計（window 為唯讀複本，之後寫入不影響）。"""
+    seq: int                        # 累計寫入數；window 最後一筆的序號為 seq - 1
+    last_ts: int                    # 最後一筆成交時間（ms）；沒有成交為 0
+    window: AggWindow
+    sums: Optional[WindowSums]      # 建立時沒給 window_ms 則為 None
+
+
+# (seq, last_ts, 視窗內最舊一筆的序號, 買筆數, buy_q, buy_pq, 賣筆數, sell_q, sell_pq)
+_EMPTY_STATE = (0, 0, 0, 0, 0.0, 0.0, 0, 0.0, 0.0)
+_TYPECODES = ("q", "d", "d", "b")
+
+
+class AggRing:
+    __slots__ = ("capacity", "count", "size", "last_ts", "window_ms", "_state",
+                 "_ts", "_px", "_qty", "_side", "_mv", "_writing", "retries")
+
+    def __init__(self, capacity: int = 6000, window_ms: int = 0):
+        self.capacity = max(1, int(capacity))
+        self.count = 0      # 累計寫入數（決定下一個 slot）
+        self.size = 0       # 目前有效筆數（<= capacity）
+        self.last_ts = 0
+        self.window_ms = int(window_ms)
+        # 發布狀態（見 _EMPTY_STATE）：整個 tuple 替換，讀取端拿到的一定一致；
+        # 筆數為 0 的一側直接回 0（不留加減殘差）
+        self._state = _EMPTY_STATE
+        self._writing = 0   # 寫入端寫 slot 之前先設為「寫完後的 seq」；序號 < _writing - capacity 的格子可能已被覆寫
+        self.retries = 0    # snapshot() / window_sums() 因寫入端繞回而重讀的次數
+        n = 2 * self.capacity
+        self._ts = array("q", bytes(8 * n))
+        self._px = array("d", bytes(8 * n))
+        self._qty = array("d", bytes(8 * n))
+        self._side = array("b", bytes(n))
+        self._mv = (memoryview(self._ts), memoryview(self._px), memoryview(self._qty), memoryview(self._side))
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.itemsize * len(c) for c in (self._ts, self._px, self._qty, self._side))
+
+    def append(self, ts: int, price: float, qty: float, is_buy: bool):
+        cap = self.capacity
+        c = self.count
+        p = c % cap
+        q = p + cap
+        if ts < self.last_ts:
+            ts = self.last_ts
+        tsa, pxa, qa, sa = self._ts, self._px, self._qty, self._side
+        self._writing = c + 1
+        w = self.window_ms
+        _, _, tail, nb, bq, bpq, ns, sq, spq = self._state
+        if w:
+            # 先扣掉：即將被覆寫的（c - cap 之前）與時間過期的（ts 早於 ts - window）成交
+            cutoff = ts - w
+            while tail < c and (tail <= c - cap or tsa[tail % cap] < cutoff):
+                i = tail % cap
+                if sa[i]:
+                    nb -= 1; bq -= qa[i]; bpq -= pxa[i] * qa[i]
+                else:
+                    ns -= 1; sq -= qa[i]; spq -= pxa[i] * qa[i]
+                tail += 1
+            if is_buy:
+                nb += 1; bq += qty; bpq += price * qty
+            else:
+                ns += 1; sq += qty; spq += price * qty
+        tsa[p] = tsa[q] = ts
+        pxa[p] = pxa[q] = price
+        qa[p] = qa[q] = qty
+        sa[p] = sa[q] = 1 if is_buy else 0
+        self.last_ts = ts
+        self._state = (c + 1, ts, tail, nb, bq, bpq, ns, sq, spq)   # 發布（陣列都寫完之後）
+        self.count = c + 1
+        if self.size < cap:
+            self.size += 1
+        if w and (c + 1) % cap == 0:
+            self._recompute()
+
+    # --- 視窗累計 ---
+    def _sub(self, state, cutoff: Optional[int] = None):
+        """從 state 扣掉序號 < state 的 seq（且 ts < cutoff，若有給）的成交；回傳新 state，不修改自身。"""
+        end, last_ts, tail, nb, bq, bpq, ns, sq, spq = state
+        cap = self.capacity
+        ts, px, qty, side = self._ts, self._px, self._qty, self._side
+        while tail < end:
+            i = tail % cap
+            if cutoff is not None and ts[i] >= cutoff:
+                break
+            if side[i]:
+                nb -= 1; bq -= qty[i]; bpq -= px[i] * qty[i]
+            else:
+                ns -= 1; sq -= qty[i]; spq -= px[i] * qty[i]
+            tail += 1
+        return end, last_ts, tail, nb, bq, bpq, ns, sq, spq
+
+    def _recompute(self):
+        end, last_ts, tail = self._state[:3]
+        nb = ns = 0
+        bq = bpq = sq = spq = 0.0
+        cap = self.capacity
+        for k in range(tail, end):
+            i = k % cap
+            pq = self._px[i] * self._qty[i]
+            if self._side[i]:
+                nb += 1; bq += self._qty[i]; bpq += pq
+            else:
+                ns += 1; sq += self._qty[i]; spq += pq
+        self._state = (end, last_ts, tail, nb, bq, bpq, ns, sq, spq)
+
+    @staticmethod
+    def _to_sums(state) -> WindowSums:
+        nb, bq, bpq, ns, sq, spq = state[3:]
+        if nb <= 0:
+            bq = bpq = 0.0
+        if ns <= 0:
+            sq = spq = 0.0
+        return WindowSums(bq, bpq, sq, spq)
+
+    def window_sums(self, now_ms: int, recent_ms: int = 0) -> Optional[WindowSums]:
+        """
+        ts >= now_ms - window_ms 的買/賣量與 px*qty；不修改狀態（可與寫入端不同執行緒）。
+        recent_ms > 0：最後一筆成交早於 now_ms - recent_ms 時回傳 None（與累計取自同一發布版本）。
+        補扣時讀到的格子若已被寫入端繞回覆寫就重讀（同 snapshot 的檢查）。
+        """
+        if not self.window_ms:
+            raise ValueError("AggRing was created without window_ms")
+        cap = self.capacity
+        while True:
+            state = self._state
+            if recent_ms and state[1] < now_ms - recent_ms:
+                return None
+            sub = self._sub(state, now_ms - self.window_ms)
+            # 補扣至少讀了 tail 那格的 ts；被覆寫的 ts 只會變大 → 會提早停、少扣，所以也要確認沒被繞回
+            if state[2] >= state[0] or self._writing - cap <= state[2]:
+                return self._to_sums(sub)
+            self.retries += 1
+
+    def snapshot(self, since_ms: int, now_ms: Optional[int] = None) -> AggSnapshot:
+        """
+        ts >= since_ms 的成交唯讀複本 + 同一發布版本的視窗累計（now_ms 預設為最後一筆成交時間）。
+        複製後若寫入端已繞回覆寫了複製的範圍就重讀；讀取端不取鎖。
+        """
+        cap = self.capacity
+        while True:
+            state = self._state
+            end, last_ts = state[0], state[1]
+            n = min(end, cap)
+            b = (end - 1) % cap + cap + 1 if end else cap
+            a = b - n
+            ts = self._mv[0][a:b]
+            i = bisect_left(ts, since_ms)
+            cols = tuple(memoryview(bytes(mv[a + i:b])).cast(tc) for mv, tc in zip(self._mv, _TYPECODES))
+            sub = self._sub(state, (last_ts if now_ms is None else now_ms) - self.window_ms) if self.window_ms else None
+            # 複製完才讀 _writing（寫入端寫 slot 前就先更新）：序號 >= oldest_ok 的格子沒被動過。
+            # 累計從 tail 開始讀（至少讀停下來那格的 ts；被覆寫會變大 → 提早停、少扣），tail 那格也不能被覆寫
+            oldest_ok = self._writing - cap
+            if oldest_ok <= end - (n - i) and (sub is None or state[2] >= end or oldest_ok <= state[2]):
+                return AggSnapshot(end, last_ts, AggWindow(*cols), self._to_sums(sub) if sub else None)
+            self.retries += 1
+
+    def clear(self):
+        self.count = self.size = self.last_ts = self._writing = 0
+        self._state = _EMPTY_STATE
+
+    def _bounds(self, n: int):
+        n = min(n, self.size)
+        end = (self.count - 1) % self.capacity + self.capacity + 1 if self.size else self.capacity
+        return end - n, end
+
+    def _window(self, a: int, b: int) -> AggWindow:
+        ts, px, qty, side = self._mv
+        return AggWindow(ts[a:b], px[a:b], qty[a:b], side[a:b])
+
+    # --- 讀取（零複製） ---
+    def last(self, n: int) -> AggWindow:
+        """最近 n 筆。"""
+        return self._window(*self._bounds(n))
+
+    def since(self, ts_ms: int) -> AggWindow:
+        """ts >= ts_ms 的所有成交（bisect，O(log n)）。"""
+        a, b = self._bounds(self.size)
+        i = bisect_left(self._mv[0][a:b], ts_ms)
+        return self._window(a + i, b)
+
+    def numpy(self, ts_ms: int):
+        """同 since，但回傳共用記憶體的 NumPy 陣列（需安裝 numpy）。"""
+        if np is None:
+            raise RuntimeError("numpy is not installed")
+        w = self.since(ts_ms)
+        return AggWindow(np.frombuffer(w.ts, dtype=np.int64), np.frombuffer(w.price, dtype=np.float64),
+                         np.frombuffer(w.qty, dtype=np.float64), np.frombuffer(w.side, dtype=np.int8))
@@ -0,0 +1,107 @@
+# file: bar_buffer.py
+"""
+固定容量的欄式 K 線環形緩衝（open_time/open/high/low/close/vol 各一條 typed array）。
+
+- 每筆寫入同時寫在 slot 與 slot+capacity（鏡像），任何長度 <= capacity 的「最近 n 根」
+  都是一段連續記憶體 → 可直接回傳 memoryview，不必複製、不產生 Python float list
+- 視窗長度 n < capacity 時，之後 capacity-n 次 append 都不會覆寫到該視窗；
+  唯一例外是 set_last（更新形成中 bar），會直接反映在持有的視窗上
+- 記憶體固定：6 欄 * 2 * capacity * 8 bytes（見 nbytes）
+- view() 是活的視窗，只給持有寫入鎖（或單執行緒）的呼叫端；跨執行緒交出去一律用 copy()
+"""
+from array import array
+from bisect import bisect_left
+from typing import Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 為可選依賴；沒有時只提供 memoryview
+    np = None
+
+FIELDS = ("open_time", "open", "high", "low", "close", "vol")
+
+
+class BarRing:
+    __slots__ = ("capacity", "count", "size", "_cols", "_mv")
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self.count = 0  # 累計寫入數（決定下一個 slot）
+        self.size = 0   # 目前有效的 bar 數（<= capacity；truncate 後可能小於 count）
+        zeros = bytes(8 * 2 * self.capacity)
+        self._cols = [array("q", zeros)] + [array("d", zeros) for _ in FIELDS[1:]]
+        self._mv = [memoryview(c) for c in self._cols]
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.itemsize * len(c) for c in self._cols)
+
+    @property
+    def last_open_time(self) -> int:
+        return self._cols[0][(self.count - 1) % self.capacity] if self.size else 0
+
+    def _bounds(self, n: int) -> Tuple[int, int]:
+        n = min(n, len(self))
+        end = (self.count - 1) % self.capacity + self.capacity + 1
+        return end - n, end
+
+    # --- 寫入 ---
+    def append(self, t: int, o: float, h: float, l: float, c: float, v: float):
+        cap = self.capacity
+        p = self.count % cap
+        for col, val in zip(self._cols, (t, o, h, l, c, v)):
+            col[p] = val
+            col[p + cap] = val
+        self.count += 1
+        if self.size < cap:
+            self.size += 1
+
+    def set_last(self, o: float, h: float, l: float, c: float, v: float):
+        """覆寫最後一根（形成中 bar）的 OHLCV；open_time 不變。"""
+        cap = self.capacity
+        p = (self.count - 1) % cap
+        for col, val in zip(self._cols[1:], (o, h, l, c, v)):
+            col[p] = val
+            col[p + cap] = val
+
+    def truncate_from(self, open_time: int):
+        """丟掉 open_time >= 指定值的 bar（REST 增量會重送這些 bar）。"""
+        n = len(self)
+        idx = bisect_left(self.column("open_time", n), open_time)
+        self.count -= n - idx
+        self.size = idx
+
+    def clear(self):
+        self.count = 0
+        self.size = 0
+
+    # --- 讀取（零複製） ---
+    def column(self, name: str, n: int) -> memoryview:
+        a, b = self._bounds(n)
+        return self._mv[FIELDS.index(name)][a:b]
+
+    def view(self, n: int) -> Tuple[memoryview, memoryview, memoryview, memoryview]:
+        """(closes, highs, lows, vols) 最近 n 根；支援 len/索引/負索引切片/max/sum。"""
+        a, b = self._bounds(n)
+        mv = self._mv
+        return (mv[4][a:b], mv[2][a:b], mv[3][a:b], mv[5][a:b])
+
+    def copy(self, n: int) -> Tuple[memoryview, memoryview, memoryview, memoryview]:
+        """同 view，但為唯讀複本（約 n*4*8 bytes），之後的寫入不影響；需在寫入鎖內呼叫。"""
+        return tuple(memoryview(bytes(m)).cast("d") for m in self.view(n))
+
+    def numpy(self, n: int):
+        """同 view，但回傳共用記憶體的 NumPy 陣列（需安裝 numpy）。"""
+        if np is None:
+            raise RuntimeError("numpy is not installed")
+        return tuple(np.frombuffer(m, dtype=np.float64) for m in self.view(n))
+
+    def copy_into(self, other: "BarRing"):
+        """把目前內容依序寫入另一個 ring（擴充容量時使用）。"""
+        n = len(self)
+        cols = [self.column(f, n) for f in FIELDS]
+        for row in zip(*cols):
+            other.append(*row)
@@ -27,6 +27,7 @@ PER_TRADE_RISK   = float(os.getenv("PER_TRADE_RISK", "0.0075"))     # 每筆風
 MAX_TRADES_DAY   = int(os.getenv("MAX_TRADES_DAY", "10"))           # 每日最多交易筆數
 SCAN_INTERVAL_S  = int(os.getenv("SCAN_INTERVAL_S", "10"))          # 掃描刷新頻率（秒）
 SCAN_TOP_N       = int(os.getenv("SCAN_TOP_N", "10"))               # 掃描 Top N 幣種
+SCAN_MAX_SYMBOLS = int(os.getenv("SCAN_MAX_SYMBOLS", str(2 * SCAN_TOP_N)))  # 每輪抓 K 線的檔數上限；預設涵蓋 TopN 漲跌榜全部
 ALLOW_SHORT      = os.getenv("ALLOW_SHORT", "True").lower() == "true" # <-- 新增：是否允許做空
 USE_LIVE         = os.getenv("USE_LIVE", "False").lower() == "true"    # 實盤開關
 
@@ -49,10 +50,12 @@ TP_ATR_MULTIPLIER = float(os.getenv("TP_ATR_MULTIPLIER", "3.0"))    # 止盈 = 3
 # --- 下單行為 ---
 USE_MARKET_ENTRY = os.getenv("USE_MARKET_ENTRY", "False").lower() == "true" # (可選) 是否使用市價進場
 MIN_NOTIONAL_FALLBACK = Decimal(os.getenv("MIN_NOTIONAL_FALLBACK", "5.0")) # exchangeInfo 缺少 minNotional 時的後備值 (USDT)
+EXCHANGE_INFO_CACHE = os.getenv("EXCHANGE_INFO_CACHE", "exchange_info.json")  # 精度規則磁碟快取（啟動即用，背景刷新）
 
 # ================= 訊號參數（版本 C） =================
 KLINE_INTERVAL   = os.getenv("KLINE_INTERVAL", "5m")      # 以 5 分鐘作為訊號級別
 KLINE_LIMIT      = int(os.getenv("KLINE_LIMIT", "120"))       # 拉 120 根 5m（≈ 10 小時）
+KLINE_REFRESH_S  = float(os.getenv("KLINE_REFRESH_S", "30"))   # K 線庫存沿用秒數；過期後只抓增量
 HH_N             = int(os.getenv("HH_N", "96"))        # 過去 N 根的前高（≈ 8 小時）
 OVEREXTEND_CAP   = float(os.getenv("OVEREXTEND_CAP", "0.02"))      # 突破幅度不得超過 +2%
 VOL_BASE_WIN     = int(os.getenv("VOL_BASE_WIN", "48"))        # 基準量能視窗（近 48 根）
@@ -64,6 +67,19 @@ EMA_SLOW         = int(os.getenv("EMA_SLOW", "50"))        # 結構過濾：EMA5
 # API 基礎
 BINANCE_FUTURES_BASE = "https://fapi.binance.com"  # USDT 永續
 BINANCE_FUTURES_TEST_BASE = "https://testnet.binancefuture.com" # 測試網
+# 公開 REST host 覆寫（逗號分隔；例如本機假伺服器 http://127.0.0.1:8765），空字串=用預設 fapi host
+FAPI_REST_HOSTS = [h.strip() for h in os.getenv("FAPI_REST_HOSTS", "").split(",") if h.strip()]
+
+# --- REST 權重限流 ---
+REST_WEIGHT_LIMIT_1M = int(os.getenv("REST_WEIGHT_LIMIT_1M", "2400"))      # 幣安 Futures IP 權重上限 / 分鐘
+REST_WEIGHT_SAFETY   = float(os.getenv("REST_WEIGHT_SAFETY", "0.8"))       # 只用上限的 80%，留給其他程式/誤差
+REST_MAX_INFLIGHT    = int(os.getenv("REST_MAX_INFLIGHT", "8"))            # 同時在途請求上限（自動調整的天花板）
+REST_MAX_WAIT_S      = float(os.getenv("REST_MAX_WAIT_S", "5"))            # 等待權重/封鎖超過此秒數就放棄（不卡主迴圈）
+# --- REST 主機選擇 / hedged GET ---
+REST_HEDGE            = os.getenv("REST_HEDGE", "True").lower() == "true"  # GET 超過最佳主機 p95 仍未回 → 另送第二台
+REST_HEDGE_MAX_WEIGHT = int(os.getenv("REST_HEDGE_MAX_WEIGHT", "5"))       # 權重超過此值的請求不 hedge（避免雙倍權重）
+REST_COALESCE         = os.getenv("REST_COALESCE", "True").lower() == "true"  # 同 (path, params) 的在途請求合併成一個
+REST_PRICE_TTL_S      = float(os.getenv("REST_PRICE_TTL_S", "0.5"))        # ticker/price 結果共用秒數（WS 價格缺失時的後備）
 
 # ===== 實盤連線與風控補充 =====
 # 先用 Futures 測試網驗證，OK 再改成 False
@@ -74,3 +90,22 @@ ORDER_TIMEOUT_SEC = int(os.getenv("ORDER_TIMEOUT_SEC", "90"))
 
 # WebSocket 開關：面板即時價
 USE_WEBSOCKET = os.getenv("USE_WEBSOCKET", "True").lower() == "true"
+# 可選：同時訂閱 @kline_<KLINE_INTERVAL>，K 線改由 WS 推播維護（REST 只負責首次播種/補洞）
+WS_KLINES = os.getenv("WS_KLINES", "False").lower() == "true"
+WS_KLINE_STALE_S = float(os.getenv("WS_KLINE_STALE_S", "5"))   # 超過此秒數沒收到推播 → 回到 REST 增量
+# 全市場 !ticker@arr：WS 持續維護全部 USDT 永續的漲跌幅排行（掃描不再打 ticker/24hr REST）
+WS_ALL_TICKERS = os.getenv("WS_ALL_TICKERS", "True").lower() == "true"
+WS_TICKER_STALE_S = float(os.getenv("WS_TICKER_STALE_S", "5"))   # 排行超過此秒數沒更新 → 退回 REST 快照
+WS_TICKER_MAX_AGE_S = float(os.getenv("WS_TICKER_MAX_AGE_S", "300"))  # 單一 symbol 的 ticker 事件時間落後最新超過此秒數 → 移出排行（停牌/下架）
+RANK_RESCAN_MIN_S = float(os.getenv("RANK_RESCAN_MIN_S", "2"))   # 有新幣擠進 TopN 時，提前掃描的最短間隔
+# WS 分片：串流分散到多條連線（各自一個執行緒/reader），依觀測訊息率定期重新平衡
+WS_SHARDS = int(os.getenv("WS_SHARDS", "1"))                            # 最少分片數（串流數超過上限時自動增加）
+WS_MAX_STREAMS_PER_CONN = int(os.getenv("WS_MAX_STREAMS_PER_CONN", "200"))  # 每條連線的串流上限
+WS_REBALANCE_S = float(os.getenv("WS_REBALANCE_S", "60"))              # 重新平衡的最短間隔
+WS_AGG_CAPACITY = int(os.getenv("WS_AGG_CAPACITY", "6000"))            # 每個 symbol 保留的逐筆成交筆數（固定記憶體，約 50 bytes/筆）
+WS_BOOK_TICKER = os.getenv("WS_BOOK_TICKER", "True").lower() == "true"  # 每個 symbol 訂閱 @bookTicker（即時最佳買賣價）取代 @ticker
+WS_BOOK_STALE_S = float(os.getenv("WS_BOOK_STALE_S", "5"))           # 最佳買賣價超過幾秒沒更新視為過期（退回最新成交價/REST）
+WS_AGG_BACKFILL = os.getenv("WS_AGG_BACKFILL", "True").lower() == "true"  # 逐筆成交 a 跳號（重連/漏訊息）時以 REST aggTrades 補齊
+WS_AGG_BACKFILL_MAX = int(os.getenv("WS_AGG_BACKFILL_MAX", "5000"))    # 單次補洞上限筆數（每 1000 筆一個請求、權重 20）；超過就放棄補洞
+WS_PROCESS = os.getenv("WS_PROCESS", "False").lower() == "true"      # 逐筆成交 / bookTicker 改由獨立行程收訊，經共享記憶體讀取
+WS_PROCESS_SLOTS = int(os.getenv("WS_PROCESS_SLOTS", "64"))          # 共享記憶體可容納的 symbol 數（每個約 WS_AGG_CAPACITY * 50 bytes）
@@ -0,0 +1,130 @@
+# file: host_router.py
+"""
+REST 主機選擇：依每台主機的 EWMA 延遲與錯誤率排序，請求優先送往目前最快且健康的主機。
+
+- record(host, seconds, ok)：每次請求結束回報；錯誤率也是 EWMA，連續失敗會暫時冷卻
+- ranked()：未量測過的主機排最前（先探一次），冷卻中的主機排最後；
+  少量比例（explore_p）把另一台健康主機提到最前，讓偶發長尾拉高 EWMA 的主機有機會恢復
+- EWMA 只吃截斷到 3 倍目前值的樣本（長尾交給 hedge 處理），p95/直方圖仍記原始值
+- hedge_delay(host)：實際送出的那台主機近期延遲的 p95；冪等 GET 超過這個時間還沒回來，就對第二台再送一次
+- histogram / stats：每台主機的延遲分布（固定 ms 桶）與摘要，給工具/面板看
+"""
+import random, threading, time
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, List, Optional
+
+_BUCKETS_MS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class HostStats:
+    __slots__ = ("host", "ewma_ms", "err_rate", "fails_in_row", "cooldown_until", "samples", "buckets",
+                 "requests", "errors")
+
+    def __init__(self, host: str, window: int):
+        self.host = host
+        self.ewma_ms: Optional[float] = None
+        self.err_rate = 0.0
+        self.fails_in_row = 0
+        self.cooldown_until = 0.0
+        self.samples = deque(maxlen=window)   # 近期成功請求延遲（ms），算 p95
+        self.buckets = [0] * (len(_BUCKETS_MS) + 1)
+        self.requests = 0
+        self.errors = 0
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < 10:
+            return None
+        s = sorted(self.samples)
+        return s[min(len(s) - 1, int(len(s) * 0.95))]
+
+
+class HostRouter:
+    def __init__(self, hosts: List[str], alpha: float = 0.2, err_penalty: float = 10.0,
+                 cooldown_after: int = 3, cooldown_s: float = 30.0, window: int = 200,
+                 min_hedge_ms: float = 30.0, explore_p: float = 0.05):
+        self.alpha = alpha
+        self.explore_p = explore_p
+        self.err_penalty = err_penalty
+        self.cooldown_after = cooldown_after
+        self.cooldown_s = cooldown_s
+        self.min_hedge_ms = min_hedge_ms
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, HostStats] = {h: HostStats(h, window) for h in hosts}
+        self.hedges = 0        # 送出第二個請求的次數
+        self.hedge_wins = 0    # 第二個請求先回來的次數
+
+    def _score(self, st: HostStats, now: float) -> float:
+        if st.cooldown_until > now:
+            return float("inf")
+        if st.ewma_ms is None:
+            return -1.0
+        return st.ewma_ms * (1.0 + self.err_penalty * st.err_rate)
+
+    def ranked(self) -> List[str]:
+        """由快到慢排序的主機清單（冷卻中的排最後，但仍保留作為最後手段）。"""
+        now = time.monotonic()
+        with self._lock:
+            order = sorted(self._hosts.values(), key=lambda st: self._score(st, now))
+        if len(order) > 1 and random.random() < self.explore_p:
+            alt = [i for i in range(1, len(order)) if order[i].cooldown_until <= now]
+            if alt:
+                i = random.choice(alt)
+                order[0], order[i] = order[i], order[0]
+        return [st.host for st in order]
+
+    def record(self, host: str, seconds: float, ok: bool):
+        ms = seconds * 1000.0
+        with self._lock:
+            st = self._hosts.get(host)
+            if st is None:
+                return
+            a = self.alpha
+            st.requests += 1
+            st.err_rate = (1 - a) * st.err_rate + (0.0 if ok else a)
+            if ok:
+                st.fails_in_row = 0
+                st.ewma_ms = ms if st.ewma_ms is None else (1 - a) * st.ewma_ms + a * min(ms, 3 * st.ewma_ms)
+                st.samples.append(ms)
+                st.buckets[bisect_left(_BUCKETS_MS, ms)] += 1
+            else:
+                st.errors += 1
+                st.fails_in_row += 1
+                # 失敗的延遲（多半是 timeout）也計入 EWMA，慢到逾時的主機自然往後排
+                st.ewma_ms = ms if st.ewma_ms is None else max(st.ewma_ms, (1 - a) * st.ewma_ms + a * ms)
+                if st.fails_in_row >= self.cooldown_after:
+                    st.cooldown_until = time.monotonic() + self.cooldown_s
+
+    def hedge_delay(self, host: Optional[str] = None) -> Optional[float]:
+        """
+        host 的 p95（秒）；host=None 取目前最佳（EWMA 最低）主機。樣本不足回傳 None（不 hedge）。
+        ranked() 偶爾會把其他主機探到最前，呼叫端應傳入實際送出的主機。
+        """
+        now = time.monotonic()
+        with self._lock:
+            st = self._hosts.get(host) if host is not None else None
+            if st is None:
+                st = min(self._hosts.values(), key=lambda x: self._score(x, now))
+            p = st.p95()
+        return None if p is None else max(p, self.min_hedge_ms) / 1000.0
+
+    def note_hedge(self, won: bool):
+        with self._lock:
+            self.hedges += 1
+            self.hedge_wins += int(won)
+
+    def histogram(self, host: str) -> Dict[str, int]:
+        labels = [f"<={b}ms" for b in _BUCKETS_MS] + [f">{_BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            return dict(zip(labels, self._hosts[host].buckets))
+
+    def stats(self) -> Dict[str, dict]:
+        now = time.monotonic()
+        with self._lock:
+            out = {h: {"ewma_ms": None if st.ewma_ms is None else round(st.ewma_ms, 1),
+                       "p95_ms": None if st.p95() is None else round(st.p95(), 1),
+                       "err_rate": round(st.err_rate, 3), "requests": st.requests, "errors": st.errors,
+                       "cooling": st.cooldown_until > now}
+                   for h, st in self._hosts.items()}
+        out["_hedge"] = {"hedges": self.hedges, "wins": self.hedge_wins}
+        return out
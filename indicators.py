@@ -0,0 +1,309 @@
+# file: indicators.py
+"""
+指標核心（float / NumPy）：取代 utils 內以 Decimal 計算的 ema() / calculate_atr()。
+
+- ema / atr：純 float，語意與舊版相同（從第一個有限值起算、跳過 NaN/inf；ATR = TR 的 EMA）
+- atr_wilder：Wilder 平滑（alpha = 1/period，以前 period 根 TR 的平均起算）
+- rolling_max / rolling_min（單調 deque）、rolling_median（排序視窗）
+- *_np：整段陣列的向量化版本；可傳 2-D 陣列（每列一個 symbol）一次算完
+- SlidingEma / RollingExtreme / SortedWindow：逐根收盤增量更新（vbo_state 使用）；
+  SortedWindow 另提供 percentile / rank（大單訊號的歷史門檻）
+"""
+import math
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from typing import List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 為可選依賴
+    np = None
+
+_isfinite = math.isfinite
+
+
+# ================= float 版 =================
+
+def ema(vals: Sequence[float], n: int) -> Optional[float]:
+    """EMA 最終值（k = 2/(n+1)，以第一個有限值為種子）；資料不足回傳 None。"""
+    if not vals or len(vals) < n or n <= 0:
+        return None
+    k = 2.0 / (n + 1.0)
+    k1 = 1.0 - k
+    it = iter(vals)
+    e = None
+    for v in it:
+        try:
+            v = float(v)
+        except (TypeError, ValueError):
+            continue
+        if _isfinite(v):
+            e = v
+            break
+    if e is None:
+        return None
+    for v in it:
+        try:
+            v = float(v)
+        except (TypeError, ValueError):
+            continue
+        if _isfinite(v):
+            e = v * k + e * k1
+    return e if _isfinite(e) else None
+
+
+def true_ranges(highs: Sequence[float], lows: Sequence[float], closes: Sequence[float]) -> List[float]:
+    out = []
+    append = out.append
+    prev = closes[0]
+    for i in range(1, len(closes)):
+        h = highs[i]; l = lows[i]
+        hl = h - l
+        hc = abs(h - prev)
+        lc = abs(l - prev)
+        append(hl if hl >= hc and hl >= lc else (hc if hc >= lc else lc))
+        prev = closes[i]
+    return out
+
+
+def atr(highs: Sequence[float], lows: Sequence[float], closes: Sequence[float], period: int = 14) -> Optional[float]:
+    """ATR = 全部 TR 的 EMA（與舊 calculate_atr 相同定義）；無效時回傳 None。"""
+    if period <= 0 or len(closes) < period + 1:
+        return None
+    trs = true_ranges(highs, lows, closes)
+    if len(trs) < period:
+        return None
+    v = ema(trs, period)
+    return v if v is not None and v > 0 else None
+
+
+def atr_wilder(highs: Sequence[float], lows: Sequence[float], closes: Sequence[float], period: int = 14) -> Optional[float]:
+    """Wilder ATR：前 period 根 TR 取平均為種子，之後 atr = (atr*(n-1) + tr) / n。"""
+    if period <= 0 or len(closes) < period + 1:
+        return None
+    trs = true_ranges(highs, lows, closes)
+    a = sum(trs[:period]) / period
+    for tr in trs[period:]:
+        a = (a * (period - 1) + tr) / period
+    return a if a > 0 else None
+
+
+def rolling_max(vals: Sequence[float], n: int) -> List[float]:
+    """每個位置（含）往前 n 根的最大值；前 n-1 個位置用現有資料。O(len)。"""
+    out, dq = [], deque()
+    for i, v in enumerate(vals):
+        while dq and vals[dq[-1]] <= v:
+            dq.pop()
+        dq.append(i)
+        if dq[0] <= i - n:
+            dq.popleft()
+        out.append(vals[dq[0]])
+    return out
+
+
+def rolling_min(vals: Sequence[float], n: int) -> List[float]:
+    out, dq = [], deque()
+    for i, v in enumerate(vals):
+        while dq and vals[dq[-1]] >= v:
+            dq.pop()
+        dq.append(i)
+        if dq[0] <= i - n:
+            dq.popleft()
+        out.append(vals[dq[0]])
+    return out
+
+
+def rolling_median(vals: Sequence[float], n: int) -> List[float]:
+    """每個位置往前 n 根的中位數（同 statistics.median 定義）。"""
+    out, win = [], []
+    for i, v in enumerate(vals):
+        insort(win, v)
+        if i >= n:
+            del win[bisect_left(win, vals[i - n])]
+        m = len(win)
+        out.append(win[m // 2] if m % 2 else (win[m // 2 - 1] + win[m // 2]) / 2.0)
+    return out
+
+
+# ================= NumPy 向量化版 =================
+
+def _require_np():
+    if np is None:
+        raise RuntimeError("numpy is not installed")
+
+
+def ema_np(x, n: int):
+    """
+    EMA 最終值（沿最後一軸）；x 可為 1-D 或 2-D（每列一個 symbol）。
+    e_T = (1-k)^(T-1) x_0 + Σ_{i>=1} k (1-k)^(T-1-i) x_i，以一次 dot 算完（權重皆 <= 1，數值穩定）。
+    """
+    _require_np()
+    x = np.asarray(x, dtype=np.float64)
+    T = x.shape[-1]
+    if T < n or n <= 0:
+        return None
+    k = 2.0 / (n + 1.0)
+    w = k * (1.0 - k) ** np.arange(T - 1, -1, -1, dtype=np.float64)
+    w[0] = (1.0 - k) ** (T - 1)
+    return x @ w
+
+
+def true_ranges_np(highs, lows, closes):
+    _require_np()
+    h = np.asarray(highs, dtype=np.float64)[..., 1:]
+    l = np.asarray(lows, dtype=np.float64)[..., 1:]
+    pc = np.asarray(closes, dtype=np.float64)[..., :-1]
+    return np.maximum(h - l, np.maximum(np.abs(h - pc), np.abs(l - pc)))
+
+
+def atr_np(highs, lows, closes, period: int = 14):
+    """向量化 atr()（TR 的 EMA）；2-D 輸入回傳每列一個值，<= 0 的結果回傳 NaN。"""
+    _require_np()
+    trs = true_ranges_np(highs, lows, closes)
+    if trs.shape[-1] < period or period <= 0:
+        return None
+    out = ema_np(trs, period)
+    return np.where(out > 0, out, np.nan)
+
+
+def rolling_max_np(x, n: int):
+    """完整視窗（長度 n）的滑動最大值，輸出長度 T-n+1。"""
+    _require_np()
+    from numpy.lib.stride_tricks import sliding_window_view
+    return sliding_window_view(np.asarray(x, dtype=np.float64), n, axis=-1).max(axis=-1)
+
+
+def rolling_min_np(x, n: int):
+    _require_np()
+    from numpy.lib.stride_tricks import sliding_window_view
+    return sliding_window_view(np.asarray(x, dtype=np.float64), n, axis=-1).min(axis=-1)
+
+
+def rolling_median_np(x, n: int):
+    _require_np()
+    from numpy.lib.stride_tricks import sliding_window_view
+    return np.median(sliding_window_view(np.asarray(x, dtype=np.float64), n, axis=-1), axis=-1)
+
+
+# ================= 增量（每根收盤 O(1) / O(log n)）=================
+
+class SlidingEma:
+    """
+    固定長度視窗的 EMA（以視窗第一個值為種子，與 ema(vals[-window:], n) 相同）。
+    F = Σ k(1-k)^(T-1-i) x_i 可 O(1) 滑動；EMA = F + (1-k)^T * x_0。
+    push() 提交已收盤值；peek(x) 把 x 當作視窗最後一個值計算，不改變狀態。
+    """
+    __slots__ = ("n", "window", "k", "k1", "_pow", "_vals", "_f", "_since")
+
+    def __init__(self, n: int, window: int):
+        self.n = n
+        self.window = max(1, window)
+        self.k = 2.0 / (n + 1.0)
+        self.k1 = 1.0 - self.k
+        self._pow = [self.k1 ** i for i in range(self.window + 1)]
+        self._vals = deque()      # 最近 window-1 個已提交值
+        self._f = 0.0
+        self._since = 0
+
+    def push(self, y: float):
+        vals = self._vals
+        if len(vals) >= self.window - 1:
+            if vals:
+                self._f -= self.k * self._pow[len(vals) - 1] * vals.popleft()
+        self._f = self.k1 * self._f + self.k * y
+        vals.append(y)
+        self._since += 1
+        if self._since >= self.window:  # 定期重算，避免浮點誤差累積
+            f = 0.0
+            for v in vals:
+                f = self.k1 * f + self.k * v
+            self._f = f
+            self._since = 0
+
+    def peek(self, x: float) -> Optional[float]:
+        vals = self._vals
+        T = len(vals) + 1
+        if T < self.n:
+            return None
+        f = self.k1 * self._f + self.k * x
+        return f + self._pow[T] * (vals[0] if vals else x)
+
+
+class RollingExtreme:
+    """最近 n 個已提交值的最大（或最小）值；單調 deque，攤銷 O(1)。"""
+    __slots__ = ("n", "_max", "_dq", "_i")
+
+    def __init__(self, n: int, maximum: bool = True):
+        self.n = n
+        self._max = maximum
+        self._dq = deque()
+        self._i = 0
+
+    def push(self, v: float):
+        dq = self._dq
+        if self._max:
+            while dq and dq[-1][1] <= v:
+                dq.pop()
+        else:
+            while dq and dq[-1][1] >= v:
+                dq.pop()
+        dq.append((self._i, v))
+        self._i += 1
+        while dq[0][0] <= self._i - 1 - self.n:
+            dq.popleft()
+
+    def value(self) -> Optional[float]:
+        return self._dq[0][1] if self._dq else None
+
+    def __len__(self):
+        return min(self._i, self.n)
+
+
+class SortedWindow:
+    """
+    FIFO 視窗 + 同步維護的排序串列（滾動中位數 / 百分位 / 百分位排名）。
+    插入與淘汰以 bisect 定位 O(log n)，搬移為 C 層級 memmove（n 在數百以內幾乎無成本）。
+    """
+    __slots__ = ("maxlen", "_fifo", "_sorted")
+
+    def __init__(self, maxlen: int):
+        self.maxlen = maxlen
+        self._fifo = deque()
+        self._sorted: List[float] = []
+
+    def push(self, v: float):
+        if len(self._fifo) >= self.maxlen:
+            old = self._fifo.popleft()
+            del self._sorted[bisect_left(self._sorted, old)]
+        self._fifo.append(v)
+        insort(self._sorted, v)
+
+    def __len__(self):
+        return len(self._fifo)
+
+    def median(self) -> Optional[float]:
+        s = self._sorted
+        m = len(s)
+        if not m:
+            return None
+        return s[m // 2] if m % 2 else (s[m // 2 - 1] + s[m // 2]) / 2.0
+
+    def percentile(self, p: float) -> float:
+        """最近秩百分位：sorted[round(p/100*(n-1))]（同大單訊號舊版 _percentile）；空視窗回傳 inf。"""
+        s = self._sorted
+        n = len(s)
+        if not n:
+            return math.inf
+        return s[max(0, min(n - 1, int(round((p / 100.0) * (n - 1)))))]
+
+    def rank(self, v: float) -> Optional[float]:
+        """v 的百分位排名 (below + 0.5*equal) / n * 100（同舊版 _calculate_percentile_rank）；空視窗回傳 None。"""
+        s = self._sorted
+        n = len(s)
+        if not n:
+            return None
+        below = bisect_left(s, v)
+        equal = bisect_right(s, v, below) - below
+        if equal == 0:
+            return (below / n) * 100.0
+        return ((below + 0.5 * equal) / n) * 100.0
@@ -0,0 +1,227 @@
+# file: kline_store.py
+"""
+K 線庫存：每個 (symbol, interval) 保留歷史，過期後只用 startTime 抓「最後一根之後」的增量。
+
+- 增量回來的第一根 open time = 庫存最後一根（尚未收盤的 bar）→ 取代它，其餘收盤 bar 直接接上
+- 中斷太久（缺口 > limit 根）或庫存不足時才整段重抓
+- 對外仍回傳 evaluate_vbo 需要的 (closes, highs, lows, vols)
+- 可選：由 WS @kline_<interval> 推播更新（apply_ws_kline）；推播新鮮時 get() 完全不打 REST
+- 儲存用 bar_buffer.BarRing：固定容量；get() 回傳在 s.lock 內複製的唯讀 memoryview
+  （WS set_last / 增量合併 / 整段重抓都會改寫 ring，活的視窗不能交給其他執行緒）
+- vbo_features()：每個序列掛一個 vbo_state.VboState，只把新收盤的 bar push 進去（O(1)），
+  形成中 bar 用 peek 評估；REST 改寫到已提交的 bar 或容量變動時才整段重播
+"""
+import threading, time
+from bisect import bisect_right
+from typing import Callable, Dict, Tuple
+
+from bar_buffer import BarRing
+from vbo_state import VboState
+
+_UNIT_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000, "M": 2_592_000_000}
+
+
+def interval_ms(interval: str) -> int:
+    """'5m' -> 300000；'1M' 以 30 天近似（只用來估算增量根數）。"""
+    try:
+        return int(interval[:-1]) * _UNIT_MS[interval[-1]]
+    except (KeyError, ValueError, IndexError):
+        raise ValueError(f"Unsupported kline interval: {interval}")
+
+
+# 環形緩衝比要求的 limit 多留幾格：持有中的視窗在之後數次 append 內不會被覆寫
+_RING_SLACK = 32
+
+
+class KlineSeries:
+    """單一 (symbol, interval) 的 K 線序列（BarRing 欄式儲存）；最後一根可能仍在形成中。"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.bars = BarRing(capacity + _RING_SLACK)
+        self.fetched_at = 0.0
+        self.ws_at = 0.0          # 最後一次成功套用 WS kline 的時間；0 = 未同步
+        self.lock = threading.Lock()
+        self.vbo = None           # VboState；第一次 vbo_features() 時建立
+
+    def __len__(self):
+        return len(self.bars)
+
+    @property
+    def last_open_time(self) -> int:
+        return self.bars.last_open_time
+
+    @property
+    def nbytes(self) -> int:
+        return self.bars.nbytes
+
+    def grow(self, capacity: int):
+        """容量只增不減；擴充時搬到新的 ring（舊視窗仍指向舊 ring，不受影響）。"""
+        if capacity <= self.capacity:
+            return
+        ring = BarRing(capacity + _RING_SLACK)
+        self.bars.copy_into(ring)
+        self.bars = ring
+        self.capacity = capacity
+
+    def merge(self, rows: list):
+        """把 REST klines 陣列併入：open time >= 第一列者一律以新資料取代。"""
+        if not rows:
+            return
+        bars = self.bars
+        bars.truncate_from(int(rows[0][0]))
+        for x in rows:
+            bars.append(int(x[0]), float(x[1]), float(x[2]), float(x[3]), float(x[4]), float(x[5]))
+
+    def apply_ws(self, k: dict, step: int) -> bool:
+        """
+        套用一筆 WS kline（payload 的 "k" 物件）。尚未用 REST 播種、或中間缺 bar 時回傳 False，
+        交給下一次 get() 走 REST 補齊。
+        """
+        if not len(self.bars):
+            return False
+        t = int(k["t"])
+        last = self.bars.last_open_time
+        if t < last:
+            return True   # 舊訊息，忽略
+        if t > last + step:
+            self.ws_at = 0.0  # 斷線期間有 bar 收盤 → 需要 REST 補洞
+            return False
+        o, h, l, c, v = float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"])
+        if t == last:
+            self.bars.set_last(o, h, l, c, v)
+        else:
+            self.bars.append(t, o, h, l, c, v)
+        self.ws_at = time.time()
+        return True
+
+    def view(self, limit: int):
+        """(closes, highs, lows, vols) 的零複製 memoryview 視窗；需持有 self.lock 且不可帶出鎖外。"""
+        return self.bars.view(limit)
+
+    def snapshot(self, limit: int):
+        """(closes, highs, lows, vols) 的唯讀複本；需持有 self.lock，可交給其他執行緒。"""
+        return self.bars.copy(limit)
+
+    def _sync_vbo(self) -> VboState:
+        """把尚未提交的已收盤 bar（除最後一根以外）push 進 VboState；需持有 self.lock。"""
+        bars = self.bars
+        n = len(bars)
+        times = bars.column("open_time", n)
+        committed_ot = times[-2] if n >= 2 else 0
+        st = self.vbo
+        if st is None or st.limit != self.capacity or st.last_open_time > committed_ot:
+            st = self.vbo = VboState(self.capacity)   # 首次 / 整段重抓 / 擴容 → 重播
+            start = max(0, n - self.capacity)
+        else:
+            start = bisect_right(times, st.last_open_time)
+        if start < n - 1:
+            highs, lows = bars.column("high", n), bars.column("low", n)
+            closes, vols = bars.column("close", n), bars.column("vol", n)
+            for i in range(start, n - 1):
+                st.push(times[i], highs[i], lows[i], closes[i], vols[i])
+        return st
+
+    def vbo_features(self):
+        """最近 capacity 根（含形成中）的 VboFeatures；資料不足回傳 None。需持有 self.lock。"""
+        if not len(self.bars):
+            return None
+        st = self._sync_vbo()
+        col = self.bars.column
+        return st.peek(col("high", 1)[0], col("low", 1)[0], col("close", 1)[0], col("vol", 1)[0])
+
+
+class KlineStore:
+    def __init__(self, rest_json: Callable, refresh_s: float = 30.0, ws_stale_s: float = 5.0):
+        self._rest_json = rest_json
+        self.refresh_s = refresh_s
+        self.ws_stale_s = ws_stale_s
+        self._series: Dict[Tuple[str, str], KlineSeries] = {}
+        self._lock = threading.Lock()
+        # 統計：整段/增量次數與收到的 bar 數（評估省下的頻寬）
+        self.full_fetches = 0
+        self.delta_fetches = 0
+        self.cache_hits = 0
+        self.rows_received = 0
+        self.ws_updates = 0
+        self.ws_rejected = 0
+
+    def series(self, symbol: str, interval: str, capacity: int = 0) -> KlineSeries:
+        key = (symbol.upper(), interval)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = KlineSeries(capacity)
+            elif capacity > s.capacity:
+                with s.lock:
+                    s.grow(capacity)
+            return s
+
+    def get(self, symbol: str, interval: str, limit: int):
+        """回傳 (closes, highs, lows, vols) 唯讀 memoryview 複本，最多 limit 根（含最後一根未收盤 bar）。"""
+        limit = int(limit)
+        s = self.series(symbol, interval, limit)
+        # s.lock 只在讀狀態 / 合併時持有：REST（含限流等待與重試）期間 WS 分片的 apply_ws_kline 不會被卡住
+        with s.lock:
+            now = time.time()
+            if len(s) >= limit and (now - s.fetched_at < self.refresh_s or now - s.ws_at < self.ws_stale_s):
+                self.cache_hits += 1
+                return s.snapshot(limit)
+            step = interval_ms(interval)
+            last_ot = s.last_open_time
+            need = (int(now * 1000) - last_ot) // step + 2  # 最後一根 + 之後新開的 + 1 根餘裕
+            delta = len(s) >= limit and need <= limit
+
+        if delta:
+            rows = self._rest_json("/fapi/v1/klines", params={
+                "symbol": symbol, "interval": interval,
+                "startTime": last_ot, "limit": int(need),
+            }, tries=6)
+        else:
+            rows = self._rest_json("/fapi/v1/klines", params={
+                "symbol": symbol, "interval": interval, "limit": limit
+            }, tries=6)
+
+        with s.lock:
+            # 抓取期間 WS 可能已接上新 bar：merge 從 rows 第一根起整段取代，結果仍連續
+            if delta:
+                self.delta_fetches += 1
+            else:
+                self.full_fetches += 1
+                s.bars.clear()
+            self.rows_received += len(rows)
+            s.merge(rows)
+            s.fetched_at = now
+            return s.snapshot(limit)
+
+    def vbo_features(self, symbol: str, interval: str):
+        """已播種序列的增量 VBO 特徵（不打 REST；先用 get() 更新序列）。"""
+        s = self._series.get((symbol.upper(), interval))
+        if s is None:
+            return None
+        with s.lock:
+            return s.vbo_features()
+
+    def apply_ws_kline(self, symbol: str, k: dict):
+        """WS @kline_<interval> 回呼：只更新已播種的序列（未訂閱/未抓過的不建立）。"""
+        s = self._series.get((symbol.upper(), k.get("i", "")))
+        if s is None:
+            return
+        with s.lock:
+            ok = s.apply_ws(k, interval_ms(k["i"]))
+        if ok:
+            self.ws_updates += 1
+        else:
+            self.ws_rejected += 1
+
+    def memory(self) -> Dict[str, int]:
+        """記憶體用量（固定，不隨執行時間成長）。"""
+        with self._lock:
+            sizes = [s.nbytes for s in self._series.values()]
+        return {"series": len(sizes), "bytes_total": sum(sizes),
+                "bytes_per_series": max(sizes) if sizes else 0}
+
+    def stats(self) -> Dict[str, int]:
+        return {"series": len(self._series), "full": self.full_fetches, "delta": self.delta_fetches,
+                "hits": self.cache_hits, "rows": self.rows_received, "bytes": self.memory()["bytes_total"],
+                "ws_updates": self.ws_updates, "ws_rejected": self.ws_rejected}
@@ -1,27 +1,29 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from datetime import datetime
-from decimal import Decimal, InvalidOperation # <-- 保留 Decimal
-import time, os, random
+from itertools import zip_longest
+import time, os
 from dotenv import load_dotenv
 
 from config import (USE_WEBSOCKET, USE_TESTNET, USE_LIVE, SCAN_INTERVAL_S, DAILY_TARGET_PCT, DAILY_LOSS_CAP,
                     PER_TRADE_RISK, SCAN_TOP_N, ALLOW_SHORT,
                     LARGE_TRADES_EARLY_EXIT_PCT, MIN_NOTIONAL_FALLBACK,
-                    KLINE_INTERVAL, KLINE_LIMIT)
-# (修改) 加入 fetch_klines 和 fetch_top_losers
-from utils import fetch_top_gainers, fetch_top_losers, SESSION, fetch_klines
+                    KLINE_INTERVAL, KLINE_LIMIT, WS_ALL_TICKERS, WS_TICKER_STALE_S, RANK_RESCAN_MIN_S,
+                    SCAN_MAX_SYMBOLS)
+# (修改) 加入 fetch_klines_many 和 fetch_ticker_snapshot
+from utils import fetch_ticker_snapshot, SESSION, fetch_klines_many, KLINE_STORE
 from risk_frame import DayGuard, position_size_notional, compute_bracket # (保留 ATR 版本)
 from adapters import SimAdapter, LiveAdapter
 # (修改) 匯入新的函數名稱
-from signal_volume_breakout import calculate_vbo_long_signal, calculate_vbo_short_signal
+from vbo_scan import scan_vbo
 from panel import live_render
-from ws_client import start_ws, stop_ws
+from ws_client import start_ws, stop_ws, ws_ticker_board
 import threading
 from journal import log_trade
-import sys, threading, termios, tty, select, math
-from utils import (load_exchange_info, EXCHANGE_INFO, update_time_offset, ws_best_price,
-                   get_symbol_rule, floor_step_decimal, round_tick_decimal, to_decimal) # <-- 保留 Decimal 相關
+import sys, threading, termios, tty, select
+from utils import (load_exchange_info, refresh_exchange_info_async, EXCHANGE_INFO, update_time_offset,
+                   ws_snapshot)
+from precision import FLOOR, CEIL, HALF_UP, below_min_notional
 from signal_large_trades_ws import large_trades_signal_ws, near_anchor_ok # <-- 保留大單訊號
 
 
@@ -50,7 +52,6 @@ def state_iter():
     last_scan = 0
     last_time_sync = time.time()
     last_info_sync = 0.0 # 設為 0 以便啟動時立刻刷新
-    prev_syms = []
     account = {"equity": equity, "balance": None, "testnet": USE_TESTNET}
     paused = {"scan": False}
     top_gainers_list = [] # 分開儲存
@@ -61,6 +62,11 @@ def state_iter():
     COOLDOWN_SEC = 3
     REENTRY_BLOCK_SEC = 45
     cooldown = {"until": 0.0, "symbol_lock": {}}
+    board = ws_ticker_board()
+    rank_dirty = False
+    if USE_WEBSOCKET and WS_ALL_TICKERS:
+        board.watch(SCAN_TOP_N)
+        start_ws([], USE_TESTNET)  # 先只開全市場排行；掃描後再加上個別 symbol
 
     def log(msg, tag="SYS"):
         ts = datetime.now().strftime("%H:%M:%S")
@@ -108,9 +114,11 @@ def state_iter():
         # --- 定時刷新 Exchange Info ---
         if t_now - last_info_sync > 3600: # 每小時 (3600 秒)
              try:
-                 load_exchange_info() # 強制刷新
+                 if not EXCHANGE_INFO:
+                     load_exchange_info()  # 啟動：磁碟快取即時可用，背景再刷新
+                 elif refresh_exchange_info_async():
+                     log("Exchange info refreshing in background", "SYS")
                  last_info_sync = t_now
-                 log("Exchange info refreshed periodically", "SYS")
              except Exception as e:
                  log(f"Periodic exchange info refresh failed: {e}", "ERROR")
                  last_info_sync = t_now
@@ -137,8 +145,11 @@ def state_iter():
                 try:
                     sym = adapter.open["symbol"]
                     side = adapter.open["side"]
-                    lt = large_trades_signal_ws(sym) or {}
-                    nowp = ws_best_price(sym)
+                    # 大單累計與平倉價取自同一份快照，anchor 比較不會混到兩個時間點
+                    snap = ws_snapshot(sym, 0)
+                    lt = (large_trades_signal_ws(sym, snap) if snap else None) or {}
+                    # 平倉可成交價：平多吃 bid、平空吃 ask（最佳買賣價過期時退回最新價）
+                    nowp = (snap.exec_price("SELL" if side == "LONG" else "BUY") or snap.price) if snap else None
 
                     if nowp:
                         nowp_float = float(nowp)
@@ -211,126 +222,78 @@ def state_iter():
             if not day.state.halted:
                 # --- (修改) 掃描 & 更新 VBO 快取 (API 優化版) ---
                 EFFECTIVE_SCAN_INTERVAL = max(SCAN_INTERVAL_S, 12)  # 至少 12 秒
-                # ⚠️ 修正你多一個冒號的語法錯誤（這行不能有兩個冒號）
-                if not paused["scan"] and (t_now - last_scan > EFFECTIVE_SCAN_INTERVAL):
+                board_fresh = board.age() < WS_TICKER_STALE_S
+                # WS 排行有新幣擠進 TopN → 不等滿 12 秒，RANK_RESCAN_MIN_S 後就重掃
+                if board_fresh and board.drain_events():
+                    rank_dirty = True
+                scan_every = RANK_RESCAN_MIN_S if rank_dirty else EFFECTIVE_SCAN_INTERVAL
+                if not paused["scan"] and (t_now - last_scan > scan_every):
+                    rank_dirty = False
+                    symbols_for_ws = None
                     try:
-                        # Step 1: 拉當下漲/跌幅榜（各 1 次 API）
-                        top_gainers_list = fetch_top_gainers(SCAN_TOP_N)
-                        top_losers_list  = fetch_top_losers(SCAN_TOP_N) if ALLOW_SHORT else []
+                        # Step 1: 排行來源：WS 全市場排行新鮮時直接讀（0 次 API），否則拉一次 24h ticker 快照
+                        snapshot = board if board_fresh else fetch_ticker_snapshot()
+                        top_gainers_list = snapshot.top_gainers(SCAN_TOP_N)
+                        top_losers_list  = snapshot.top_losers(SCAN_TOP_N) if ALLOW_SHORT else []
                         last_scan = t_now
 
-                        # Step 2: 合併、去重（dict 以 symbol 當 key）
+                        # Step 2: 合併、去重（dict 以 symbol 當 key）；漲跌榜交錯排列，被上限截斷時兩邊都有
                         all_symbols_to_check = {}
-                        for (s, pct, last, vol) in top_gainers_list:
-                            all_symbols_to_check[s] = (s, pct, last, vol)
-                        if ALLOW_SHORT:
-                            for (s, pct, last, vol) in top_losers_list:
-                                all_symbols_to_check[s] = (s, pct, last, vol)
+                        for pair in zip_longest(top_gainers_list, top_losers_list):
+                            for row in pair:
+                                if row is not None:
+                                    all_symbols_to_check.setdefault(row[0], row)
 
-                        # Step 3: 限制本輪最多處理 12 檔，避免瞬間打爆 REST
-                        MAX_KLINES_PER_SCAN = 12
-                        symbols_to_process = list(all_symbols_to_check.keys())[:MAX_KLINES_PER_SCAN]
+                        # Step 3: 只評估 TopN 漲幅 + 跌幅榜（不是全市場）；SCAN_MAX_SYMBOLS 限制每輪抓 K 線的檔數
+                        #         （預設 2 * SCAN_TOP_N = 兩張榜全部；K 線仍要 REST 播種/補增量）
+                        symbols_to_process = list(all_symbols_to_check.keys())[:SCAN_MAX_SYMBOLS]
 
                         new_cache = {}
-                        symbols_for_ws = set()
+                        symbols_for_ws = set(symbols_to_process)
                         symbols_processed_count = 0
 
-                        # Step 4: 一檔一檔抓 K 線→算訊號（含輕微抖動）
-                        for symbol in symbols_to_process:
-                            (sym, pct, last, vol) = all_symbols_to_check[symbol]
-                            symbols_for_ws.add(sym)
-
-                            long_ok = False
-                            short_ok = False
-                            atr_value = None
-
-                            try:
-                                closes, highs, lows, vols = fetch_klines(sym, KLINE_INTERVAL, KLINE_LIMIT)
-                                long_ok, atr_long = calculate_vbo_long_signal(closes, highs, lows, vols)
-                                short_ok, atr_short = (calculate_vbo_short_signal(closes, highs, lows, vols)
-                                                       if ALLOW_SHORT else (False, None))
-                                atr_value = atr_long if (atr_long is not None and atr_long > 0) \
-                                           else (atr_short if (atr_short is not None and atr_short > 0) else None)
-                                symbols_processed_count += 1
-                            except Exception as fetch_e:
+                        # Step 4: 併發抓 K 線（LIMITER 控管權重）；先完成的先更新增量特徵（VboState，O(1)），
+                        #         收齊後只剩條件判斷，整批向量化
+                        fetched = {}
+                        for sym, bars, fetch_e in fetch_klines_many(symbols_to_process, KLINE_INTERVAL, KLINE_LIMIT):
+                            if fetch_e is not None:
                                 log(f"Error fetching/processing klines for {sym}: {fetch_e}", "WARN")
-
-                            new_cache[sym] = {"long": bool(long_ok), "short": bool(short_ok), "atr": atr_value}
-
-                            # 抖動 0.06~0.10 秒，降低 429 機率
-                            time.sleep(0.06 + 0.04 * random.random())
+                                continue
+                            try:
+                                feats = KLINE_STORE.vbo_features(sym, KLINE_INTERVAL)
+                            except Exception as e:
+                                log(f"VBO features error for {sym}: {type(e).__name__} {e}", "WARN")
+                                feats = None
+                            fetched[sym] = feats if feats is not None else bars
+                            new_cache[sym] = {"long": False, "short": False, "atr": None}
+                        symbols_processed_count = len(fetched)
+                        try:
+                            candidates = scan_vbo(fetched, KLINE_LIMIT, allow_short=ALLOW_SHORT)
+                        except Exception as e:
+                            log(f"VBO batch scan error: {type(e).__name__} {e}", "WARN")
+                            candidates = []
+                        for cand in candidates:
+                            new_cache[cand.symbol] = {"long": cand.long, "short": cand.short, "atr": cand.atr}
+                        if candidates:
+                            log("VBO candidates: " + ", ".join(f"{c.symbol}({'L' if c.long else 'S'} x{c.vol_ratio:.1f})"
+                                                              for c in candidates[:5]), "SCAN")
 
                         vbo_cache = new_cache
                         log(f"VBO cache updated for {symbols_processed_count}/{len(symbols_to_process)} symbols.", "SCAN")
                         # --- 核心修改結束 ---
 
-                        # --- WebSocket 訂閱管理（跟著本輪處理的 symbols 對齊） ---
-                        if USE_WEBSOCKET:
-                            current_position_sym = None  # 無持倉
-                            syms_to_subscribe_set = set(symbols_for_ws)
-
-                            current_set_to_subscribe = syms_to_subscribe_set
-                            previous_subscribed_set = set(prev_syms)
-                            symbols_changed_count = len(current_set_to_subscribe.symmetric_difference(previous_subscribed_set))
-                            RELOAD_THRESHOLD = 5
-
-                            needs_restart = False
-                            if current_set_to_subscribe != previous_subscribed_set:
-                                if not prev_syms:
-                                    needs_restart = True
-                                    print("DEBUG: First WebSocket subscription.")
-                                elif symbols_changed_count > RELOAD_THRESHOLD:
-                                    needs_restart = True
-                                    print(f"DEBUG: Symbol set changed significantly ({symbols_changed_count} changes > {RELOAD_THRESHOLD}). Reloading WebSocket.")
-                                    diff_added = current_set_to_subscribe - previous_subscribed_set
-                                    diff_removed = previous_subscribed_set - current_set_to_subscribe
-                                    if diff_added:  print(f"DEBUG: Added symbols: {diff_added}")
-                                    if diff_removed: print(f"DEBUG: Removed symbols: {diff_removed}")
-
-                            if needs_restart:
-                                syms_to_subscribe_list = sorted(list(current_set_to_subscribe))
-                                start_ws(syms_to_subscribe_list, USE_TESTNET)
-                                prev_syms = syms_to_subscribe_list
-
                     except Exception as e:
                         import traceback
                         traceback.print_exc()
                         log(f"Scan/Cache/WS error: {type(e).__name__} {e}", "SCAN")
 
-                        # --- WebSocket 訂閱管理 ---
-                        if USE_WEBSOCKET:
-                            current_position_sym = None # 無持倉
-                            # 訂閱 TopN 漲幅 + 跌幅
-                            syms_to_subscribe_set = set(symbols_for_ws)
-                            
-                            current_set_to_subscribe = syms_to_subscribe_set
-                            previous_subscribed_set = set(prev_syms)
-
-                            symbols_changed_count = len(current_set_to_subscribe.symmetric_difference(previous_subscribed_set))
-                            RELOAD_THRESHOLD = 5
-
-                            needs_restart = False
-                            if current_set_to_subscribe != previous_subscribed_set:
-                                if not prev_syms:
-                                     needs_restart = True
-                                     print("DEBUG: First WebSocket subscription.")
-                                elif symbols_changed_count > RELOAD_THRESHOLD:
-                                     needs_restart = True
-                                     print(f"DEBUG: Symbol set changed significantly ({symbols_changed_count} changes > {RELOAD_THRESHOLD}). Reloading WebSocket.")
-                                     diff_added = current_set_to_subscribe - previous_subscribed_set
-                                     diff_removed = previous_subscribed_set - current_set_to_subscribe
-                                     if diff_added: print(f"DEBUG: Added symbols: {diff_added}")
-                                     if diff_removed: print(f"DEBUG: Removed symbols: {diff_removed}")
-
-                            if needs_restart:
-                                syms_to_subscribe_list = sorted(list(current_set_to_subscribe))
-                                start_ws(syms_to_subscribe_list, USE_TESTNET)
-                                prev_syms = syms_to_subscribe_list
-
-                    except Exception as e:
-                        import traceback
-                        traceback.print_exc()
-                        log(f"Scan/Cache/WS error: {type(e).__name__} {e}", "SCAN")
+                    # --- WebSocket 訂閱跟著本輪處理的 symbols 對齊 ---
+                    # start_ws 只送 SUBSCRIBE/UNSUBSCRIBE 差異，留下的 symbol 快取不受影響；集合相同時不做事
+                    if USE_WEBSOCKET and symbols_for_ws is not None:
+                        try:
+                            start_ws(sorted(symbols_for_ws), USE_TESTNET)
+                        except Exception as e:
+                            log(f"WS subscribe error: {type(e).__name__} {e}", "WS")
 
 
                 # --- 尋找進場候選 ---
@@ -350,13 +313,14 @@ def state_iter():
                         ok_vbo_long = vbo_data.get("long", False)
                         atr_value = vbo_data.get("atr")
 
-                        lt = large_trades_signal_ws(s) or {}
+                        snap = ws_snapshot(s, 0)
+                        lt = (large_trades_signal_ws(s, snap) if snap else None) or {}
                         ok_lt_long = False
                         nowp_float = None
 
                         if lt.get("buy_signal"):
                             try:
-                                nowp = ws_best_price(s)
+                                nowp = snap.exec_price("BUY") or snap.price
                                 if nowp is not None: nowp_float = float(nowp)
                                 else: nowp_float = float(last)
                                 nowp_cache[s] = nowp_float
@@ -383,13 +347,14 @@ def state_iter():
                             ok_vbo_short = vbo_data.get("short", False)
                             atr_value = vbo_data.get("atr")
 
-                            lt = large_trades_signal_ws(s) or {}
+                            snap = ws_snapshot(s, 0)
+                            lt = (large_trades_signal_ws(s, snap) if snap else None) or {}
                             ok_lt_short = False
                             nowp_float = None
 
                             if lt.get("sell_signal"):
                                 try:
-                                    nowp = ws_best_price(s)
+                                    nowp = snap.exec_price("SELL") or snap.price
                                     if nowp is not None: nowp_float = float(nowp)
                                     else: nowp_float = float(last)
                                     nowp_cache[s] = nowp_float
@@ -405,58 +370,19 @@ def state_iter():
                                 log(f"Signal: SHORT (VBO:{ok_vbo_short}, LT:{ok_lt_short}) ATR:{atr_value:.4g} @{entry_price:.6g}", s)
                                 break
 
-                # --- 執行下單 (保留 Decimal 版本) ---
+                # --- 執行下單 ---
                 if candidate:
                     symbol, entry, side, atr_for_trade = candidate
-                    
-                    tick_size_dec = None
-                    step_size_dec = None
-                    min_notional_rule = None
-                    qty_prec = 0
-                    price_prec = 4
 
-                    try:
-                        try:
-                            prec = EXCHANGE_INFO[symbol]
-                            qty_prec = prec['quantityPrecision']
-                            price_prec = prec['pricePrecision']
-                            tick_size_str = prec.get('tickSize')
-                            step_size_str = prec.get('stepSize')
-                            min_notional_rule = prec.get('minNotional')
-                            if tick_size_str: tick_size_dec = to_decimal(tick_size_str)
-                            if step_size_str: step_size_dec = to_decimal(step_size_str)
-                            if min_notional_rule is not None and not isinstance(min_notional_rule, Decimal):
-                                 min_notional_rule = to_decimal(min_notional_rule)
-                        except KeyError:
-                            log(f"No exchange info for {symbol}. Attempting live refresh...", "SYS")
-                            load_exchange_info()
-                            prec = EXCHANGE_INFO[symbol]
-                            qty_prec = prec['quantityPrecision']
-                            price_prec = prec['pricePrecision']
-                            tick_size_str = prec.get('tickSize')
-                            step_size_str = prec.get('stepSize')
-                            min_notional_rule = prec.get('minNotional')
-                            if tick_size_str: tick_size_dec = to_decimal(tick_size_str)
-                            if step_size_str: step_size_dec = to_decimal(step_size_str)
-                            if min_notional_rule is not None: min_notional_rule = to_decimal(min_notional_rule)
-                            log(f"Successfully refreshed info for {symbol}", "SYS")
-                    except KeyError:
-                        log(f"Refresh failed. {symbol} not in official list. Using fallback guess.", "ERR")
-                        qty_prec = 0
-                        s_entry = f"{entry:.15f}"
-                        if '.' in s_entry:
-                             decimals = s_entry.split('.')[-1]
-                             non_zero_idx = next((i for i, char in enumerate(decimals) if char != '0'), -1)
-                             price_prec = (non_zero_idx + 3) if non_zero_idx != -1 else 4
-                        else: price_prec = 0
-                        price_prec = min(price_prec, 8)
-                        log(f"Guessed price_prec={price_prec} for {symbol}", "SYS")
-                        if price_prec > 0: tick_size_dec = Decimal('1e-' + str(price_prec))
-                        if qty_prec == 0: step_size_dec = Decimal('1')
-                        min_notional_rule = MIN_NOTIONAL_FALLBACK
-                    except (InvalidOperation, TypeError, ValueError) as parse_e:
-                        log(f"ORDER FAILED for {symbol}: Error parsing precision rules: {parse_e}", "ERROR")
+                    # 規則已預先編譯（SymbolRule）；查不到就背景刷新、跳過這次候選，不在下單途中同步重抓
+                    rule = EXCHANGE_INFO.get(symbol)
+                    if rule is None:
+                        log(f"No exchange info for {symbol}; refreshing in background, skip.", "SYS")
+                        refresh_exchange_info_async()
+                        cooldown["until"] = time.time() + 1
                         continue
+                    min_notional_rule = rule.min_notional
+                    qg, pg = rule.qty_grid, rule.price_grid
 
                     if atr_for_trade is None or atr_for_trade <= 0:
                         log(f"ORDER FAILED for {symbol}: Invalid ATR value {atr_for_trade} before pos sizing", "ERROR")
@@ -467,26 +393,18 @@ def state_iter():
                         log(f"Skipping {symbol}, calculated notional <= 0", "SYS")
                         continue
 
-                    entry_dec = to_decimal(entry)
-                    qty_dec = Decimal('NaN')
-                    if entry_dec.is_finite() and entry_dec > Decimal(0) and step_size_dec is not None and step_size_dec.is_finite() and step_size_dec > Decimal(0):
-                         qty_raw_dec = to_decimal(notional) / entry_dec
-                         qty_dec = floor_step_decimal(qty_raw_dec, step_size_dec)
-                    elif entry > 0:
-                         qty_raw = notional / entry
-                         qty_factor = 10**qty_prec
-                         qty_f = math.floor(qty_raw * qty_factor) / qty_factor
-                         qty_dec = to_decimal(qty_f)
-
-                    if not qty_dec.is_finite() or qty_dec <= Decimal(0):
-                        log(f"Skipping {symbol}, calculated qty is invalid or zero (QtyDec={qty_dec}, Notional={notional:.2f})", "SYS")
+                    # 整數格線對齊（precision.Grid），與原 Decimal 路徑結果相同：數量向下取到 step
+                    try:
+                        qty_n = qg.steps_of_ratio(notional, entry, FLOOR)
+                    except (ValueError, ZeroDivisionError):
+                        qty_n = 0
+                    if qty_n <= 0:
+                        log(f"Skipping {symbol}, calculated qty is invalid or zero (Qty={qg.to_str(qty_n)}, Notional={notional:.2f})", "SYS")
                         cooldown["until"] = time.time() + 1
                         continue
 
-                    current_notional = qty_dec * entry_dec
-                    min_notional_valid = min_notional_rule is not None and min_notional_rule.is_finite()
-                    if min_notional_valid and current_notional < min_notional_rule:
-                        log(f"Skipping {symbol}, Notional {current_notional:.2f} < MinNotional {min_notional_rule}", "SYS")
+                    if min_notional_rule is not None and below_min_notional(qg, qty_n, entry, min_notional_rule):
+                        log(f"Skipping {symbol}, Notional {qg.to_float(qty_n) * entry:.2f} < MinNotional {min_notional_rule}", "SYS")
                         continue
 
                     sl_raw, tp_raw = compute_bracket(entry, side, atr_for_trade)
@@ -494,34 +412,24 @@ def state_iter():
                         log(f"ORDER FAILED for {symbol}: Cannot compute SL/TP (ATR={atr_for_trade})", "ERROR")
                         continue
 
-                    sl_dec = to_decimal(sl_raw)
-                    tp_dec = to_decimal(tp_raw)
-                    entry_fmt_dec = entry_dec
-
-                    if tick_size_dec is not None and tick_size_dec.is_finite() and tick_size_dec > Decimal(0):
-                         sl_dec = round_tick_decimal(sl_dec, tick_size_dec, direction=-1 if side=="LONG" else +1)
-                         tp_dec = round_tick_decimal(tp_dec, tick_size_dec, direction=+1 if side=="LONG" else -1)
-                         entry_fmt_dec = round_tick_decimal(entry_fmt_dec, tick_size_dec)
-                    else:
-                         sl_dec = to_decimal(round(sl_raw, price_prec))
-                         tp_dec = to_decimal(round(tp_raw, price_prec))
-                         entry_fmt_dec = to_decimal(round(entry, price_prec))
-
-                    qty_final = float(qty_dec)
-                    sl_final = float(sl_dec)
-                    tp_final = float(tp_dec)
-                    entry_fmt_final = float(entry_fmt_dec)
-
-                    if not math.isfinite(qty_final) or qty_final <= 0 or \
-                       not math.isfinite(sl_final) or not math.isfinite(tp_final) or \
-                       not math.isfinite(entry_fmt_final):
-                        log(f"ORDER FAILED for {symbol}: Final calculated values are invalid. Qty={qty_final}, SL={sl_final}, TP={tp_final}", "ERROR")
+                    # SL 往不利方向、TP 往有利方向取整到 tick；進場價四捨五入
+                    try:
+                        sl_n = pg.steps(sl_raw, FLOOR if side == "LONG" else CEIL)
+                        tp_n = pg.steps(tp_raw, CEIL if side == "LONG" else FLOOR)
+                        entry_n = pg.steps(entry, HALF_UP)
+                    except ValueError:
+                        log(f"ORDER FAILED for {symbol}: Final calculated values are invalid. SL={sl_raw}, TP={tp_raw}", "ERROR")
                         continue
 
+                    qty_final = qg.to_float(qty_n)
+                    sl_final = pg.to_float(sl_n)
+                    tp_final = pg.to_float(tp_n)
+                    entry_fmt_final = pg.to_float(entry_n)
+
                     try:
                         adapter.place_bracket(symbol, side, qty_final, entry_fmt_final, sl_final, tp_final)
                         position_view = {"symbol":symbol, "side":side, "qty":qty_final, "entry":entry_fmt_final, "sl":sl_final, "tp":tp_final}
-                        log(f"OPEN {side} {symbol} Qty={qty_final:.{qty_prec}f} @{entry_fmt_final:.{price_prec}f} SL={sl_final:.{price_prec}f} TP={tp_final:.{price_prec}f}", "ORDER")
+                        log(f"OPEN {side} {symbol} Qty={qg.to_str(qty_n)} @{pg.to_str(entry_n)} SL={pg.to_str(sl_n)} TP={pg.to_str(tp_n)}", "ORDER")
                         cooldown["until"] = time.time() + COOLDOWN_SEC
                     except Exception as e:
                         log(f"ORDER FAILED for {symbol}: {e}", "ERROR")
@@ -4,13 +4,13 @@ from rich.layout import Layout
 from rich.live import Live
 from rich.console import Console
 from rich.text import Text
-from utils import ws_best_price
+from utils import ws_best_price, ws_snapshot
 
 console = Console()
 
 def _fmt_last(symbol: str, last_val):
-    p = ws_best_price(symbol)
-    v = p if p is not None else last_val
+    snap = ws_snapshot(symbol, 0)
+    v = snap.price if snap is not None and snap.price is not None else last_val
     try:
         return f"{float(v):.6g}"
     except Exception:
@@ -0,0 +1,133 @@
+# file: precision.py
+"""
+價格 / 數量對齊（整數運算）：取代 floor_step_decimal / round_tick_decimal 的 Decimal 除法 + quantize。
+
+- Grid("0.0010")：tick/step 表示成 units / 10**decimals（此例 1 / 1000）
+- 輸入值以 repr 的十進位字串轉成 (m, e)（= Decimal(str(x)) 的數值），除法在整數上精確完成
+- 模式：FLOOR = 向零（Decimal ROUND_DOWN）、CEIL = 遠離零（ROUND_UP）、HALF_UP = ROUND_HALF_UP
+  （下單價格/數量皆為正，FLOOR/CEIL 即一般的向下/向上）
+- 結果是「第幾格」的整數 n；to_float / to_str 直接產生 float 與下單字串（固定 decimals 位小數）
+- format 收到已對齊的 float 時不解析 repr，直接 %.{decimals}f（與 to_str 結果相同）
+"""
+from decimal import Decimal
+from typing import Tuple, Union
+
+FLOOR, HALF_UP, CEIL = -1, 0, 1
+
+Number = Union[float, int, str, Decimal]
+
+
+_POW10 = [10 ** i for i in range(64)]
+
+
+def _pow10(e: int) -> int:
+    return _POW10[e] if e < 64 else 10 ** e
+
+
+def to_ratio(v: Number) -> Tuple[int, int]:
+    """v → (m, e)，v == m / 10**e（e >= 0）；float 取 repr（與 Decimal(str(v)) 相同）。非有限值 ValueError。"""
+    if v.__class__ is float:
+        s = repr(v)
+        if "e" not in s and "n" not in s:   # 常見情況：'0.012345'（排除 inf/nan）
+            ip, _, fp = s.partition(".")
+            return int(ip + fp), len(fp)
+    elif isinstance(v, int):
+        return v, 0
+    else:
+        s = str(v)
+    mant, _, exp = s.lower().partition("e")
+    ip, _, fp = mant.partition(".")
+    try:
+        m = int(ip + fp)
+    except ValueError:
+        raise ValueError(f"not a finite number: {v!r}")
+    e = len(fp) - (int(exp) if exp else 0)
+    if e < 0:
+        return m * _pow10(-e), 0
+    return m, e
+
+
+def _div_round(num: int, den: int, mode: int) -> int:
+    """num / den（den > 0）依模式取整；負數與 Decimal 一樣以絕對值處理後補號。"""
+    q, r = divmod(abs(num), den)
+    if r:
+        if mode > 0 or (mode == 0 and 2 * r >= den):
+            q += 1
+    return -q if num < 0 else q
+
+
+class Grid:
+    """單一 tick 或 step 的對齊格線；不可變。"""
+    __slots__ = ("units", "decimals", "scale", "size", "_spec", "_fast_max")
+
+    def __init__(self, size: Number):
+        m, e = to_ratio(size)
+        while e and m % 10 == 0:   # "0.0010" → 1 / 1000
+            m //= 10
+            e -= 1
+        if m <= 0:
+            raise ValueError(f"grid size must be > 0: {size!r}")
+        object.__setattr__(self, "units", m)
+        object.__setattr__(self, "decimals", e)
+        object.__setattr__(self, "scale", 10 ** e)
+        object.__setattr__(self, "size", m / 10 ** e)
+        object.__setattr__(self, "_spec", f".{e}f")
+        # 格點值 <= 14 位有效數字：repr 一定是該格點的十進位字串，%.{e}f 也會印出同一個值
+        object.__setattr__(self, "_fast_max", 10.0 ** (14 - e))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Grid is immutable")
+
+    def __repr__(self):
+        return f"Grid({self.to_str(1)})"
+
+    # --- 對齊 ---
+    def steps(self, value: Number, mode: int = HALF_UP) -> int:
+        """value 落在第幾格（依 mode 取整）。"""
+        m, e = to_ratio(value)
+        return _div_round(m * self.scale, self.units * _pow10(e), mode)
+
+    def steps_of_ratio(self, a: Number, b: Number, mode: int = FLOOR) -> int:
+        """(a / b) 落在第幾格，整個除法精確完成（例如 notional / price → 數量）。"""
+        ma, ea = to_ratio(a)
+        mb, eb = to_ratio(b)
+        if mb == 0:
+            raise ZeroDivisionError("division by zero")
+        num, den = ma * _pow10(eb) * self.scale, mb * _pow10(ea) * self.units
+        if den < 0:
+            num, den = -num, -den
+        return _div_round(num, den, mode)
+
+    # --- 輸出 ---
+    def to_float(self, n: int) -> float:
+        return n * self.units / self.scale   # int / int：正確捨入的 float
+
+    def to_str(self, n: int) -> str:
+        """下單字串：固定 decimals 位小數，不經過 float。"""
+        v = n * self.units
+        if not self.decimals:
+            return str(v)
+        sign = "-" if v < 0 else ""
+        digits = str(abs(v)).rjust(self.decimals + 1, "0")
+        return f"{sign}{digits[:-self.decimals]}.{digits[-self.decimals:]}"
+
+    def to_decimal(self, n: int) -> Decimal:
+        return Decimal(n * self.units).scaleb(-self.decimals)
+
+    def round(self, value: Number, mode: int = HALF_UP) -> float:
+        return self.to_float(self.steps(value, mode))
+
+    def format(self, value: Number, mode: int = HALF_UP) -> str:
+        # 常見情況：傳入的是已對齊的 float（round / to_float 的結果）→ 不解析 repr，直接用 %.{decimals}f
+        if value.__class__ is float and -self._fast_max < value < self._fast_max:
+            n = round(value * self.scale / self.units)
+            if n and n * self.units / self.scale == value:
+                return format(value, self._spec)
+        return self.to_str(self.steps(value, mode))
+
+
+def below_min_notional(qty_grid: Grid, qty_steps: int, price: Number, min_notional: Number) -> bool:
+    """qty * price < min_notional（精確比較，不經 Decimal/float）。"""
+    mp, ep = to_ratio(price)
+    mn, en = to_ratio(min_notional)
+    return qty_steps * qty_grid.units * mp * _pow10(en) < mn * qty_grid.scale * _pow10(ep)
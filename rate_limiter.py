@@ -0,0 +1,210 @@
+# file: rate_limiter.py
+"""
+全域 REST 權重限流器（Binance Futures IP weight）。
+
+- Token bucket：以每分鐘權重上限 * 安全係數為容量，依秒補充（平滑突發）
+- 伺服器是「固定分鐘視窗」計權重：另記本視窗已花費權重，
+  並以每個回應的 X-MBX-USED-WEIGHT-1M（取視窗內最大值）對齊，兩者取大
+- 依已用比例（相對於容量）自動調整同時在途請求數（AIMD：接近上限減半，寬鬆時 +1）
+- 429/418 依 Retry-After 設定全域封鎖時間；等待過久直接拋 RateLimitBackoff，
+  不再讓主迴圈卡 60 秒
+"""
+import threading, time
+from typing import Any, Dict, Optional
+
+
+class RateLimitBackoff(RuntimeError):
+    """目前處於 429/418 封鎖期，且剩餘時間超過呼叫端可接受的等待上限。"""
+
+
+# --- 端點權重（USDⓈ-M Futures；未列出的以 1 計） ---
+_WEIGHT_FIXED = {
+    "/fapi/v1/time": 1,
+    "/fapi/v1/exchangeInfo": 1,
+    "/fapi/v1/order": 1,
+    "/fapi/v1/allOpenOrders": 1,
+    "/fapi/v1/aggTrades": 20,
+    "/fapi/v2/balance": 5,
+}
+
+
+def endpoint_weight(path: str, params: Optional[Dict[str, Any]] = None) -> int:
+    """回傳單次請求的 IP 權重（依 Binance 文件；與參數相關者另外計算）。"""
+    params = params or {}
+    if path == "/fapi/v1/ticker/24hr":
+        return 1 if params.get("symbol") else 40
+    if path == "/fapi/v1/ticker/price":
+        return 1 if params.get("symbol") else 2
+    if path == "/fapi/v1/klines":
+        try:
+            limit = int(params.get("limit", 500))
+        except (TypeError, ValueError):
+            limit = 500
+        if limit < 100: return 1
+        if limit < 500: return 2
+        if limit <= 1000: return 5
+        return 10
+    return _WEIGHT_FIXED.get(path, 1)
+
+
+class WeightLimiter:
+    def __init__(self, limit: int = 2400, window_s: float = 60.0, safety: float = 0.8,
+                 max_inflight: int = 8, min_inflight: int = 1):
+        self.limit = int(limit)
+        self.window_s = float(window_s)
+        self.capacity = max(1.0, self.limit * safety)
+        self.rate = self.capacity / self.window_s          # 每秒補充的權重
+        self.ceiling = max(1, int(max_inflight))
+        self.floor = max(1, min(int(min_inflight), self.ceiling))
+
+        self._cond = threading.Condition()
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._inflight = 0
+        self._inflight_weight = 0
+        self._max_inflight = self.ceiling
+        self._last_adjust = 0.0
+        self._banned_until = 0.0
+        self._window_id = None
+        self._window_spent = 0.0       # 本視窗本地已送出的權重
+        self._window_server_max = 0    # 本視窗伺服器回報的最大已用權重
+
+        # 統計（給面板/工具看）
+        self.server_used = 0
+        self.requests = 0
+        self.throttled = 0      # acquire 時需要等待的次數
+        self.penalties = 0      # 收到 429/418 的次數
+        self.wait_s = 0.0
+
+    # --- 內部 ---
+    def _refill(self, now: float):
+        dt = now - self._last
+        if dt > 0:
+            self._tokens = min(self.capacity, self._tokens + dt * self.rate)
+            self._last = now
+
+    def _roll_window(self):
+        wid = int(time.time() // self.window_s)
+        if wid != self._window_id:
+            self._window_id = wid
+            self._window_spent = 0.0
+            self._window_server_max = 0
+
+    def _window_left(self) -> float:
+        self._roll_window()
+        return self.capacity - max(self._window_spent, float(self._window_server_max))
+
+    def _adjust(self, used_ratio: float, now: float):
+        if now - self._last_adjust < 1.0:
+            return
+        if used_ratio >= 0.85:
+            self._max_inflight = max(self.floor, self._max_inflight // 2)
+            self._last_adjust = now
+        elif used_ratio <= 0.5 and self._max_inflight < self.ceiling:
+            self._max_inflight += 1
+            self._last_adjust = now
+
+    # --- 對外 ---
+    @property
+    def concurrency(self) -> int:
+        """目前允許的同時在途請求數（上層 thread pool 可據此決定 worker 數）。"""
+        return self._max_inflight
+
+    def acquire(self, weight: int = 1, max_wait: float = 30.0):
+        """
+        取得 weight 權重與一個在途名額；不足時阻塞等待。
+        封鎖期剩餘時間 > max_wait 時拋 RateLimitBackoff。
+        """
+        weight = min(float(max(1, weight)), self.capacity)
+        deadline = time.monotonic() + max_wait
+        waited = False
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._banned_until > now:
+                    if self._banned_until > deadline:
+                        raise RateLimitBackoff(f"REST banned for {self._banned_until - now:.1f}s more")
+                    delay = self._banned_until - now
+                elif self._inflight >= self._max_inflight:
+                    delay = None  # 等 release 通知
+                else:
+                    self._refill(now)
+                    left = self._window_left()
+                    if self._tokens >= weight and left >= weight:
+                        self._tokens -= weight
+                        self._window_spent += weight
+                        self._inflight += 1
+                        self._inflight_weight += weight
+                        self.requests += 1
+                        if waited:
+                            self.throttled += 1
+                        return
+                    if left < weight:  # 本視窗額度用完 → 等到下個視窗
+                        delay = self.window_s - (time.time() % self.window_s) + 0.01
+                    else:
+                        delay = (weight - self._tokens) / self.rate
+                if now >= deadline:
+                    raise RateLimitBackoff(f"REST weight budget not available within {max_wait:.1f}s")
+                waited = True
+                t0 = time.monotonic()
+                self._cond.wait(timeout=min(deadline - now, delay if delay is not None else 0.5))
+                self.wait_s += time.monotonic() - t0
+
+    def release(self, weight: int = 1, headers=None, status: Optional[int] = None):
+        """請求結束（不論成敗）必呼叫；帶回應 headers/status 以同步伺服器端權重。"""
+        weight = min(float(max(1, weight)), self.capacity)
+        with self._cond:
+            self._inflight = max(0, self._inflight - 1)
+            self._inflight_weight = max(0, self._inflight_weight - weight)
+            now = time.monotonic()
+            if headers is not None:
+                self._sync(headers, now)
+            if status in (418, 429):
+                self._penalize(status, headers, now)
+            self._cond.notify_all()
+
+    def _sync(self, headers, now: float):
+        used = headers.get("X-MBX-USED-WEIGHT-1M") or headers.get("x-mbx-used-weight-1m")
+        if used is None:
+            return
+        try:
+            used = int(used)
+        except (TypeError, ValueError):
+            return
+        self.server_used = used
+        self._roll_window()
+        # 回應可能亂序抵達：視窗內只取最大值，避免舊回應把額度「加回來」
+        self._window_server_max = max(self._window_server_max, used)
+        self._adjust(used / self.capacity, now)
+
+    def _penalize(self, status: int, headers, now: float):
+        ra = None
+        if headers is not None:
+            ra = headers.get("Retry-After") or headers.get("retry-after")
+        try:
+            sleep_s = float(ra) if ra is not None else (120.0 if status == 418 else 5.0)
+            if sleep_s > 1000:  # 部分回應以毫秒表示
+                sleep_s /= 1000.0
+        except (TypeError, ValueError):
+            sleep_s = 120.0 if status == 418 else 5.0
+        self.penalties += 1
+        self._banned_until = max(self._banned_until, now + sleep_s)
+        self._tokens = 0.0
+        self._max_inflight = self.floor
+        self._last_adjust = now
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "server_used": self.server_used,
+                "limit": self.limit,
+                "tokens": round(self._tokens, 1),
+                "window_left": round(self._window_left(), 1),
+                "inflight": self._inflight,
+                "max_inflight": self._max_inflight,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "penalties": self.penalties,
+                "wait_s": round(self.wait_s, 3),
+                "banned_for_s": max(0.0, round(self._banned_until - time.monotonic(), 1)),
+            }
@@ -0,0 +1,574 @@
+# file: shm_feed.py
+"""
+WS_PROCESS 模式：逐筆成交 / 最佳買賣價的 WebSocket 收訊與解析放到獨立行程，寫進 multiprocessing.shared_memory，
+策略行程（主迴圈、Rich 面板、鍵盤執行緒）只讀共享記憶體，不再和收訊執行緒搶 GIL。
+
+- 子行程：python -m shm_feed（不是 multiprocessing spawn，避免重新匯入 main.py / utils 的網路校時），
+  內部就是原本的 ws_client 分片，只是 _AGG / _BOOK 換成寫進共享記憶體的版本；
+  控制訊息走 stdin（一行一個 JSON），父行程結束 → stdin EOF → 子行程自行收掉
+- 逐筆成交補洞（aggTrades REST）由子行程經另一條 pipe 請父行程代抓：權重記在父行程的 LIMITER / ROUTER，
+  子行程不匯入 utils（不做第二次網路校時、不另起一份限流額度）；結果同樣走 stdin 回傳
+- 共享記憶體：開頭一段行程層級 header（心跳、訊息數），之後每個 slot 一個 symbol：
+  ring header（seqlock 發布的 AggRing 狀態）+ bookTicker 紀錄（seqlock）+ 鏡像欄式成交陣列（同 AggRing）
+- slot 由父行程分配，每次分配帶新的 tag；子行程先把換手的 slot 移出寫入對照表、等各分片 event loop 跑完手上的寫入，
+  清空 slot 後才寫入 tag，父行程只讀 tag 相符的 slot
+  （剛換手、尚未清空的 slot 讀起來就是「沒有資料」）；釋放的 slot 排到最後才重用
+- 讀取端拿到的 ring 綁定 (slot, tag)：每次讀取都核對 tag（snapshot / window_sums 讀完再核對一次），
+  slot 換手之後，先前拿到的 ring 讀起來是空的，不會讀到新 symbol 的資料
+- 讀取端零複製：ShmAggRing 就是 AggRing（since/last/snapshot/window_sums 都能用），只是欄位與發布狀態在共享記憶體
+- seqlock 沒有記憶體屏障，依賴寫入依程式順序對其他 CPU 可見（x86-64 的 TSO 成立；arm64 等不成立）
+  → 非 x86-64 不啟動（FeedProcess.start 丟 RuntimeError，ws_client 改回同行程分片）
+- !ticker@arr 與 K 線仍在父行程（排行與 KLINE_STORE 都在父行程），量小
+"""
+import json, os, platform, subprocess, sys, threading, time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from agg_ring import AggRing, AggSnapshot, AggWindow, WindowSums, _EMPTY_STATE, _TYPECODES
+
+# 行程 header（int64）
+_F_MAGIC, _F_HEARTBEAT_MS, _F_MSGS, _F_PID = range(4)
+_FEED_HDR = 64
+_MAGIC = 0x5348_4D46_4545_4431
+
+# ring header：int64 欄位 + 4 個 double（買/賣量與 px*qty）
+_GEN, _WRITING, _COUNT, _LAST_TS, _TAIL, _NB, _NS, _LAST_TS_W, _OWNER = range(9)
+_RING_I = 9 * 8
+_RING_D = 4 * 8
+_RING_HDR = 128
+# bookTicker 紀錄：int64 [gen, u] + double [bid, ask, at]
+_BOOK_HDR = 64
+
+
+def seqlock_safe() -> bool:
+    """共享記憶體的 seqlock 只在 x86-64（寫入順序即可見順序）上成立。"""
+    return platform.machine().lower() in ("x86_64", "amd64")
+
+
+def _pad(n: int, a: int = 64) -> int:
+    return (n + a - 1) // a * a
+
+
+def slot_bytes(capacity: int) -> int:
+    return _RING_HDR + _BOOK_HDR + _pad(50 * capacity)
+
+
+class ShmAggRing(AggRing):
+    """
+    欄位放在共享記憶體的 AggRing。寫入端（子行程）沿用 AggRing.append；發布狀態改寫進 header（seqlock），
+    讀取端（父行程）以同一個類別掛上同一段記憶體，所有讀取方法不變；bind(tag) 的讀取端每次讀取都核對 slot 的 tag。
+    """
+    __slots__ = ("_hi", "_hd", "_wstate", "_tag")
+
+    def __init__(self, buf: memoryview, capacity: int, window_ms: int, writer: bool):
+        self.capacity = capacity
+        self.window_ms = window_ms
+        self.retries = 0
+        self._hi = buf[0:_RING_I].cast("q")
+        self._hd = buf[_RING_I:_RING_I + _RING_D].cast("d")
+        n = 2 * capacity
+        d = buf[_RING_HDR + _BOOK_HDR:]
+        self._ts = d[0:8 * n].cast("q")
+        self._px = d[8 * n:16 * n].cast("d")
+        self._qty = d[16 * n:24 * n].cast("d")
+        self._side = d[24 * n:25 * n].cast("b")
+        self._mv = (self._ts, self._px, self._qty, self._side)
+        self._tag = 0           # 0 = 不核對（寫入端 / 未綁定）
+        self._wstate = self._read_state() if writer else None
+
+    def bind(self, tag: int) -> "ShmAggRing":
+        """同一段記憶體、綁定 tag 的讀取端；slot 換手（tag 改變）後讀起來是空的。"""
+        h = ShmAggRing.__new__(ShmAggRing)
+        h.capacity, h.window_ms, h.retries = self.capacity, self.window_ms, 0
+        h._hi, h._hd, h._wstate, h._tag = self._hi, self._hd, None, tag
+        h._ts, h._px, h._qty, h._side, h._mv = self._ts, self._px, self._qty, self._side, self._mv
+        return h
+
+    def _owned(self) -> bool:
+        return not self._tag or self._hi[_OWNER] == self._tag
+
+    def _read_state(self):
+        hi, hd = self._hi, self._hd
+        while True:
+            g = hi[_GEN]
+            if not g & 1:
+                st = (hi[_COUNT], hi[_LAST_TS], hi[_TAIL], hi[_NB], hd[0], hd[1], hi[_NS], hd[2], hd[3])
+                if hi[_GEN] == g:
+                    return st if self._owned() else _EMPTY_STATE
+            time.sleep(0)
+
+    # --- 讀完再核對 tag：讀取期間 slot 換手就當作沒有資料（tag 不重複使用）---
+    def snapshot(self, since_ms: int, now_ms: Optional[int] = None) -> AggSnapshot:
+        snap = AggRing.snapshot(self, since_ms, now_ms)
+        if self._owned():
+            return snap
+        empty = AggWindow(*(memoryview(b"").cast(tc) for tc in _TYPECODES))
+        return AggSnapshot(0, 0, empty, WindowSums(0.0, 0.0, 0.0, 0.0) if self.window_ms else None)
+
+    def window_sums(self, now_ms: int, recent_ms: int = 0) -> Optional[WindowSums]:
+        sums = AggRing.window_sums(self, now_ms, recent_ms)
+        if self._owned():
+            return sums
+        return None if recent_ms else WindowSums(0.0, 0.0, 0.0, 0.0)
+
+    # --- AggRing 的狀態欄位改由 header 提供 ---
+    @property
+    def _state(self):
+        st = self._wstate      # 寫入端自己讀：直接用本地那份
+        return st if st is not None else self._read_state()
+
+    @_state.setter
+    def _state(self, st):
+        self._wstate = st
+        hi, hd = self._hi, self._hd
+        g = hi[_GEN] + 1
+        hi[_GEN] = g           # 奇數：寫入中
+        hi[_COUNT], hi[_LAST_TS], hi[_TAIL], hi[_NB], hi[_NS] = st[0], st[1], st[2], st[3], st[6]
+        hd[0], hd[1], hd[2], hd[3] = st[4], st[5], st[7], st[8]
+        hi[_GEN] = g + 1
+
+    @property
+    def count(self):
+        return self._hi[_COUNT] if self._owned() else 0
+
+    @count.setter
+    def count(self, v):
+        pass                   # 已隨 _state 發布
+
+    @property
+    def size(self):
+        return min(self._hi[_COUNT], self.capacity) if self._owned() else 0
+
+    @size.setter
+    def size(self, v):
+        pass
+
+    @property
+    def last_ts(self):
+        return self._hi[_LAST_TS_W] if self._owned() else 0
+
+    @last_ts.setter
+    def last_ts(self, v):
+        self._hi[_LAST_TS_W] = v
+
+    @property
+    def _writing(self):
+        return self._hi[_WRITING] if self._owned() else 0   # 換手後不能拿新 symbol 的寫入數做繞回判斷
+
+    @_writing.setter
+    def _writing(self, v):
+        self._hi[_WRITING] = v
+
+
+class _Book:
+    """單一 slot 的 bookTicker 紀錄（seqlock）。"""
+    __slots__ = ("hi", "hd")
+
+    def __init__(self, buf: memoryview):
+        self.hi = buf[_RING_HDR:_RING_HDR + 16].cast("q")
+        self.hd = buf[_RING_HDR + 16:_RING_HDR + 40].cast("d")
+
+    def write(self, bid: float, ask: float, at: float, u: int):
+        hi, hd = self.hi, self.hd
+        g = hi[0] + 1
+        hi[0] = g
+        hi[1] = u
+        hd[0], hd[1], hd[2] = bid, ask, at
+        hi[0] = g + 1
+
+    def read(self):
+        hi, hd = self.hi, self.hd
+        while True:
+            g = hi[0]
+            if not g & 1:
+                r = (hd[0], hd[1], hd[2], hi[1])
+                if hi[0] == g:
+                    return r
+            time.sleep(0)
+
+
+class _Slots:
+    """slot 配置（symbol -> (slot, tag)）與 ring / book 物件；父、子行程各一份。"""
+
+    def __init__(self, buf: memoryview, n_slots: int, capacity: int, window_ms: int, writer: bool):
+        size = slot_bytes(capacity)
+        self.writer = writer
+        self.assign: Dict[str, Tuple[int, int]] = {}
+        self.handles: Dict[Tuple[int, int], ShmAggRing] = {}   # 讀取端：(slot, tag) -> 綁定 tag 的 ring
+        self.rings: List[ShmAggRing] = []
+        self.books: List[_Book] = []
+        for i in range(n_slots):
+            b = buf[_FEED_HDR + i * size:_FEED_HDR + (i + 1) * size]
+            self.rings.append(ShmAggRing(b, capacity, window_ms, writer))
+            self.books.append(_Book(b))
+
+    def release(self):
+        """放掉所有 cast 出來的 view（之後才能 close 共享記憶體）；已釋放的 ring 再讀會丟 ValueError"""
+        for r in self.rings:
+            for v in (*r._mv, r._hi, r._hd):
+                v.release()
+        for b in self.books:
+            b.hi.release()
+            b.hd.release()
+        self.assign = {}
+        self.handles = {}
+
+    def slot(self, sym: str) -> Optional[int]:
+        a = self.assign.get(sym)
+        if a is None or self.rings[a[0]]._hi[_OWNER] != a[1]:
+            return None
+        return a[0]
+
+    def ring(self, sym: str) -> Optional[ShmAggRing]:
+        """寫入端回傳 slot 的 ring；讀取端回傳綁定目前 tag 的 ring（之後換手就讀不到新 symbol）。"""
+        a = self.assign.get(sym)
+        if a is None or self.rings[a[0]]._hi[_OWNER] != a[1]:
+            return None
+        if self.writer:
+            return self.rings[a[0]]
+        h = self.handles.get(a)
+        if h is None:
+            h = self.handles[a] = self.rings[a[0]].bind(a[1])
+        return h
+
+
+class ShmRings:
+    """ws_client._AGG 的替身：symbol -> ShmAggRing（只含已分配且子行程已就緒的 slot）。"""
+
+    def __init__(self, slots: _Slots):
+        self._s = slots
+
+    def get(self, sym: str, default=None):
+        r = self._s.ring(sym)
+        return default if r is None else r
+
+    def __getitem__(self, sym: str) -> ShmAggRing:
+        r = self._s.ring(sym)
+        if r is None:
+            raise KeyError(sym)
+        return r
+
+    def __contains__(self, sym) -> bool:
+        return self._s.slot(sym) is not None
+
+    def __len__(self) -> int:
+        return sum(1 for s in list(self._s.assign) if self._s.slot(s) is not None)
+
+    def values(self):
+        return [r for r in (self.get(s) for s in list(self._s.assign)) if r is not None]
+
+    def pop(self, sym, default=None):
+        return default         # slot 由父行程回收
+
+    def clear(self):
+        pass
+
+
+class ShmBooks:
+    """ws_client._BOOK 的替身：symbol -> BookTop。"""
+
+    def __init__(self, slots: _Slots, book_type):
+        self._s = slots
+        self._t = book_type
+
+    def get(self, sym: str, default=None):
+        i = self._s.slot(sym)
+        if i is None:
+            return default
+        bid, ask, at, u = self._s.books[i].read()
+        return self._t(bid, ask, at, u) if u else default
+
+    def __setitem__(self, sym: str, b):
+        i = self._s.slot(sym)
+        if i is not None:
+            self._s.books[i].write(b.bid, b.ask, b.at, b.u)
+
+    def __contains__(self, sym) -> bool:
+        return self.get(sym) is not None
+
+    def pop(self, sym, default=None):
+        return default
+
+    def clear(self):
+        pass
+
+
+class FeedProcess:
+    """父行程端：建立共享記憶體、啟動子行程、分配 slot、提供 rings / books 讀取。"""
+
+    def __init__(self, n_slots: int, capacity: int, window_ms: int):
+        self.n_slots, self.capacity, self.window_ms = n_slots, capacity, window_ms
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.proc: Optional[subprocess.Popen] = None
+        self._free = deque(range(n_slots))
+        self._tag = 0
+        self._slots: Optional[_Slots] = None
+        self.rings: Optional[ShmRings] = None
+        self.books: Optional[ShmBooks] = None
+        self.dropped: List[str] = []    # slot 不足、沒有訂閱到的 symbol
+        self.backfills = 0              # 代子行程抓的補洞次數
+        self._lock = threading.Lock()   # stdin 由設定 symbol 與補洞回覆共用
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def start(self, use_testnet: bool, host: str, book_type, backfill=None) -> "FeedProcess":
+        """backfill(symbol, from_id, upto_id) -> rows：子行程的補洞請求由父行程以這個函式代抓"""
+        if not seqlock_safe():
+            raise RuntimeError(f"WS_PROCESS needs x86-64 memory ordering for its seqlocks (machine: {platform.machine()})")
+        size = _FEED_HDR + self.n_slots * slot_bytes(self.capacity)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        hdr = self.shm.buf[0:_FEED_HDR].cast("q")
+        hdr[_F_MAGIC] = _MAGIC
+        self._slots = _Slots(self.shm.buf, self.n_slots, self.capacity, self.window_ms, writer=False)
+        self.rings, self.books = ShmRings(self._slots), ShmBooks(self._slots, book_type)
+        req_r, req_w = os.pipe()
+        args = [sys.executable, "-m", "shm_feed", self.shm.name, str(self.n_slots), str(self.capacity),
+                str(self.window_ms), "1" if use_testnet else "0", host, str(req_w)]
+        self.proc = subprocess.Popen(args, stdin=subprocess.PIPE, text=True, pass_fds=(req_w,),
+                                     cwd=os.path.dirname(os.path.abspath(__file__)))
+        os.close(req_w)
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="feed-backfill")
+        threading.Thread(target=self._serve, args=(os.fdopen(req_r), backfill), daemon=True,
+                         name="feed-requests").start()
+        print(f"WebSocket feed process started (pid {self.proc.pid}, {size / 1048576:.0f} MiB shared).")
+        return self
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def _send(self, msg: dict):
+        line = json.dumps(msg) + "\n"
+        with self._lock:
+            try:
+                self.proc.stdin.write(line)
+                self.proc.stdin.flush()
+            except (AttributeError, BrokenPipeError, ValueError, OSError):
+                pass            # 子行程已結束 / stop() 之後才回來的補洞
+
+    def _serve(self, f, backfill):
+        """讀子行程的請求（一行一個 JSON）；子行程結束 → EOF"""
+        with f:
+            for line in f:
+                try:
+                    req = json.loads(line)
+                    self._pool.submit(self._backfill, backfill, req)
+                except (ValueError, RuntimeError):
+                    continue    # 壞行 / stop() 已關掉執行緒池
+
+    def _backfill(self, backfill, req: dict):
+        self.backfills += 1
+        try:
+            if backfill is None:
+                raise RuntimeError("backfill not available in the parent process")
+            self._send({"backfill": req["id"], "rows": backfill(req["s"], req["from"], req["upto"])})
+        except Exception as e:
+            self._send({"backfill": req["id"], "error": str(e)})
+
+    def set_symbols(self, symbols) -> Dict[str, Tuple[int, int]]:
+        want = set(symbols)
+        old = self._slots.assign
+        assign = {s: a for s, a in old.items() if s in want}
+        for s, (i, _) in old.items():
+            if s not in want:
+                self._free.append(i)
+        self.dropped = []
+        for s in sorted(want - assign.keys()):
+            if not self._free:
+                self.dropped.append(s)
+                continue
+            self._tag += 1
+            assign[s] = (self._free.popleft(), self._tag)
+        if self.dropped:
+            print(f"WebSocket feed: no free slot for {len(self.dropped)} symbol(s) (WS_PROCESS_SLOTS={self.n_slots})")
+        self._slots.assign = assign
+        live = set(assign.values())
+        self._slots.handles = {a: h for a, h in self._slots.handles.items() if a in live}
+        self._send({"symbols": assign})
+        return assign
+
+    def stats(self) -> Dict[str, object]:
+        hdr = self.shm.buf[0:_FEED_HDR].cast("q")
+        hb = hdr[_F_HEARTBEAT_MS]
+        return {"pid": self.proc.pid if self.proc else None, "alive": self.alive(),
+                "heartbeat_age_s": round(time.time() - hb / 1000, 2) if hb else None,
+                "msgs": hdr[_F_MSGS], "slots_used": len(self._slots.assign), "slots": self.n_slots,
+                "backfills": self.backfills}
+
+    def stop(self, timeout: float = 3.0):
+        if self.proc is not None:
+            self._send({"stop": True})
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout)
+            except (subprocess.TimeoutExpired, OSError, ValueError):
+                self.proc.kill()
+            self.proc = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self.shm is not None:
+            self._slots.release()
+            self._slots = self.rings = self.books = None
+            try:
+                self.shm.close()
+            except BufferError:
+                pass            # 仍有讀取端持有 view；對應頁面在 view 釋放 / 行程結束時回收
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+            self.shm = None
+
+
+# --- 子行程 ---
+
+def _quiesce(shards, timeout: float = 2.0):
+    """
+    等每個分片的 event loop 把手上的 callback 跑完：寫入（查 slots.assign + append）都在同一個 callback 內完成，
+    這之後開始的寫入一定看得到新的 assign。
+    """
+    evs = []
+    for sh in list(shards):
+        loop = sh.loop
+        if loop is None:
+            continue
+        ev = threading.Event()
+        try:
+            loop.call_soon_threadsafe(ev.set)
+        except RuntimeError:
+            continue            # loop 已關閉
+        evs.append(ev)
+    deadline = time.time() + timeout
+    for ev in evs:
+        ev.wait(max(0.0, deadline - time.time()))
+
+
+def _apply_assign(slots: _Slots, new: Dict[str, Tuple[int, int]], quiesce=None):
+    """
+    先移除換手的 slot（寫入端對舊 symbol 會拿到 KeyError 而略過），quiesce() 等寫到一半的分片寫完，
+    清空後才寫 tag 並加入；否則舊 symbol 的最後一筆會在 clear 之後寫進、頂著新 tag 被讀取端接受。
+    """
+    slots.assign = {s: a for s, a in slots.assign.items() if new.get(s) == a}
+    if quiesce is not None and any(slots.rings[i]._hi[_OWNER] != tag for i, tag in new.values()):
+        quiesce()
+    for i, tag in new.values():
+        ring = slots.rings[i]
+        if ring._hi[_OWNER] != tag:
+            ring.clear()
+            slots.books[i].write(0.0, 0.0, 0.0, 0)
+            ring._hi[_OWNER] = tag
+    slots.assign = new
+
+
+class _BackfillProxy:
+    """子行程的 ws_client._fetch_aggtrades 替身：把請求寫給父行程，等 stdin 送回結果"""
+
+    def __init__(self, fd: int, timeout: float = 60.0):
+        self._f = os.fdopen(fd, "w")
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._id = 0
+        self.timeout = timeout
+
+    def fetch(self, s: str, from_id: int, upto_id: int) -> List[dict]:
+        fut: Future = Future()
+        with self._lock:
+            self._id += 1
+            rid = self._id
+            self._pending[rid] = fut
+            try:
+                self._f.write(json.dumps({"id": rid, "s": s, "from": from_id, "upto": upto_id}) + "\n")
+                self._f.flush()
+            except (BrokenPipeError, ValueError, OSError) as e:
+                self._pending.pop(rid, None)
+                raise RuntimeError(f"parent process unavailable: {e}")
+        try:
+            return fut.result(self.timeout)
+        finally:
+            with self._lock:
+                self._pending.pop(rid, None)
+
+    def resolve(self, msg: dict):
+        with self._lock:
+            fut = self._pending.get(msg["backfill"])
+        if fut is None or fut.done():
+            return          # 已逾時放棄
+        if "error" in msg:
+            fut.set_exception(RuntimeError(msg["error"]))
+        else:
+            fut.set_result(msg.get("rows") or [])
+
+    def close(self):
+        with self._lock:
+            pending, self._pending = list(self._pending.values()), {}
+            try:
+                self._f.close()
+            except OSError:
+                pass
+        for fut in pending:
+            if not fut.done():
+                fut.set_exception(RuntimeError("feed process stopping"))
+
+
+def _feed_main(argv: List[str]):
+    shm_name, n_slots, capacity, window_ms, testnet, host, req_fd = argv
+    n_slots, capacity, window_ms = int(n_slots), int(capacity), int(window_ms)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:  # 共享記憶體由父行程建立與回收；子行程不要讓 resource_tracker 代為 unlink
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+    import ws_client
+    ws_client.WS_PROCESS = False
+    ws_client.WS_ALL_TICKERS = False     # 排行 / K 線留在父行程
+    ws_client.WS_KLINES = False
+    ws_client.WS_BOOK_TICKER = True
+    ws_client._HOST["test" if testnet == "1" else "main"] = host
+    proxy = _BackfillProxy(int(req_fd))
+    ws_client._fetch_aggtrades = proxy.fetch  # 補洞改請父行程代抓（權重記在父行程的限流器）
+    slots = _Slots(shm.buf, n_slots, capacity, window_ms, writer=True)
+    ws_client._AGG = ShmRings(slots)
+    ws_client._BOOK = ShmBooks(slots, ws_client.BookTop)
+
+    hdr = shm.buf[0:_FEED_HDR].cast("q")
+    hdr[_F_PID] = os.getpid()
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(0.5):
+            hdr[_F_HEARTBEAT_MS] = int(time.time() * 1000)
+            hdr[_F_MSGS] = sum(sh.msgs for sh in list(ws_client._SHARDS))
+
+    hb = threading.Thread(target=heartbeat, daemon=True, name="feed-heartbeat")
+    hb.start()
+    for line in sys.stdin:
+        try:
+            cmd = json.loads(line)
+        except ValueError:
+            continue
+        if cmd.get("stop"):
+            break
+        if "backfill" in cmd:
+            proxy.resolve(cmd)
+            continue
+        if "symbols" in cmd:
+            new = {s: tuple(a) for s, a in cmd["symbols"].items()}
+            _apply_assign(slots, new, quiesce=lambda: _quiesce(ws_client._SHARDS))
+            ws_client.start_ws(sorted(new), use_testnet=testnet == "1")
+    stop.set()
+    hb.join(1.0)
+    proxy.close()
+    ws_client.stop_ws()     # 換回一般 dict
+    slots.release()
+    hdr.release()
+    try:
+        shm.close()
+    except BufferError:
+        pass
+
+
+if __name__ == "__main__":
+    _feed_main(sys.argv[1:])
@@ -0,0 +1,101 @@
+# file: single_flight.py
+"""
+重複請求合併（single-flight）：同一個 key 同時只有一個請求在途，其他呼叫端等待並共用結果。
+
+- key 由 (path, 排序後的 params) 組成（flight_key）
+- ttl > 0：成功結果保留 ttl 秒，期間的呼叫直接回傳（hit）；失敗不快取，例外轉拋給所有等待者
+- 共用的結果是同一個物件（JSON list/dict），呼叫端不可原地修改
+- stats()：calls / leaders（實際送出）/ coalesced（搭便車）/ hits（TTL 命中）/ errors
+"""
+import threading, time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_SWEEP_AT = 1024   # 快取項目超過此數時順手清掉過期的
+
+
+def flight_key(path: str, params: Optional[Dict[str, Any]] = None) -> Tuple:
+    """(path, 排序後的 (k, str(v)))；值一律轉字串，5 與 "5" 視為同一請求（送出的 query 相同）。"""
+    if not params:
+        return (path,)
+    return (path,) + tuple(sorted((k, str(v)) for k, v in params.items()))
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "done_at", "ttl")
+
+    def __init__(self, ttl: float):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.done_at = 0.0
+        self.ttl = ttl
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.leaders = 0
+        self.coalesced = 0
+        self.hits = 0
+        self.errors = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any], ttl: float = 0.0):
+        """執行 fn()；同 key 已有在途請求時等它完成，TTL 內的成功結果直接回傳。"""
+        now = time.monotonic()
+        with self._lock:
+            self.calls += 1
+            c = self._calls.get(key)
+            if c is not None and c.event.is_set():
+                if ttl > 0 and c.error is None and now - c.done_at < ttl:
+                    self.hits += 1
+                    return c.result
+                c = None
+            if c is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                c = self._calls[key] = _Call(ttl)
+                self.leaders += 1
+                leader = True
+                if len(self._calls) > _SWEEP_AT:
+                    self._sweep(now)
+
+        if not leader:
+            c.event.wait()
+            if c.error is not None:
+                raise c.error
+            return c.result
+
+        try:
+            c.result = fn()
+        except BaseException as e:
+            c.error = e
+            raise
+        finally:
+            c.done_at = time.monotonic()
+            with self._lock:
+                if c.error is not None:
+                    self.errors += 1
+                if (c.error is not None or ttl <= 0) and self._calls.get(key) is c:
+                    del self._calls[key]
+            c.event.set()
+        return c.result
+
+    def _sweep(self, now: float):
+        """移除已完成且超過各自 ttl 的項目；需持有 self._lock。"""
+        for k in [k for k, c in self._calls.items() if c.event.is_set() and now - c.done_at >= c.ttl]:
+            del self._calls[k]
+
+    def forget(self, key: Hashable):
+        """丟掉 key 的快取結果（在途請求不受影響，下一次呼叫會重新送出）。"""
+        with self._lock:
+            c = self._calls.get(key)
+            if c is not None and c.event.is_set():
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "leaders": self.leaders, "coalesced": self.coalesced,
+                    "hits": self.hits, "errors": self.errors, "cached": len(self._calls)}
@@ -0,0 +1,138 @@
+# file: symbol_rules.py
+"""
+交易對精度規則：由 /fapi/v1/exchangeInfo 預先編譯成不可變的 SymbolRule（__slots__），
+下單時直接取用數值型 tick/step/minNotional 與整數對齊格線（price_grid/qty_grid），不必每次 to_decimal。
+
+- parse_exchange_info：只重建「篩選欄位有變」的 symbol，其餘沿用舊物件
+- load_cache / save_cache：磁碟 JSON 快取（只存原始字串），啟動時立即可用
+- SymbolRule 保留舊 dict 介面（rule['tickSize'] / rule.get('minNotional')），既有呼叫端不用改
+"""
+import json, os, time
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Optional, Tuple
+
+from precision import Grid
+
+_KEYS = {"pricePrecision": "price_precision", "quantityPrecision": "qty_precision",
+         "tickSize": "tick_str", "stepSize": "step_str", "minNotional": "min_notional"}
+
+
+class SymbolRule:
+    __slots__ = ("symbol", "price_precision", "qty_precision", "tick_str", "step_str",
+                 "tick_size", "step_size", "min_notional", "tick", "step", "price_grid", "qty_grid", "sig")
+
+    def __init__(self, symbol: str, price_precision: int, qty_precision: int,
+                 tick_str: str, step_str: str, notional_str: Optional[str]):
+        tick = Decimal(tick_str)
+        step = Decimal(step_str)
+        if not (tick.is_finite() and step.is_finite() and tick > 0 and step > 0):
+            raise ValueError(f"invalid tickSize/stepSize {tick_str}/{step_str}")
+        min_notional = Decimal(notional_str) if notional_str else None
+        if min_notional is not None and not min_notional.is_finite():
+            min_notional = None
+        _set = object.__setattr__
+        _set(self, "symbol", symbol)
+        _set(self, "price_precision", int(price_precision))
+        _set(self, "qty_precision", int(qty_precision))
+        _set(self, "tick_str", tick_str)
+        _set(self, "step_str", step_str)
+        _set(self, "tick_size", tick)            # Decimal
+        _set(self, "step_size", step)
+        _set(self, "min_notional", min_notional)  # Decimal 或 None
+        _set(self, "tick", float(tick))           # float（熱路徑用）
+        _set(self, "step", float(step))
+        _set(self, "price_grid", Grid(tick_str))  # 整數對齊 + 下單字串（precision.Grid）
+        _set(self, "qty_grid", Grid(step_str))
+        _set(self, "sig", (int(price_precision), int(qty_precision), tick_str, step_str, notional_str))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SymbolRule is immutable")
+
+    def __repr__(self):
+        return f"SymbolRule({self.symbol} tick={self.tick_str} step={self.step_str} minNotional={self.min_notional})"
+
+    # --- 舊 dict 介面 ---
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, _KEYS[key])
+        except KeyError:
+            raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            v = self[key]
+        except KeyError:
+            return default
+        return default if v is None else v
+
+
+def _raw_rule(s_info: dict) -> Optional[tuple]:
+    """回傳 (pricePrecision, quantityPrecision, tickSize, stepSize, notional)；不合格回傳 None。"""
+    if not (s_info.get("contractType") == "PERPETUAL" and s_info.get("status") == "TRADING"
+            and s_info.get("quoteAsset") == "USDT" and s_info.get("maintMarginPercent") is not None):
+        return None
+    tick = step = notional = None
+    for f in s_info.get("filters", []):
+        ftype = f.get("filterType")
+        if ftype == "PRICE_FILTER":
+            tick = f.get("tickSize")
+        elif ftype == "LOT_SIZE":
+            step = f.get("stepSize")
+        elif ftype == "MIN_NOTIONAL":
+            notional = f.get("notional") or None
+    if tick is None or step is None:
+        return None
+    return (int(s_info.get("pricePrecision", 8)), int(s_info.get("quantityPrecision", 8)), tick, step, notional)
+
+
+def parse_exchange_info(info: dict, previous: Optional[Dict[str, SymbolRule]] = None
+                        ) -> Tuple[Dict[str, SymbolRule], int, int]:
+    """
+    解析 exchangeInfo。回傳 (rules, rebuilt, skipped)；
+    previous 中篩選欄位未變的 symbol 直接沿用舊物件（rebuilt 只計新建/變動者）。
+    """
+    previous = previous or {}
+    rules: Dict[str, SymbolRule] = {}
+    rebuilt = skipped = 0
+    for s_info in info.get("symbols", []):
+        symbol = s_info.get("symbol")
+        try:
+            raw = _raw_rule(s_info) if symbol else None
+        except (ValueError, TypeError):
+            raw = None
+        if raw is None:
+            skipped += 1
+            continue
+        old = previous.get(symbol)
+        if old is not None and old.sig == raw:
+            rules[symbol] = old
+            continue
+        try:
+            rules[symbol] = SymbolRule(symbol, *raw)
+            rebuilt += 1
+        except (ValueError, TypeError, InvalidOperation) as e:
+            print(f"Warning: Error parsing rules for {symbol}: {e}. Skipping.")
+            skipped += 1
+    return rules, rebuilt, skipped
+
+
+def save_cache(path: str, rules: Dict[str, SymbolRule]):
+    """原子寫入（先寫暫存檔再 rename）。"""
+    tmp = f"{path}.tmp"
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(tmp, "w") as f:
+        json.dump({"ts": time.time(), "symbols": {s: r.sig for s, r in rules.items()}}, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_cache(path: str) -> Tuple[Dict[str, SymbolRule], float]:
+    """讀磁碟快取；檔案不存在或損毀回傳 ({}, 0)。"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        rules = {s: SymbolRule(s, *sig) for s, sig in data["symbols"].items()}
+        return rules, float(data.get("ts", 0))
+    except (OSError, ValueError, KeyError, TypeError, InvalidOperation):
+        return {}, 0.0
@@ -0,0 +1,166 @@
+# file: ticker_board.py
+"""
+全市場 24h 漲跌幅排行（由 WS !ticker@arr 持續更新）。
+
+- _ranked 依 (pct, symbol) 排序；每筆更新以 bisect 刪除舊位置、插入新位置（O(log n) 搜尋）
+- top_gainers / top_losers 直接切片，O(N)，回傳格式與 utils.TickerSnapshot 相同
+  [(symbol, priceChangePercent, lastPrice, quoteVolume), ...] → main 可直接替換來源
+- watch(n) 之後，每批更新會比對 TopN 成員，新擠進榜的 symbol 產生事件（drain_events 取出）
+- !ticker@arr 只推有變動的 symbol：事件時間（E）落後最新一筆超過 max_age_s 的列視為過期（停牌/下架），
+  排名前先剔除；eligible 在讀取時再檢查一次（過濾條件可能在套用之後才改變）；pct/價格/量非有限值不入榜
+"""
+import math, threading, time
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class TickerBoard:
+    def __init__(self, eligible: Optional[Callable[[str], bool]] = None, max_events: int = 1000,
+                 max_age_s: float = 0.0):
+        self.eligible = eligible       # 過濾函數（utils.is_eligible_symbol）；None = 全收
+        self.max_age_s = max_age_s     # 列的事件時間落後最新事件超過此秒數 → 剔除；0 = 不剔除
+        self.ts = 0.0                  # 最後一次套用推播的時間
+        self._rows: Dict[str, tuple] = {}
+        self._seen: Dict[str, int] = {}    # symbol -> 最後事件時間（ms），依更新順序（最舊在前）
+        self._last_e = 0                   # 看過最新的事件時間（ms）
+        self._ranked: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        self._watch_n = 0
+        self._top_g: set = set()
+        self._top_l: set = set()
+        self._events = deque(maxlen=max_events)
+        self.updates = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def age(self) -> float:
+        return time.time() - self.ts if self.ts else float("inf")
+
+    def apply(self, tickers: List[dict]):
+        """套用一批 24hrTicker（!ticker@arr 的 data）：欄位 s / P / c / q / E。"""
+        eligible = self.eligible
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            rows, ranked, seen = self._rows, self._ranked, self._seen
+            for t in tickers:
+                s = t.get("s")
+                if not s or (eligible is not None and not eligible(s)):
+                    continue
+                try:
+                    last = float(t["c"])
+                    quote_vol = float(t["q"])
+                    pct = float(t["P"])
+                    e = int(t.get("E") or now_ms)
+                except (KeyError, ValueError, TypeError):
+                    continue
+                old = rows.get(s)
+                if not (last > 0 and quote_vol > 0 and math.isfinite(pct) and math.isfinite(last)
+                        and math.isfinite(quote_vol)):
+                    if old is not None:
+                        self._drop(s)
+                    continue
+                if old is None or old[1] != pct:
+                    if old is not None:
+                        del ranked[bisect_left(ranked, (old[1], s))]
+                    insort(ranked, (pct, s))
+                rows[s] = (s, pct, last, quote_vol)
+                seen.pop(s, None)
+                seen[s] = e
+                if e > self._last_e:
+                    self._last_e = e
+            self.updates += 1
+            self.ts = time.time()
+            if self._watch_n:
+                self._diff_top()
+
+    def _drop(self, s: str):
+        old = self._rows.pop(s)
+        del self._ranked[bisect_left(self._ranked, (old[1], s))]
+        self._seen.pop(s, None)
+
+    def _expire(self):
+        """剔除事件時間過舊的列（_seen 依更新順序，只需從頭檢查）。"""
+        if self.max_age_s <= 0:
+            return
+        cutoff = self._last_e - self.max_age_s * 1000
+        seen = self._seen
+        while seen:
+            s = next(iter(seen))
+            if seen[s] >= cutoff:
+                break
+            self._drop(s)
+
+    def _pick(self, it, n: int) -> List[str]:
+        """從排序迭代器取前 n 個仍 eligible 的 symbol；不再 eligible 的順手移除。"""
+        eligible = self.eligible
+        out, gone = [], []
+        for _, s in it:
+            if len(out) >= n:
+                break
+            if eligible is not None and not eligible(s):
+                gone.append(s)
+            else:
+                out.append(s)
+        for s in gone:
+            self._drop(s)
+        return out
+
+    def _gainers(self, n: int) -> List[str]:
+        self._expire()
+        return self._pick(reversed(self._ranked), n) if n > 0 else []
+
+    def _losers(self, n: int) -> List[str]:
+        self._expire()
+        return self._pick(iter(self._ranked), n) if n > 0 else []
+
+    def _diff_top(self):
+        n = self._watch_n
+        gainers = self._gainers(n)
+        losers = self._losers(n)
+        g, l = set(gainers), set(losers)
+        if self._top_g or self._top_l:   # 第一批只建立基準，不產生事件
+            for rank, s in enumerate(reversed(gainers), 1):
+                if s not in self._top_g:
+                    self._events.append(("gainer", s, rank, self.ts))
+            for rank, s in enumerate(losers, 1):
+                if s not in self._top_l:
+                    self._events.append(("loser", s, rank, self.ts))
+        self._top_g, self._top_l = g, l
+
+    def watch(self, n: int):
+        """追蹤 TopN 成員變化；n <= 0 關閉事件。"""
+        with self._lock:
+            if n != self._watch_n:
+                self._watch_n = max(0, n)
+                self._top_g, self._top_l = set(), set()
+
+    def drain_events(self) -> List[tuple]:
+        """取出並清空事件：[(\"gainer\"|\"loser\", symbol, rank, ts), ...]"""
+        with self._lock:
+            out = list(self._events)
+            self._events.clear()
+            return out
+
+    def top_gainers(self, n: int = 10) -> List[tuple]:
+        with self._lock:
+            rows = self._rows
+            return [rows[s] for s in self._gainers(n)]
+
+    def top_losers(self, n: int = 10) -> List[tuple]:
+        with self._lock:
+            rows = self._rows
+            return [rows[s] for s in self._losers(n)]
+
+    def rank_of(self, symbol: str) -> Optional[int]:
+        """漲幅名次（1 = 漲最多）；不在榜上回傳 None。"""
+        with self._lock:
+            self._expire()
+            row = self._rows.get(symbol)
+            if row is None:
+                return None
+            if self.eligible is not None and not self.eligible(symbol):
+                self._drop(symbol)
+                return None
+            return len(self._ranked) - bisect_left(self._ranked, (row[1], symbol))
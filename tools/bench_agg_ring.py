@@ -0,0 +1,121 @@
+"""
+AggRing 對照與基準：
+1) since() 視窗與舊 deque + 反向掃描（ws_recent_agg 改版前）內容一致（含環形覆寫）
+2) 滿載時每個 symbol 的記憶體：deque[tuple] vs AggRing，並換算全市場規模
+3) 每筆寫入與 30 秒視窗讀取/聚合的耗時
+
+    python tools/bench_agg_ring.py [--symbols 300] [--capacity 6000]
+"""
+import argparse, os, random, sys, timeit, tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agg_ring import AggRing  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--symbols", type=int, default=300)
+ap.add_argument("--capacity", type=int, default=6000)
+args = ap.parse_args()
+CAP = args.capacity
+
+
+def trades(n, seed, rate_per_s=50):
+    rnd = random.Random(seed)
+    t, p = 1_700_000_000_000, rnd.uniform(0.01, 50000)
+    for _ in range(n):
+        t += int(rnd.expovariate(rate_per_s / 1000.0))
+        p *= 1 + rnd.gauss(0, 0.0005)
+        yield t, p, rnd.lognormvariate(0, 1.5), rnd.random() < 0.5
+
+
+def old_recent(dq, cutoff):
+    """改版前 ws_recent_agg 的掃描（新到舊）。"""
+    out = []
+    for item in reversed(dq):
+        if item[0] >= cutoff:
+            out.append(item)
+        else:
+            break
+    return out
+
+
+# ---- 1) 對照 ----
+fails = 0
+for seed in range(40):
+    n = random.Random(seed).randint(1, 3 * CAP)
+    dq, ring = deque(maxlen=CAP), AggRing(CAP)
+    for t, p, q, b in trades(n, seed):
+        dq.append((t, p, q, b))
+        ring.append(t, p, q, b)
+    rnd = random.Random(seed + 1000)
+    for _ in range(20):
+        cutoff = rnd.randint(dq[0][0] - 1000, dq[-1][0] + 10)
+        ref = old_recent(dq, cutoff)
+        w = ring.since(cutoff)
+        got = [(t, p, q, bool(b)) for t, p, q, b in zip(w.ts, w.price, w.qty, w.side)][::-1]
+        if got != ref:
+            fails += 1
+            print("window mismatch", seed, cutoff, len(got), len(ref))
+            break
+print(f"parity: {'OK' if fails == 0 else f'{fails} FAILURES'}")
+
+# ---- 2) 記憶體（滿載） ----
+rows = list(trades(CAP, 7))
+tracemalloc.start()
+s0 = tracemalloc.take_snapshot()
+dq = deque(maxlen=CAP)
+for t, p, q, b in rows:
+    dq.append((int(str(t)), float(repr(p)), float(repr(q)), b))  # 每筆都是新物件（同 WS 解析結果）
+old_bytes = sum(st.size_diff for st in tracemalloc.take_snapshot().compare_to(s0, "filename"))
+s1 = tracemalloc.take_snapshot()
+ring = AggRing(CAP)
+for r in rows:
+    ring.append(*r)
+new_bytes = sum(st.size_diff for st in tracemalloc.take_snapshot().compare_to(s1, "filename"))
+tracemalloc.stop()
+MiB = 1024 * 1024
+print(f"memory per symbol at {CAP} trades:")
+print(f"  deque[tuple] {old_bytes / 1024:8.0f} KiB  ({old_bytes / CAP:5.1f} B/trade)")
+print(f"  AggRing      {new_bytes / 1024:8.0f} KiB  ({new_bytes / CAP:5.1f} B/trade, nbytes={ring.nbytes})")
+print(f"  {args.symbols} symbols: {old_bytes * args.symbols / MiB:.0f} MiB -> {new_bytes * args.symbols / MiB:.0f} MiB"
+      f"  (x{old_bytes / new_bytes:.1f} smaller)")
+
+# ---- 3) 耗時 ----
+N = 200
+cutoff = rows[-1][0] - 30_000          # 30 秒視窗（約 1500 筆）
+
+
+def agg_old():
+    bq = sq = 0.0
+    for t, p, q, b in old_recent(dq, cutoff):
+        if b:
+            bq += q
+        else:
+            sq += q
+    return bq, sq
+
+
+def agg_new():
+    w = ring.since(cutoff)
+    bq = sq = 0.0
+    for q, b in zip(w.qty, w.side):
+        if b:
+            bq += q
+        else:
+            sq += q
+    return bq, sq
+
+
+n_win = len(ring.since(cutoff).ts)
+t_rd_old = timeit.timeit(lambda: old_recent(dq, cutoff), number=N) / N * 1e6
+t_rd_new = timeit.timeit(lambda: ring.since(cutoff), number=N) / N * 1e6
+t_ag_old = timeit.timeit(agg_old, number=N) / N * 1e6
+t_ag_new = timeit.timeit(agg_new, number=N) / N * 1e6
+# 寫入最後量（會改變視窗內容）；tuple 版另含建立 tuple 的成本
+t_app_old = timeit.timeit(lambda: dq.append((rows[-1][0], 1.0, 1.0, True)), number=100_000) / 100_000 * 1e9
+t_app_new = timeit.timeit(lambda: ring.append(rows[-1][0], 1.0, 1.0, True), number=100_000) / 100_000 * 1e9
+print(f"timings (30 s window = {n_win} trades):")
+print(f"  append              {t_app_old:8.0f} ns -> {t_app_new:8.0f} ns")
+print(f"  window read         {t_rd_old:8.1f} µs -> {t_rd_new:8.1f} µs")
+print(f"  window buy/sell sum {t_ag_old:8.1f} µs -> {t_ag_new:8.1f} µs")
+sys.exit(0 if fails == 0 else 1)
@@ -0,0 +1,138 @@
+"""
+indicators.py 對照與微基準：
+1) 對照舊版 Decimal ema()/calculate_atr()（原樣保留於本檔）在相對誤差 1e-9 內一致
+2) rolling_* 與逐窗 max/min/statistics.median 完全一致；NumPy 版與 float 版一致
+3) 微基準：舊 Decimal vs float vs NumPy
+
+    python tools/bench_indicators.py
+"""
+import math, os, random, statistics, sys, timeit
+from decimal import Decimal, InvalidOperation
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import indicators as ind  # noqa: E402
+
+
+# ---- 舊版（Decimal）參考實作，取自 utils.py 改版前 ----
+def to_decimal(value) -> Decimal:
+    try:
+        if isinstance(value, str) and ('e' in value or 'E' in value):
+            dec_val = Decimal(value)
+        else:
+            dec_val = Decimal(str(value))
+        if not dec_val.is_finite():
+            return Decimal('NaN')
+        return dec_val
+    except (InvalidOperation, ValueError, TypeError):
+        return Decimal('NaN')
+
+
+def ema_dec(vals, n):
+    if not vals or len(vals) < n or n <= 0: return None
+    try:
+        k = Decimal(2) / (Decimal(n) + Decimal(1))
+        e = to_decimal(vals[0])
+        if not e.is_finite():
+            for val_start in vals:
+                e_start = to_decimal(val_start)
+                if e_start.is_finite():
+                    e = e_start
+                    break
+            if not e.is_finite(): return None
+        for v_str in vals[1:]:
+            v = to_decimal(v_str)
+            if v.is_finite():
+                e = v * k + e * (Decimal(1) - k)
+        return float(e) if e.is_finite() else None
+    except (InvalidOperation, TypeError, IndexError):
+        return None
+
+
+def atr_dec(highs, lows, closes, period=14):
+    if len(closes) < period + 1 or period <= 0:
+        return None
+    true_ranges = []
+    for i in range(1, len(closes)):
+        high, low, prev_close = highs[i], lows[i], closes[i - 1]
+        true_ranges.append(max(high - low, abs(high - prev_close), abs(low - prev_close)))
+    if len(true_ranges) < period:
+        return None
+    atr_float = ema_dec(true_ranges, period)
+    return atr_float if atr_float is not None and atr_float > 0 else None
+
+
+# ---- 測資 ----
+def make_bars(n, seed):
+    rnd = random.Random(seed)
+    p = rnd.uniform(0.001, 50000)
+    closes, highs, lows, vols = [], [], [], []
+    for _ in range(n):
+        p *= math.exp(rnd.gauss(0, 0.01))
+        closes.append(p)
+        highs.append(p * (1 + rnd.uniform(0, 0.01)))
+        lows.append(p * (1 - rnd.uniform(0, 0.01)))
+        vols.append(rnd.lognormvariate(5, 1))
+    return closes, highs, lows, vols
+
+
+def close(a, b, tol=1e-9):
+    if a is None or b is None:
+        return a is None and b is None
+    return abs(a - b) <= tol * max(1.0, abs(a), abs(b))
+
+
+fails = 0
+for seed in range(300):
+    c, h, l, v = make_bars(random.Random(seed).randint(1, 250), seed)
+    for n in (1, 5, 14, 20, 50):
+        if not close(ema_dec(c, n), ind.ema(c, n)):
+            fails += 1; print("ema mismatch", seed, n)
+    if not close(atr_dec(h, l, c, 14), ind.atr(h, l, c, 14)):
+        fails += 1; print("atr mismatch", seed)
+    w = 7
+    if ind.rolling_max(h, w) != [max(h[max(0, i - w + 1):i + 1]) for i in range(len(h))]:
+        fails += 1; print("rolling_max mismatch", seed)
+    if ind.rolling_min(l, w) != [min(l[max(0, i - w + 1):i + 1]) for i in range(len(l))]:
+        fails += 1; print("rolling_min mismatch", seed)
+    if ind.rolling_median(v, w) != [statistics.median(v[max(0, i - w + 1):i + 1]) for i in range(len(v))]:
+        fails += 1; print("rolling_median mismatch", seed)
+    if ind.np is not None and len(c) >= 60:
+        if not close(float(ind.ema_np(c, 50)), ind.ema(c, 50), 1e-9):
+            fails += 1; print("ema_np mismatch", seed)
+        a_np = float(ind.atr_np(h, l, c, 14))
+        if not close(a_np, ind.atr(h, l, c, 14), 1e-9):
+            fails += 1; print("atr_np mismatch", seed)
+        if list(ind.rolling_median_np(v, w)) != ind.rolling_median(v, w)[w - 1:]:
+            fails += 1; print("rolling_median_np mismatch", seed)
+
+# NaN 處理與舊版一致
+nan_case = [float("nan"), 1.0, float("inf"), 2.0, 3.0, float("nan")]
+if not close(ema_dec(nan_case, 3), ind.ema(nan_case, 3)):
+    fails += 1; print("ema NaN handling mismatch")
+
+print(f"parity: {'OK' if fails == 0 else f'{fails} FAILURES'}")
+
+# ---- 微基準（signal 實際用量：EMA 60 根、ATR 120 根） ----
+c, h, l, v = make_bars(120, 42)
+seg = c[-60:]
+N = 2000
+
+
+def bench(label, fn):
+    t = timeit.timeit(fn, number=N) / N * 1e6
+    print(f"  {label:<28}{t:>10.1f} µs")
+    return t
+
+
+print(f"micro-benchmarks (per call, {N} runs):")
+t_ed = bench("ema Decimal (old)", lambda: ema_dec(seg, 50))
+t_ef = bench("ema float", lambda: ind.ema(seg, 50))
+t_ad = bench("atr Decimal (old)", lambda: atr_dec(h, l, c, 14))
+t_af = bench("atr float", lambda: ind.atr(h, l, c, 14))
+print(f"  speedup ema x{t_ed / t_ef:.1f}, atr x{t_ad / t_af:.1f}")
+if ind.np is not None:
+    H = ind.np.array([h] * 300); L = ind.np.array([l] * 300); C = ind.np.array([c] * 300)
+    t_np = timeit.timeit(lambda: ind.atr_np(H, L, C, 14), number=200) / 200 * 1e6
+    print(f"  atr_np 300 symbols x 120 bars {t_np:>8.1f} µs  ({t_np / 300:.2f} µs/symbol)")
+
+sys.exit(0 if fails == 0 else 1)
@@ -0,0 +1,59 @@
+"""
+掃描 Step 4 基準：舊版「逐檔抓 K 線 + 60~100ms 抖動」vs fetch_klines_many 併發抓取。
+對本機假伺服器（注入延遲模擬真實 RTT）執行，每輪都用全新 KlineStore（整段抓取）。
+
+    python tools/bench_scan.py [--latency 0.08] [--symbols 12 50]
+"""
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_fapi import FakeFapi  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--latency", type=float, default=0.08)
+ap.add_argument("--symbols", type=int, nargs="+", default=[12, 50])
+ap.add_argument("--limit", type=int, default=120)
+args = ap.parse_args()
+
+srv = FakeFapi(symbols=max(args.symbols), latency_s=args.latency)
+os.environ["FAPI_REST_HOSTS"] = srv.start()
+
+import utils  # noqa: E402
+from kline_store import KlineStore  # noqa: E402
+from signal_volume_breakout import evaluate_vbo  # noqa: E402
+
+
+def fresh_store():
+    utils.KLINE_STORE = KlineStore(utils._rest_json, refresh_s=30.0)
+
+
+def serial(syms):
+    first = None
+    t0 = time.perf_counter()
+    for s in syms:
+        bars = utils.fetch_klines(s, "5m", args.limit)
+        evaluate_vbo(bars)
+        first = first or time.perf_counter() - t0
+        time.sleep(0.06 + 0.04 * random.random())
+    return time.perf_counter() - t0, first
+
+
+def concurrent(syms):
+    first = None
+    t0 = time.perf_counter()
+    for s, bars, err in utils.fetch_klines_many(syms, "5m", args.limit):
+        if bars:
+            evaluate_vbo(bars)
+        first = first or time.perf_counter() - t0
+    return time.perf_counter() - t0, first
+
+
+print(f"latency={args.latency * 1000:.0f}ms limit={args.limit} workers={utils.LIMITER.concurrency}")
+print(f"{'symbols':>8} {'serial(s)':>10} {'concurrent(s)':>14} {'speedup':>8} {'first result(ms)':>18}")
+for n in args.symbols:
+    syms = srv.symbols[:n]
+    fresh_store(); ts, _ = serial(syms)
+    fresh_store(); tc, first = concurrent(syms)
+    print(f"{n:>8} {ts:>10.2f} {tc:>14.2f} {ts / tc:>7.1f}x {first * 1000:>18.0f}")
+print("limiter:", utils.LIMITER.stats())
+srv.stop()
@@ -0,0 +1,85 @@
+"""
+vbo_scan.scan_vbo 批次掃描：與逐檔 evaluate_vbo 對照 + 全市場（預設 300 檔）耗時；
+輸入為 K 線（堆疊 2-D）與增量特徵（VboFeatures 向量）兩種路徑都比對。
+
+    python tools/bench_vbo_scan.py [--symbols 300] [--limit 120]
+"""
+import argparse, math, os, random, sys, time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_fapi import FakeFapi  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--symbols", type=int, default=300)
+ap.add_argument("--limit", type=int, default=120)
+args = ap.parse_args()
+
+srv = FakeFapi(symbols=1)   # 只為了讓 utils 匯入時的校時不走外網
+os.environ["FAPI_REST_HOSTS"] = srv.start()
+
+from signal_volume_breakout import evaluate_vbo  # noqa: E402
+from vbo_scan import scan_vbo  # noqa: E402
+from vbo_state import features_from_bars  # noqa: E402
+
+rnd = random.Random(11)
+
+
+def series(n):
+    p = rnd.uniform(0.01, 1000); drift = rnd.choice([0.002, -0.002, 0.0])
+    c, h, l, v = (array("d") for _ in range(4))
+    for _ in range(n):
+        p *= math.exp(rnd.gauss(drift, 0.01))
+        c.append(p); h.append(p * 1.003); l.append(p * 0.997); v.append(rnd.lognormvariate(5, 1))
+    v[-1] *= rnd.choice([1, 5, 20]); c[-1] *= rnd.choice([1, 1.01, 0.99, 1.03])
+    return tuple(memoryview(x) for x in (c, h, l, v))
+
+
+universe = {f"S{i:03d}USDT": series(args.limit if i % 10 else args.limit - rnd.randint(1, 30))
+            for i in range(args.symbols)}
+
+feats = {s: f for s, f in ((s, features_from_bars(*b)) for s, b in universe.items()) if f is not None}
+
+
+def parity(cands):
+    got = {x.symbol: (x.long, x.short, x.atr) for x in cands}
+    bad = 0
+    for sym, bars in universe.items():
+        r = evaluate_vbo(bars)
+        g = got.get(sym, (False, False, None))
+        if (r.long, r.short) != g[:2] or (r.atr is None) != (g[2] is None) or \
+                (r.atr is not None and abs(r.atr - g[2]) > 1e-9 * r.atr):
+            bad += 1
+    return bad
+
+
+cands = scan_vbo(universe, args.limit)
+fails = parity(cands)
+print(f"parity vs evaluate_vbo: {'OK' if fails == 0 else f'{fails} mismatches'}  ({len(cands)} candidates)")
+f_fails = parity(scan_vbo(feats, args.limit))
+print(f"parity of the VboFeatures path: {'OK' if f_fails == 0 else f'{f_fails} mismatches'}")
+fails += f_fails
+
+runs = []
+for _ in range(30):
+    t0 = time.process_time(); scan_vbo(universe, args.limit); runs.append(time.process_time() - t0)
+runs.sort()
+t_batch = runs[len(runs) // 2] * 1e3
+runs = []
+for _ in range(30):
+    t0 = time.process_time(); scan_vbo(feats, args.limit); runs.append(time.process_time() - t0)
+runs.sort()
+t_feat = runs[len(runs) // 2] * 1e3
+t0 = time.process_time()
+for bars in universe.values():
+    evaluate_vbo(bars)
+t_loop = (time.process_time() - t0) * 1e3
+print(f"{args.symbols} symbols x {args.limit} bars: batch {t_batch:.2f} ms CPU, per-symbol loop {t_loop:.2f} ms, "
+      f"from incremental features {t_feat:.2f} ms")
+print("top candidates:")
+for x in cands[:5]:
+    print(f"  {x.symbol} long={x.long} short={x.short} vol_ratio={x.vol_ratio:.2f} breakout={x.breakout:+.4f}")
+srv.stop()
+ok = fails == 0 and t_batch < 10
+print("✅ PASS" if ok else "❌ FAIL")
+sys.exit(0 if ok else 1)
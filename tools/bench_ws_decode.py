@@ -0,0 +1,136 @@
+"""
+WS reader 解碼 + 分派基準（單核 msg/s），重播錄下的 frame：
+1) 改版前：標準 json 解整包 + 串流名稱子字串判斷（"@ticker" in ...）
+2) 標準 json + 串流後綴分派表（_Shard._on_frame）
+3) orjson + 串流後綴分派表（有安裝 orjson 才跑）
+另列純解碼（json.loads vs orjson.loads）的比較；cpu 時間以 time.process_time 計，即每核 msg/s。
+
+沒有 --feed 檔時先錄一份：預設連本機假 fstream（--url 可改連正式 wss://fstream.binance.com），
+訂閱 --symbols 檔的 @aggTrade + @bookTicker，錄 --frames 筆（一行一個原始 frame）。
+
+    python tools/bench_ws_decode.py [--feed /tmp/fstream.jsonl] [--frames 200000] [--symbols 50] [--url ws://...]
+"""
+import argparse, json, os, sys, time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ws_client  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--feed", default="/tmp/fstream.jsonl")
+ap.add_argument("--frames", type=int, default=200_000)
+ap.add_argument("--symbols", type=int, default=50)
+ap.add_argument("--url", default="")
+ap.add_argument("--rounds", type=int, default=3)
+args = ap.parse_args()
+
+
+def record(path: str):
+    from websockets.sync.client import connect
+    srv = None
+    url = args.url
+    if not url:
+        from fake_fstream import FakeFstream
+        srv = FakeFstream(symbols=args.symbols, tick_s=0.005, trades_per_tick=4)
+        url = srv.start()
+        syms = srv.symbols
+    else:
+        syms = [s for s in ("BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT", "DOGEUSDT", "BNBUSDT")][:args.symbols]
+    streams = "/".join(f"{s.lower()}@{k}" for s in syms for k in ("aggTrade", "bookTicker"))
+    n = 0
+    with connect(f"{url}/stream?streams={streams}", max_size=None) as ws, open(path, "w") as f:
+        while n < args.frames:
+            f.write(ws.recv() + "\n")
+            n += 1
+    if srv is not None:
+        srv.stop()
+    print(f"recorded {n} frames from {url} -> {path}")
+
+
+def old_reader(sh, msg_raw):
+    """改版前 _reader 的單筆處理（不含分片搬移判斷以外的差異）。"""
+    d = json.loads(msg_raw)
+    data = d.get("data")
+    stream_name = d.get("stream")
+    if not data or not stream_name:
+        return
+    sh._count(data)
+    sym = data.get("s")
+    if sym:
+        c = sh.sym_msgs
+        c[sym] = c.get(sym, 0) + 1
+        if ws_client._DELIVER.get(sym) is not sh:
+            ws_client._DELIVER[sym] = sh
+    if "@bookTicker" in stream_name:
+        ws_client._on_book_ticker(data)
+    elif "@ticker" in stream_name:
+        ws_client._on_ticker(data)
+    elif "@aggTrade" in stream_name:
+        ws_client._on_aggtrade(data)
+    elif "@kline_" in stream_name:
+        ws_client._on_kline(data)
+    elif data.get("e") == "ticker":
+        ws_client._on_ticker(data)
+    elif data.get("e") == "bookTicker":
+        ws_client._on_book_ticker(data)
+    elif data.get("e") == "aggTrade":
+        ws_client._on_aggtrade(data)
+    elif data.get("e") == "kline":
+        ws_client._on_kline(data)
+
+
+def state():
+    return ({s: (r.count, r.last_ts, r.window_sums(r.last_ts)) for s, r in ws_client._AGG.items()},
+            {s: (b.bid, b.ask, b.u) for s, b in ws_client._BOOK.items()})   # at 是本機收到時間，每輪不同
+
+
+def run(frames, fn) -> float:
+    best = 0.0
+    for _ in range(args.rounds):
+        ws_client._AGG = defaultdict(ws_client._new_ring)
+        ws_client._BOOK = {}
+        ws_client._DELIVER.clear()
+        ws_client._AGG_ID.clear()
+        ws_client._ROUTES.clear()
+        t0 = time.process_time()
+        for raw in frames:
+            fn(raw)
+        best = max(best, len(frames) / (time.process_time() - t0))
+    return best
+
+
+if __name__ == "__main__":
+    if not os.path.exists(args.feed):
+        record(args.feed)
+    with open(args.feed) as f:
+        frames = [line.rstrip("\n") for line in f if line.strip()]
+    kinds = defaultdict(int)
+    for raw in frames:
+        kinds[json.loads(raw).get("stream", "").partition("@")[2]] += 1
+    print(f"{len(frames)} frames, {sum(map(len, frames)) / len(frames):.0f} bytes avg, "
+          + ", ".join(f"{k} {v}" for k, v in sorted(kinds.items())))
+
+    sh = ws_client._Shard(0)
+    rows = [("json + substring (old)", run(frames, lambda raw: old_reader(sh, raw)))]
+    want = state()
+    same = []
+    ws_client._loads = json.loads
+    rows.append(("json + suffix table", run(frames, sh._on_frame)))
+    same.append(state() == want)
+    if ws_client.orjson is not None:
+        ws_client._loads = ws_client.orjson.loads
+        rows.append(("orjson + suffix table", run(frames, sh._on_frame)))
+        same.append(state() == want)
+    else:
+        print("(orjson not installed; pip install orjson for the fast decoder)")
+    rows.append(("decode only: json.loads", run(frames, json.loads)))
+    if ws_client.orjson is not None:
+        rows.append(("decode only: orjson.loads", run(frames, ws_client.orjson.loads)))
+
+    base = rows[0][1]
+    print(f"{'path':<28} {'msg/s/core':>11} {'vs old':>7}")
+    for name, r in rows:
+        print(f"{name:<28} {r:>11,.0f} {r / base:>6.2f}x")
+    ok = all(same) and len(want[0]) > 0 and all(c for c, _, _ in want[0].values())
+    print("✅ PASS" if ok else "❌ FAIL: new reader state differs from the old one")
@@ -0,0 +1,121 @@
+"""
+WS 收訊：同行程執行緒（預設） vs 獨立行程 + 共享記憶體（WS_PROCESS）基準。
+
+假 fstream 伺服器跑在另外 --servers 個行程（同一 port，SO_REUSEPORT 分攤連線），客戶端開 --shards 條連線；
+主執行緒模擬面板（12 fps 以 Rich 排版一張表 + 讀每個 symbol 的行情），
+逐步加大每個 symbol 的成交量，量測：
+- 吞吐：策略行程讀得到的逐筆成交數 / 秒（飽和時即上限）
+- 端到端延遲：讀取當下 - 最新一筆成交時間 T（伺服器產生時打的本機時間）的 p50 / p99
+- 面板：實際 fps 與每格延遲 p99（GIL 被收訊搶走時會掉格）
+
+    python tools/bench_ws_process.py [--symbols 40] [--loads 1,4,16,64] [--seconds 5] [--servers 4] [--shards 4]
+"""
+import argparse, io, math, multiprocessing as mp, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from rich.console import Console  # noqa: E402
+from rich.table import Table  # noqa: E402
+
+import ws_client  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--symbols", type=int, default=40)
+ap.add_argument("--loads", default="1,4,16,64", help="每個 symbol 每 tick（10 ms）的成交筆數")
+ap.add_argument("--seconds", type=float, default=5.0)
+ap.add_argument("--servers", type=int, default=4)
+ap.add_argument("--shards", type=int, default=4)
+args = ap.parse_args()
+os.environ["WS_SHARDS"] = str(args.shards)   # feed 子行程讀 config
+ws_client.WS_SHARDS = args.shards
+
+
+def _serve(conn, symbols, trades, port):
+    from fake_fstream import FakeFstream
+    srv = FakeFstream(port=port, symbols=symbols, tick_s=0.01, trades_per_tick=trades, reuse_port=True)
+    conn.send(srv.start())
+    conn.recv()   # 等父行程通知結束
+    srv.stop()
+
+
+def start_servers(load):
+    pipes, url = [], None
+    for _ in range(args.servers):
+        parent, child = mp.Pipe()
+        port = int(url.rsplit(":", 1)[1]) if url else 0
+        mp.Process(target=_serve, args=(child, args.symbols, load, port), daemon=True).start()
+        url = parent.recv()
+        pipes.append(parent)
+    return url, pipes
+
+
+def pct(vals, p):
+    if not vals:
+        return math.nan
+    s = sorted(vals)
+    return s[min(len(s) - 1, int(p / 100 * len(s)))]
+
+
+def render(console, syms):
+    t = Table(title="Top", expand=True)
+    for c in ("#", "Symbol", "Last", "Buy", "Sell"):
+        t.add_column(c)
+    for i, s in enumerate(syms[:10], 1):
+        p = ws_client.ws_best_price(s)
+        sums = ws_client.ws_agg_sums(s)
+        t.add_row(str(i), s, f"{p or 0:.6g}", f"{sums.buy_qty if sums else 0:.1f}", f"{sums.sell_qty if sums else 0:.1f}")
+    console.print(t)
+
+
+def run(mode_process: bool, url: str, syms):
+    ws_client.WS_PROCESS = mode_process
+    ws_client._HOST["main"] = url
+    ws_client.start_ws(syms, use_testnet=False)
+    t0 = time.time()
+    while time.time() - t0 < 10 and not all(ws_client._AGG.get(s) for s in syms):
+        time.sleep(0.05)
+    time.sleep(1.0)
+    console = Console(file=io.StringIO(), width=120)
+    count0 = sum(r.count for r in (ws_client._AGG.get(s) for s in syms) if r is not None)
+    lags, late, frames = [], [], 0
+    start = time.time()
+    nxt = start
+    while True:
+        now = time.time()
+        if now >= start + args.seconds:
+            break
+        if now < nxt:
+            time.sleep(nxt - now)
+            continue
+        late.append((now - nxt) * 1000)
+        nxt += 1 / 12
+        frames += 1
+        now_ms = time.time() * 1000
+        for s in syms:
+            r = ws_client._AGG.get(s)
+            if r is not None and r.last_ts:
+                lags.append(now_ms - r.last_ts)
+        render(console, syms)
+        console.file.seek(0); console.file.truncate()
+    dur = time.time() - start
+    count1 = sum(r.count for r in (ws_client._AGG.get(s) for s in syms) if r is not None)
+    ws_client.stop_ws()
+    return {"rate": (count1 - count0) / dur, "lag50": pct(lags, 50), "lag99": pct(lags, 99),
+            "fps": frames / dur, "late99": pct(late, 99)}
+
+
+if __name__ == "__main__":
+    ws_client.WS_ALL_TICKERS = False
+    print(f"{args.symbols} symbols on {args.shards} connection(s), {args.servers} server process(es),"
+          f" {args.seconds:.0f}s per run, panel at 12 fps on the main thread")
+    print(f"{'load':>6} {'mode':<8} {'trades/s':>9} {'lag p50':>9} {'lag p99':>9} {'fps':>5} {'frame late p99':>15}")
+    for load in [int(x) for x in args.loads.split(",")]:
+        url, pipes = start_servers(load)
+        syms = [f"SYM{i:03d}USDT" for i in range(args.symbols)]
+        for proc_mode in (False, True):
+            r = run(proc_mode, url, syms)
+            print(f"{load:>6} {'process' if proc_mode else 'thread':<8} {r['rate']:>9.0f} {r['lag50']:>7.0f}ms"
+                  f" {r['lag99']:>7.0f}ms {r['fps']:>5.1f} {r['late99']:>13.1f}ms", flush=True)
+        for p in pipes:
+            p.send("stop")
+        time.sleep(0.5)
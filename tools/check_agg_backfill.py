@@ -0,0 +1,155 @@
+"""
+離線驗證逐筆成交補洞（aggTrade id 連續性）：
+1) 斷線期間伺服器仍有成交 → 重連後 a 跳號，REST /fapi/v1/aggTrades?fromId= 補齊，
+   每個 symbol 的環形緩衝與伺服器成交紀錄逐筆一致（無缺、無重複、順序正確）；對照關閉補洞時少掉的筆數
+2) 連線中漏訊息（drop_aggtrade_p）同樣補齊
+3) 缺口超過 WS_AGG_BACKFILL_MAX：放棄補洞、記為 skipped / missing（不算 failed），即時成交照常接上（不會反覆重補）
+4) 補洞 future 被取消：暫存照樣收尾（_GAP 不會卡住）
+5) WS_PROCESS：feed 子行程的補洞由父行程代抓（請求打在父行程這邊的 REST），共享記憶體中的成交逐筆一致
+
+    python tools/check_agg_backfill.py [--symbols 8] [--gap 300]
+"""
+import argparse, asyncio, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from checklib import check, finish, wait_for  # noqa: E402
+from fake_fapi import FakeFapi  # noqa: E402
+from fake_fstream import FakeFstream  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--symbols", type=int, default=8)
+ap.add_argument("--gap", type=int, default=300, help="斷線期間每個 symbol 的成交筆數")
+args = ap.parse_args()
+
+fapi = FakeFapi(symbols=args.symbols)
+os.environ["FAPI_REST_HOSTS"] = fapi.start()
+
+import ws_client  # noqa: E402
+
+
+def tape_ok(srv, syms):
+    """回傳不一致的 symbol：ring 寫入的第 1..seq 筆應該就是伺服器的 id 1..seq（價格/數量逐筆比對）。"""
+    bad = []
+    for s in syms:
+        r = ws_client._AGG.get(s)
+        snap = r.snapshot(0) if r is not None else None
+        if snap is None or not snap.seq:
+            bad.append(s)
+            continue
+        w = snap.window
+        hist = srv._hist[s][snap.seq - len(w.price):snap.seq]
+        if len(hist) != len(w.price) or any(abs(p - float(t["p"])) > 1e-9 or abs(q - float(t["q"])) > 1e-9
+                                            for p, q, t in zip(w.price, w.qty, hist)):
+            bad.append(s)
+    return bad
+
+
+def settle():
+    """補洞完成且即時成交已接上。"""
+    return not ws_client._GAP and all(ws_client._AGG_ID.get(s, 0) > 0 for s in syms)
+
+
+def run_reconnect(srv, syms):
+    before = {s: ws_client._AGG_ID.get(s, 0) for s in syms}
+    srv.drop_connections()
+    srv.advance(args.gap)
+    wait_for(lambda: all(ws_client._AGG_ID.get(s, 0) > before[s] + args.gap for s in syms) and settle(), 15)
+    time.sleep(0.3)
+    return before
+
+
+ws_client.WS_ALL_TICKERS = False
+ws_client.WS_SHARDS = 1
+
+# --- 1) 對照：關閉補洞，斷線期間的成交直接遺失 ---
+srv = FakeFstream(symbols=args.symbols, tick_s=0.02, keep_history=True)
+fapi.agg_source = srv.agg_trades
+ws_client._HOST["main"] = srv.start()
+syms = srv.symbols
+ws_client.WS_AGG_BACKFILL = False
+ws_client.start_ws(syms, use_testnet=False)
+wait_for(lambda: all(ws_client._AGG_ID.get(s) for s in syms), 15)
+run_reconnect(srv, syms)
+lost = sum(ws_client._AGG_ID[s] - ws_client._AGG[s].count for s in syms)
+print(f"backfill off: {lost} trades lost across {len(syms)} symbols after one reconnect")
+check(lost >= args.gap * len(syms), "without backfill the reconnect gap is lost")
+ws_client.stop_ws()
+srv.stop()
+
+# --- 2) 開啟補洞 ---
+print("reconnect with backfill")
+srv = FakeFstream(symbols=args.symbols, tick_s=0.02, keep_history=True)
+fapi.agg_source = srv.agg_trades
+ws_client._HOST["main"] = srv.start()
+ws_client.WS_AGG_BACKFILL = True
+ws_client.start_ws(syms, use_testnet=False)
+wait_for(lambda: all(ws_client._AGG_ID.get(s) for s in syms), 15)
+hits0 = fapi.hits.get("/fapi/v1/aggTrades", 0)
+t0 = time.time()
+run_reconnect(srv, syms)
+st = ws_client.ws_stats()["backfill"]
+reqs = fapi.hits.get("/fapi/v1/aggTrades", 0) - hits0
+print(f"  {st['gaps']} gap(s), {st['filled']} trades filled with {reqs} request(s) "
+      f"(weight {reqs * 20}), settled in {time.time() - t0:.2f}s")
+check(st["gaps"] >= len(syms), "every symbol detected the reconnect gap")
+check(st["filled"] >= args.gap * len(syms), "missing trades fetched from /fapi/v1/aggTrades")
+check(not tape_ok(srv, syms), "tape matches server history trade by trade (no gap, no duplicate)")
+
+print("dropped messages on a live connection")
+srv.drop_aggtrade_p = 0.05
+time.sleep(1.0)
+srv.drop_aggtrade_p = 0.0
+wait_for(settle, 15)
+time.sleep(0.5)
+check(not tape_ok(srv, syms), "tape matches server history after in-stream drops")
+
+print("gap above WS_AGG_BACKFILL_MAX")
+ws_client.WS_AGG_BACKFILL_MAX = args.gap // 2
+failed0, skipped0, gaps0 = (ws_client._BACKFILL[k] for k in ("failed", "skipped", "gaps"))
+before = run_reconnect(srv, syms)
+st = ws_client.ws_stats()["backfill"]
+check(st["skipped"] - skipped0 == len(syms), "oversized gap skipped once per symbol")
+check(st["failed"] == failed0, "skipped gaps are not counted as failed")
+check(st["gaps"] - gaps0 == len(syms), "no repeated backfill for the accepted gap")
+check(all(ws_client._AGG_ID[s] > before[s] + args.gap for s in syms), "live trades resume after skipping")
+ws_client.WS_AGG_BACKFILL_MAX = 5000
+ws_client.stop_ws()
+srv.stop()
+
+print("cancelled backfill future")
+ws_client._GAP["XUSDT"] = [{"s": "XUSDT", "a": 11, "T": 1, "p": "1", "q": "1"}]
+loop = asyncio.new_event_loop()
+fut = loop.create_future()
+fut.cancel()
+failed0 = ws_client._BACKFILL["failed"]
+ws_client._backfill_done("XUSDT", 11, fut)
+loop.close()
+check("XUSDT" not in ws_client._GAP and ws_client._AGG_ID.get("XUSDT") == 11, "cancelled future still flushes the queued trades")
+check(ws_client._BACKFILL["failed"] == failed0 + 1, "cancelled backfill counted as failed")
+ws_client.stop_ws()
+
+print("WS_PROCESS: feed process backfills through the parent")
+srv = FakeFstream(symbols=args.symbols, tick_s=0.02, keep_history=True, reuse_port=True)
+fapi.agg_source = srv.agg_trades
+ws_client._HOST["main"] = srv.start()
+syms = srv.symbols
+ws_client.WS_PROCESS = True
+ws_client.start_ws(syms, use_testnet=False)
+wait_for(lambda: all(ws_client._AGG.get(s) is not None and ws_client._AGG[s].count for s in syms), 15)
+hits0 = fapi.hits.get("/fapi/v1/aggTrades", 0)
+srv.drop_connections()
+srv.advance(args.gap)
+wait_for(lambda: not tape_ok(srv, syms) and all(ws_client._AGG[s].count > args.gap for s in syms), 15)
+time.sleep(0.5)
+reqs = fapi.hits.get("/fapi/v1/aggTrades", 0) - hits0
+feed = ws_client.ws_stats()["feed"]
+print(f"  {feed['backfills']} backfill(s) proxied by the parent, {reqs} REST request(s)")
+check(feed["backfills"] >= len(syms) and reqs >= len(syms), "feed process gaps fetched by the parent process")
+check(not tape_ok(srv, syms), "shared-memory tape matches server history after the reconnect")
+ws_client.stop_ws()
+ws_client.WS_PROCESS = False
+srv.stop()
+fapi.stop()
+
+finish()
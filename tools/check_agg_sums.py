@@ -0,0 +1,123 @@
+"""
+AggRing 視窗累計對照：寫入時維護的買/賣量與 px*qty，和每次重掃 since(cutoff) 的結果一致
+（含視窗筆數超過容量、讀取時間落後最後一筆、長時間無成交），並比較大單訊號讀取耗時；
+讀取補扣期間寫入端繞回覆寫時，window_sums 會重讀而不是扣到新成交；
+大單訊號從 ws_snapshot 讀到的累計 / 可成交價與逐值讀取一致。
+
+    python tools/check_agg_sums.py
+"""
+import os, random, sys, time, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ws_client  # noqa: E402
+from agg_ring import AggRing  # noqa: E402
+from signal_large_trades_ws import large_trades_signal_ws  # noqa: E402
+
+WINDOW_MS = 5000
+
+
+def rescan(ring, now_ms):
+    """舊做法：掃過視窗內每一筆重算。"""
+    w = ring.since(now_ms - WINDOW_MS)
+    bq = bpq = sq = spq = 0.0
+    for p, q, b in zip(w.price, w.qty, w.side):
+        if b:
+            bq += q; bpq += p * q
+        else:
+            sq += q; spq += p * q
+    return bq, bpq, sq, spq
+
+
+def close(a, b, tol=1e-9):
+    return all(abs(x - y) <= tol * max(1.0, abs(x), abs(y)) for x, y in zip(a, b))
+
+
+fails = checks = 0
+for seed in range(60):
+    rnd = random.Random(seed)
+    cap = rnd.choice((50, 500, 6000))
+    rate = rnd.choice((2, 50, 2000))            # 筆/秒；2000 筆/秒時 5 秒視窗超過小容量
+    ring = AggRing(cap, window_ms=WINDOW_MS)
+    t, p = 1_700_000_000_000, rnd.uniform(0.01, 50000)
+    for _ in range(rnd.randint(1, 20000)):
+        t += int(rnd.expovariate(rate / 1000.0))
+        if rnd.random() < 0.001:
+            t += rnd.randint(5000, 60000)          # 長時間沒有成交
+        p *= 1 + rnd.gauss(0, 0.0005)
+        ring.append(t, p, rnd.lognormvariate(0, 1.5), rnd.random() < 0.5)
+        if rnd.random() < 0.02:
+            now = t + rnd.randint(0, 8000)         # 讀取時間落後最後一筆成交
+            checks += 1
+            if not close(ring.window_sums(now), rescan(ring, now)):
+                fails += 1
+                print("mismatch", seed, cap, rate, ring.window_sums(now), rescan(ring, now))
+                break
+print(f"parity: {checks} reads, {'OK' if fails == 0 else f'{fails} FAILURES'}")
+
+# 只有單側成交 → 另一側必須剛好是 0（不能留下加減殘差）
+ring = AggRing(100, window_ms=WINDOW_MS)
+for i in range(1000):
+    ring.append(1000 * i, 1.1 + i * 1e-3, 0.3 + i * 1e-4, i < 500)
+s = ring.window_sums(1000 * 999)
+if s.buy_qty != 0.0 or s.buy_notional != 0.0:
+    fails += 1; print("residual buy sums after all buys expired:", s)
+
+# 讀取補扣到一半，寫入端繞回一整圈（重現跨執行緒的競態）→ 必須重讀，結果與重掃一致
+class RacyRing(AggRing):
+    __slots__ = ("race",)
+
+    def _sub(self, state, cutoff=None):
+        if self.race:
+            self.race = False
+            t0 = self.last_ts
+            for i in range(1, self.capacity + 1):
+                self.append(t0 + i, 9999.0, 1000.0, True)
+        return AggRing._sub(self, state, cutoff)
+
+
+ring = RacyRing(100, window_ms=WINDOW_MS)
+ring.race = False
+for i in range(200):
+    ring.append(100 * i, 10.0, 1.0, i % 2 == 0)
+ring.race = True
+now = 100 * 199 + 3000    # 有 30 筆在讀取時才過期，要補扣
+got = ring.window_sums(now)
+if ring.retries < 1 or not close(got, rescan(ring, now)):
+    fails += 1; print("window_sums read overwritten slots:", got, rescan(ring, now), "retries", ring.retries)
+else:
+    print(f"wrap during read: retried {ring.retries}x, sums match rescan")
+
+# 大單訊號 / anchor 讀的是同一份 ws_snapshot：累計、recent 判斷、可成交價與逐值讀取一致
+ws_client._AGG["SNAPUSDT"] = ring = AggRing(100, window_ms=WINDOW_MS)
+now_ms = int(time.time() * 1000)
+for i in range(50):
+    ring.append(now_ms - 4000 + 80 * i, 10.0 + i, 1.0, i % 3 == 0)
+ws_client._BOOK["SNAPUSDT"] = ws_client.BookTop(49.5, 50.5, time.time(), 1)
+snap = ws_client.ws_snapshot("SNAPUSDT", 0)
+sums_ok = close(snap.agg_sums(recent_s=5), ws_client.ws_agg_sums("SNAPUSDT", recent_s=5))
+stale_ok = snap.agg_sums(recent_s=0.01) is None and ws_client.ws_agg_sums("SNAPUSDT", recent_s=0.01) is None
+px_ok = (snap.exec_price("BUY"), snap.exec_price("SELL"), snap.price) == (50.5, 49.5, 50.0)
+lt = large_trades_signal_ws("SNAPUSDT", snap)
+lt_ok = lt is None or lt.get("buy_vol") == snap.agg.sums.buy_qty
+if not (sums_ok and stale_ok and px_ok and lt_ok and len(snap.agg.window.ts) == 0):
+    fails += 1; print("MarketSnap readers disagree with per-value reads:", snap, lt)
+else:
+    print("ws_snapshot readers: sums / recent check / exec price match the per-value reads, window_s=0 copies nothing")
+
+# 耗時：熱門 symbol，5 秒視窗內約 2000 筆
+ring = AggRing(6000, window_ms=WINDOW_MS)
+t = 1_700_000_000_000
+for i in range(6000):
+    t += 2 + (i % 3)
+    ring.append(t, 100.0 + (i % 7), 0.5 + (i % 5), i % 2 == 0)
+now = t + 100
+n_win = len(ring.since(now - WINDOW_MS).ts)
+N = 500
+t_old = timeit.timeit(lambda: rescan(ring, now), number=N) / N * 1e6
+t_new = timeit.timeit(lambda: ring.window_sums(now), number=N) / N * 1e6
+t_fresh = timeit.timeit(lambda: ring.window_sums(t), number=N) / N * 1e6
+print(f"read ({n_win} trades in window): rescan {t_old:.1f} µs -> running sums {t_new:.2f} µs (x{t_old / t_new:.0f})")
+print(f"  read at the last trade's time (nothing to catch up): {t_fresh:.2f} µs;"
+      f" 100 ms later the read also subtracts the ~{len(ring.since(t - WINDOW_MS).ts) - n_win} trades that expired meanwhile")
+print("✅ PASS" if fails == 0 else f"❌ FAIL ({fails})")
+sys.exit(0 if fails == 0 else 1)
@@ -0,0 +1,90 @@
+"""
+離線驗證 @bookTicker 最佳買賣價快取：
+1) 與 @ticker（交易所約 1 秒節流、整包 24h 統計）比較：每個 symbol 的價格更新頻率、讀到的價格有多舊、每筆解析 bytes
+2) ws_exec_price 依方向取價（BUY = ask、SELL = bid）、ws_best_price 為中間價、較舊 updateId 不覆蓋
+3) 退訂後清掉紀錄；推播停止超過 WS_BOOK_STALE_S 後 ws_exec_price 回 None、ws_book_age 回報實際秒數
+
+    python tools/check_book_ticker.py [--symbols 20] [--seconds 4]
+"""
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from checklib import check, finish, wait_for  # noqa: E402
+from fake_fstream import FakeFstream  # noqa: E402
+
+import ws_client  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--symbols", type=int, default=20)
+ap.add_argument("--seconds", type=float, default=4.0)
+args = ap.parse_args()
+
+srv = FakeFstream(symbols=args.symbols, tick_s=0.05, ticker_s=1.0)
+ws_client._HOST["main"] = srv.start()
+ws_client.WS_ALL_TICKERS = False
+ws_client._RECEIVED_TICKER_SYMBOLS.update(srv.symbols)  # 關掉首筆 ticker 的 debug 輸出
+syms = srv.symbols
+
+
+def measure(book: bool):
+    """訂閱後取樣 args.seconds 秒：每次取樣時，讀到的價格距離它上次變動多久（= 讀取端看到的價格年齡）。"""
+    ws_client.WS_BOOK_TICKER = book
+    kind = "bookTicker" if book else "ticker"
+    ws_client.start_ws(syms, use_testnet=False)
+    wait_for(lambda: all(ws_client.ws_best_price(s) for s in syms))
+    b0, m0 = srv.sent_bytes.get(kind, 0), srv.sent_msgs.get(kind, 0)
+    last, changed, ages = {}, {}, []
+    t_end = time.time() + args.seconds
+    while time.time() < t_end:
+        now = time.time()
+        for s in syms:
+            p = ws_client.ws_best_price(s)
+            if p != last.get(s):
+                last[s], changed[s] = p, now
+            ages.append(now - changed[s])
+        time.sleep(0.01)
+    n_bytes = srv.sent_bytes.get(kind, 0) - b0
+    n_price = max(1, srv.sent_msgs.get(kind, 0) - m0)
+    ws_client.stop_ws()
+    ages.sort()
+    return {"kind": kind, "per_sym_s": n_price / len(syms) / args.seconds,
+            "bytes_per_msg": n_bytes / n_price, "age_p50": ages[len(ages) // 2], "age_p99": ages[int(len(ages) * 0.99)]}
+
+
+print("price stream comparison:")
+res = [measure(False), measure(True)]
+for r in res:
+    print(f"  @{r['kind']:<10} {r['per_sym_s']:6.1f} upd/s/symbol  {r['bytes_per_msg']:5.0f} bytes/msg"
+          f"  price age p50 {r['age_p50'] * 1000:6.0f} ms  p99 {r['age_p99'] * 1000:6.0f} ms")
+tk, bk = res
+check(bk["age_p50"] < tk["age_p50"] / 4, "bookTicker prices are fresher than @ticker")
+check(bk["bytes_per_msg"] < tk["bytes_per_msg"] * 0.75, "bookTicker parses fewer bytes per update")
+
+# ---- 方向取價 / 中間價 / updateId ----
+ws_client.WS_BOOK_TICKER = True
+ws_client.start_ws(syms, use_testnet=False)
+check(wait_for(lambda: all(ws_client.ws_book(s) for s in syms)), "every symbol has a book record")
+s0 = syms[0]
+b = ws_client.ws_book(s0)
+check(b.bid < b.ask, f"bid {b.bid} < ask {b.ask}")
+ws_client._on_book_ticker({"s": "TESTUSDT", "u": 10, "b": "99.5", "a": "100.5"})
+check(ws_client.ws_exec_price("TESTUSDT", "BUY") == 100.5 and ws_client.ws_exec_price("TESTUSDT", "SELL") == 99.5,
+      "BUY executes at ask, SELL at bid")
+check(ws_client.ws_best_price("TESTUSDT") == 100.0, "ws_best_price is the mid while the book is fresh")
+ws_client._on_book_ticker({"s": "TESTUSDT", "u": 9, "b": "1", "a": "2"})
+check(ws_client.ws_book("TESTUSDT").bid == 99.5, "older updateId does not overwrite")
+
+# ---- 退訂清快取 ----
+ws_client.start_ws(syms[:5], use_testnet=False)
+check(wait_for(lambda: all(ws_client.ws_book(s) is None for s in syms[5:])), "unsubscribed symbols drop their book")
+
+# ---- 過期 ----
+ws_client.WS_BOOK_STALE_S = 0.5
+srv.stop()
+time.sleep(1.0)
+age = ws_client.ws_book_age(s0)
+check(age > 0.5 and ws_client.ws_exec_price(s0, "BUY") is None, f"stale book reported (age {age:.2f}s) and not used")
+check(ws_client.ws_best_price(s0) is None, "ws_best_price falls back when the book is stale (no last price here)")
+check(ws_client.ws_book_age("NOPEUSDT") == float("inf"), "unknown symbol has infinite age")
+ws_client.stop_ws()
+finish()
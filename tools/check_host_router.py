@@ -0,0 +1,130 @@
+"""
+HostRouter / hedged GET 離線驗證：三台本機假伺服器注入不同延遲
+（慢 250ms、快 15ms 但每 25 個請求一次長尾 +600ms、中 60ms；長尾位置與 explore 亂數都固定，
+結果可重現），比較：
+1) 舊版隨機選主機
+2) ROUTER 排序（不 hedge）
+3) ROUTER + hedge
+並驗證目前最佳主機被關掉後會自動改走其他主機；5xx 記為錯誤樣本、延遲只算單次嘗試。
+
+    python tools/check_host_router.py [--requests 150]
+"""
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_fapi import FakeFapi  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--requests", type=int, default=150)
+args = ap.parse_args()
+
+slow = FakeFapi(symbols=5, latency_s=0.25)
+fast = FakeFapi(symbols=5, latency_s=0.015, spike_every=25, spike_s=0.6)
+mid = FakeFapi(symbols=5, latency_s=0.06)
+hosts = [slow.start(), fast.start(), mid.start()]
+os.environ["FAPI_REST_HOSTS"] = ",".join(hosts)
+
+import utils  # noqa: E402
+from host_router import HostRouter  # noqa: E402
+
+PATH, PARAMS = "/fapi/v1/klines", {"symbol": "SYM001USDT", "interval": "5m", "limit": 50}
+
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] * 1000
+
+
+def run(label):
+    random.seed(7)   # ranked() 的 explore 抽樣
+    for srv in (slow, fast, mid):
+        srv._n_req = 0
+    lat = []
+    for _ in range(args.requests):
+        t0 = time.perf_counter()
+        utils._rest_json(PATH, PARAMS, timeout=3)
+        lat.append(time.perf_counter() - t0)
+    print(f"  {label:<22} mean {sum(lat) / len(lat) * 1000:7.1f} ms   p50 {pct(lat, .5):6.1f}   "
+          f"p95 {pct(lat, .95):6.1f}   p99 {pct(lat, .99):6.1f}")
+    return lat
+
+
+class RandomRouter(HostRouter):
+    """舊行為：每次隨機順序。"""
+    def ranked(self):
+        return random.sample(hosts, len(hosts))
+
+
+print(f"{args.requests} GET {PATH} per mode")
+utils.REST_HEDGE = False
+utils.ROUTER = RandomRouter(hosts)
+base = run("random host (old)")
+utils.ROUTER = HostRouter(hosts)
+routed = run("router, no hedge")
+utils.REST_HEDGE = True
+utils.ROUTER = HostRouter(hosts)
+hedged = run("router + hedge")
+st = utils.ROUTER.stats()
+print("  hedges:", st["_hedge"])
+for h in hosts:
+    print(f"  {h}  {st[h]}")
+print("  histogram fast:", {k: v for k, v in utils.ROUTER.histogram(hosts[1]).items() if v})
+
+# 最佳主機故障 → 依錯誤率/冷卻改走其他主機
+servers = dict(zip(hosts, (slow, fast, mid)))
+utils.ROUTER.explore_p = 0.0
+down = utils.ROUTER.ranked()[0]
+servers[down].broken = True
+ok = 0
+for _ in range(20):
+    try:
+        utils._rest_json(PATH, PARAMS, timeout=1)
+        ok += 1
+    except Exception:
+        pass
+st = utils.ROUTER.stats()
+best = utils.ROUTER.ranked()[0]
+failover = ok == 20 and best != down and st[down]["errors"] > 0
+print(f"failover: stopped {down}; {ok}/20 ok, errors on it={st[down]['errors']}, best now={best}")
+
+# 5xx 一次再 200：記一筆錯誤樣本，延遲樣本只有單次嘗試（不含重試退避）
+r = HostRouter(hosts, explore_p=0.0)
+utils.ROUTER = r
+mid.fail_next = 1
+first = utils._timed_get(hosts[2], PATH, 5, PARAMS, 3).status_code
+utils._timed_get(hosts[2], PATH, 5, PARAMS, 3)
+st = r.stats()[hosts[2]]
+samples = list(r._hosts[hosts[2]].samples)
+single = first == 503 and st["errors"] == 1 and st["requests"] == 2 and len(samples) == 1 and samples[0] < 200
+print(f"503 then 200 on {hosts[2]}: first status {first}, errors={st['errors']}, latency samples {[round(x) for x in samples]} ms")
+
+# hedge 兩台都失敗 → 後備重試只送還沒試過的主機（不重送 hosts[1]）
+r = HostRouter(hosts, explore_p=0.0)
+for h, ms in zip(hosts, (5, 50, 80)):
+    for _ in range(10):
+        r.record(h, ms / 1000, ok=True)
+utils.ROUTER = r
+calls = []
+real_get = utils._timed_get
+
+
+def failing_get(b, *a):
+    calls.append(b)
+    time.sleep(0.05 if b == hosts[0] else 0.0)   # 超過 hosts[0] 的 p95 → 觸發 hedge
+    raise utils.requests.exceptions.ConnectionError("down")
+
+
+utils._timed_get = failing_get
+try:
+    utils._rest_fetch(PATH, PARAMS, timeout=1, tries=1)
+except Exception:
+    pass
+utils._timed_get = real_get
+no_resend = sorted(calls) == sorted(hosts)
+print(f"hedge failed on both: hosts called {len(calls)} time(s) for {len(hosts)} hosts")
+
+for srv in servers.values():
+    srv.stop()
+good = (sum(routed) < sum(base) and pct(hedged, .99) < pct(routed, .99) and failover and no_resend and single)
+print("✅ PASS" if good else "❌ FAIL")
+sys.exit(0 if good else 1)
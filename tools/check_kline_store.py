@@ -0,0 +1,76 @@
+"""
+離線驗證 KlineStore：增量抓取後的序列與整段重抓一致，並量測穩態頻寬節省。
+
+    python tools/check_kline_store.py
+"""
+import os, sys, threading, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_fapi import FakeFapi  # noqa: E402
+
+SYMBOLS = 20
+ROUNDS = 5
+LIMIT = 200
+INTERVAL = "5m"
+
+srv = FakeFapi(symbols=SYMBOLS)
+os.environ["FAPI_REST_HOSTS"] = srv.start()
+
+import utils  # noqa: E402
+from kline_store import KlineStore  # noqa: E402
+
+store = KlineStore(utils._rest_json, refresh_s=0.0)  # 0 秒 → 每次都走增量
+syms = srv.symbols
+
+b0 = srv.bytes_out
+for s in syms:
+    store.get(s, INTERVAL, LIMIT)
+full_bytes = srv.bytes_out - b0
+
+b1 = srv.bytes_out
+for _ in range(ROUNDS):
+    for s in syms:
+        store.get(s, INTERVAL, LIMIT)
+delta_bytes = (srv.bytes_out - b1) / ROUNDS
+
+mismatch = 0
+for s in syms:
+    view = store.get(s, INTERVAL, LIMIT)
+    rows = utils._rest_json("/fapi/v1/klines", {"symbol": s, "interval": INTERVAL, "limit": LIMIT})
+    ref = ([float(x[4]) for x in rows], [float(x[2]) for x in rows],
+           [float(x[3]) for x in rows], [float(x[5]) for x in rows])
+    # 最後一根仍在形成中，兩次請求間可能變動 → 只比對已收盤 bar
+    if any(len(a) != len(b) or list(a[:-1]) != b[:-1] for a, b in zip(view, ref)):
+        mismatch += 1
+
+# 慢 REST（含重試等待）期間，WS 分片套用同一序列的 kline 不應被卡住
+srv.latency_s = 0.5
+s0 = syms[0]
+ser = store.series(s0, INTERVAL)
+t = threading.Thread(target=store.get, args=(s0, INTERVAL, LIMIT))
+t.start()
+time.sleep(0.1)
+k = {"i": INTERVAL, "t": ser.last_open_time, "o": "1", "h": "2", "l": "0.5", "c": "1.5", "v": "10"}
+t0 = time.perf_counter()
+store.apply_ws_kline(s0, k)
+ws_block_ms = (time.perf_counter() - t0) * 1000
+t.join()
+srv.latency_s = 0.0
+
+# get() 的回傳值是複本：之後 WS 改寫形成中 bar 不會反映在已交出的視窗
+held = store.get(s0, INTERVAL, LIMIT)
+before = [list(c) for c in held]
+store.apply_ws_kline(s0, dict(k, t=ser.last_open_time, c="123.0", h="124.0"))
+held_stable = [list(c) for c in held] == before and list(store.get(s0, INTERVAL, LIMIT)[0])[-1] == 123.0
+srv.stop()
+
+saving = 1.0 - delta_bytes / full_bytes
+print(f"full fetch : {full_bytes / SYMBOLS:.0f} B/symbol")
+print(f"delta fetch: {delta_bytes / SYMBOLS:.0f} B/symbol  (saving {saving * 100:.1f}%)")
+print("store:", store.stats(), "mismatched symbols:", mismatch)
+print("memory:", store.memory())
+print(f"apply_ws_kline during a slow REST fetch: {ws_block_ms:.1f} ms")
+print(f"returned window unchanged by a later WS update: {held_stable}")
+ok = mismatch == 0 and saving > 0.95 and ws_block_ms < 50 and held_stable
+print("✅ PASS" if ok else "❌ FAIL")
+sys.exit(0 if ok else 1)
@@ -0,0 +1,121 @@
+"""
+大單訊號歷史門檻：SortedWindow.percentile / rank 與舊版（deque → list → sort → 線性掃描）逐筆完全相同，
+並量測全市場規模下每輪門檻/排名的耗時。
+
+    python tools/check_order_stats.py [--symbols 300]
+"""
+import argparse, math, os, random, sys, time
+from collections import deque
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from indicators import SortedWindow  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--symbols", type=int, default=300)
+args = ap.parse_args()
+
+
+# ---- 舊版參考實作，取自 signal_large_trades_ws.py 改版前 ----
+def _percentile(vals, p):
+    if not vals: return math.inf
+    s = sorted(vals)
+    k = max(0, min(len(s)-1, int(round((p/100.0)*(len(s)-1)))))
+    return s[k]
+
+
+def _calculate_percentile_rank(data: list, value: float) -> Optional[float]:
+    if not data:
+        return None
+    data.sort()
+    count_below = 0
+    count_equal = 0
+    for item in data:
+        if item < value:
+            count_below += 1
+        elif item == value:
+            count_equal += 1
+        else:
+            break
+    if count_equal == 0:
+         rank = (count_below / len(data)) * 100.0
+    else:
+         rank = ((count_below + 0.5 * count_equal) / len(data)) * 100.0
+    return rank
+
+
+def draw(rnd, pool):
+    """成交量：連續值為主，混入重複值（同一 bucket 量、整數量）測 equal 分支。"""
+    r = rnd.random()
+    if r < 0.2 and pool:
+        return rnd.choice(pool)
+    if r < 0.3:
+        return float(rnd.randint(1, 20))
+    return rnd.lognormvariate(3, 2)
+
+
+# ---- 性質測試：每次 push 後，門檻與排名都要和舊版完全相等（== 比較，非容差） ----
+fails = checks = 0
+PCTS = (0, 1, 5, 10, 25, 50, 62.5, 75, 90, 95, 99, 99.9, 100)
+for seed in range(200):
+    rnd = random.Random(seed)
+    maxlen = rnd.choice((1, 2, 3, 7, 50, 500))
+    dq, sw = deque(maxlen=maxlen), SortedWindow(maxlen)
+    pool = []
+    for _ in range(rnd.randint(1, 3 * maxlen + 20)):
+        v = draw(rnd, pool)
+        pool.append(v)
+        dq.append(v)
+        sw.push(v)
+        p = rnd.choice(PCTS)
+        q = rnd.choice((v, draw(rnd, pool), rnd.choice(list(dq)), 0.0, 1e18))
+        checks += 1
+        if _percentile(list(dq), p) != sw.percentile(p) or _calculate_percentile_rank(list(dq), q) != sw.rank(q):
+            fails += 1
+            print("mismatch", seed, maxlen, p, q)
+            break
+empty = SortedWindow(5)
+if empty.percentile(90) != _percentile([], 90) or empty.rank(1.0) is not None:
+    fails += 1; print("empty-window behaviour differs")
+print(f"property check: {checks} states, {'OK' if fails == 0 else f'{fails} FAILURES'}")
+
+# ---- 全市場規模：每個 symbol 500 筆歷史，每輪 push 1 筆 + 兩個門檻 + 兩個排名 ----
+S, N = args.symbols, 500
+rnd = random.Random(1)
+old_hist = [(deque(maxlen=N), deque(maxlen=N)) for _ in range(S)]
+new_hist = [(SortedWindow(N), SortedWindow(N)) for _ in range(S)]
+for (ob, os_), (nb, ns) in zip(old_hist, new_hist):
+    for _ in range(N):
+        b, s = rnd.lognormvariate(3, 2), rnd.lognormvariate(3, 2)
+        ob.append(b); os_.append(s); nb.push(b); ns.push(s)
+vols = [(rnd.lognormvariate(3, 2), rnd.lognormvariate(3, 2)) for _ in range(S)]
+
+
+def round_old():
+    for (hb, hs), (bq, sq) in zip(old_hist, vols):
+        hb.append(bq); hs.append(sq)
+        _percentile(list(hb), 90); _percentile(list(hs), 90)
+        _calculate_percentile_rank(list(hb), bq); _calculate_percentile_rank(list(hs), sq)
+
+
+def round_new():
+    for (hb, hs), (bq, sq) in zip(new_hist, vols):
+        hb.push(bq); hs.push(sq)
+        hb.percentile(90); hs.percentile(90)
+        hb.rank(bq); hs.rank(sq)
+
+
+def bench(fn, reps=5):
+    best = math.inf
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+t_old, t_new = bench(round_old), bench(round_new)
+print(f"{S} symbols x {N}-entry history, one push + 2 gates + 2 ranks each:")
+print(f"  deque + sort + scan {t_old:8.2f} ms/round")
+print(f"  SortedWindow        {t_new:8.2f} ms/round   (x{t_old / t_new:.0f})")
+sys.exit(0 if fails == 0 else 1)
@@ -0,0 +1,120 @@
+"""
+precision.Grid 對照 utils.floor_step_decimal / round_tick_decimal（Decimal 路徑）：
+1) 多種 tick/step × 多個數量級的隨機值 + 格點/半格/±1ulp 邊界 × 三種取整模式，逐一比對
+   Grid.format 對未對齊的值與已對齊的 float 都和 to_str(steps(...)) 相同
+2) 下單準備流程（數量、minNotional、SL/TP/進場價）新舊結果一致，下單字串 == 對齊後的值
+3) 下單準備延遲：舊 Decimal 流程 vs 整數流程；下單字串 f-string vs Grid.format
+
+    python tools/check_precision.py
+"""
+import math, os, random, sys, timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_fapi import FakeFapi  # noqa: E402
+
+srv = FakeFapi(symbols=1)   # 只為了讓 utils 匯入時的校時不走外網
+os.environ["FAPI_REST_HOSTS"] = srv.start()
+
+from utils import floor_step_decimal, round_tick_decimal, to_decimal  # noqa: E402
+from precision import Grid, FLOOR, CEIL, HALF_UP, below_min_notional  # noqa: E402
+
+SIZES = ["1", "10", "0.1", "0.5", "0.25", "0.01", "0.025", "0.001", "0.0001", "0.00001",
+         "0.000001", "0.0000001", "0.00000100", "5", "0.00500"]
+rnd = random.Random(5)
+fails = checks = 0
+
+
+def values_for(size: str):
+    t = float(size)
+    out = [rnd.uniform(0, 1) * 10 ** rnd.randint(-8, 6) for _ in range(300)]
+    for _ in range(100):
+        k = rnd.randint(0, 10 ** 6)
+        for x in (k * t, (k + 0.5) * t, k * t + t / 3):
+            out += [x, math.nextafter(x, math.inf), math.nextafter(x, -math.inf)]
+    out += [-v for v in out[:50]] + [0.0, 1e-12, 123456.789]
+    return out
+
+
+for size in SIZES:
+    g, d = Grid(size), Decimal(size)
+    for v in values_for(size):
+        vd = to_decimal(v)
+        ref = {FLOOR: floor_step_decimal(vd, d), CEIL: round_tick_decimal(vd, d, +1),
+               HALF_UP: round_tick_decimal(vd, d, 0)}
+        for mode, r in ref.items():
+            n = g.steps(v, mode)
+            checks += 1
+            if g.to_decimal(n) != r or Decimal(g.to_str(n)) != r or g.to_float(n) != float(r):
+                fails += 1
+                if fails <= 5:
+                    print("mismatch", size, repr(v), mode, g.to_str(n), r)
+            # format：未對齊的值走 steps，已對齊的 float（to_float 的結果）走 %.{decimals}f 捷徑，字串都要相同
+            for x, want in ((v, g.to_str(n)), (g.to_float(n), g.to_str(g.steps(g.to_float(n), mode)))):
+                checks += 1
+                if g.format(x, mode) != want:
+                    fails += 1
+                    if fails <= 5:
+                        print("format mismatch", size, repr(x), mode, g.format(x, mode), want)
+print(f"rounding parity: {checks} checks, {'OK' if fails == 0 else f'{fails} FAILURES'}")
+
+
+# ---- 下單準備流程：舊（main.py 改版前的 Decimal 路徑）vs 新 ----
+def prepare_old(entry, notional, tick, step, min_notional, side, sl_raw, tp_raw):
+    entry_dec = to_decimal(entry)
+    qty_dec = floor_step_decimal(to_decimal(notional) / entry_dec, step)
+    if not qty_dec.is_finite() or qty_dec <= 0:
+        return None
+    if min_notional is not None and qty_dec * entry_dec < min_notional:
+        return None
+    sl = round_tick_decimal(to_decimal(sl_raw), tick, -1 if side == "LONG" else +1)
+    tp = round_tick_decimal(to_decimal(tp_raw), tick, +1 if side == "LONG" else -1)
+    en = round_tick_decimal(entry_dec, tick)
+    return float(qty_dec), float(en), float(sl), float(tp)
+
+
+def prepare_new(entry, notional, qg, pg, min_notional, side, sl_raw, tp_raw):
+    qty_n = qg.steps_of_ratio(notional, entry, FLOOR)
+    if qty_n <= 0:
+        return None
+    if min_notional is not None and below_min_notional(qg, qty_n, entry, min_notional):
+        return None
+    sl_n = pg.steps(sl_raw, FLOOR if side == "LONG" else CEIL)
+    tp_n = pg.steps(tp_raw, CEIL if side == "LONG" else FLOOR)
+    en_n = pg.steps(entry, HALF_UP)
+    return qg.to_float(qty_n), pg.to_float(en_n), pg.to_float(sl_n), pg.to_float(tp_n)
+
+
+bad = 0
+cases = []
+for _ in range(20000):
+    tick, step = rnd.choice(SIZES[2:11]), rnd.choice(SIZES[:9])
+    entry = rnd.uniform(0.5, 2) * 10 ** rnd.randint(-5, 4)
+    notional = rnd.choice([rnd.uniform(1, 500), 5.0, 100.0])
+    side = rnd.choice(["LONG", "SHORT"])
+    atr = entry * rnd.uniform(0.001, 0.03)
+    sl_raw = entry - 1.5 * atr if side == "LONG" else entry + 1.5 * atr
+    tp_raw = entry + 3 * atr if side == "LONG" else entry - 3 * atr
+    old = prepare_old(entry, notional, Decimal(tick), Decimal(step), Decimal("5"), side, sl_raw, tp_raw)
+    new = prepare_new(entry, notional, Grid(step), Grid(tick), Decimal("5"), side, sl_raw, tp_raw)
+    if old != new:
+        bad += 1
+    cases.append((entry, notional, tick, step, side, sl_raw, tp_raw))
+print(f"order-prep parity: {len(cases)} orders, {'OK' if bad == 0 else f'{bad} FAILURES'}")
+
+# ---- 延遲 ----
+entry, notional, tick, step, side, sl_raw, tp_raw = 0.012345, 123.4, "0.000001", "1", "LONG", 0.0119, 0.0131
+td, sd, mn = Decimal(tick), Decimal(step), Decimal("5")
+qg, pg = Grid(step), Grid(tick)
+N = 20000
+t_old = timeit.timeit(lambda: prepare_old(entry, notional, td, sd, mn, side, sl_raw, tp_raw), number=N) / N * 1e6
+t_new = timeit.timeit(lambda: prepare_new(entry, notional, qg, pg, mn, side, sl_raw, tp_raw), number=N) / N * 1e6
+t_fmt_old = timeit.timeit(lambda: f"{0.0123:.{6}f}", number=N) / N * 1e6
+t_fmt_new = timeit.timeit(lambda: pg.format(0.0123), number=N) / N * 1e6
+t_fmt_raw = timeit.timeit(lambda: pg.format(0.01234567), number=N) / N * 1e6
+print(f"order prep: Decimal {t_old:.1f} µs -> integer {t_new:.1f} µs (x{t_old / t_new:.1f})")
+print(f"format: f-string {t_fmt_old:.2f} µs / Grid.format aligned {t_fmt_new:.2f} µs, unaligned {t_fmt_raw:.2f} µs")
+srv.stop()
+ok = fails == 0 and bad == 0
+print("✅ PASS" if ok else "❌ FAIL")
+sys.exit(0 if ok else 1)
@@ -0,0 +1,67 @@
+"""
+離線驗證 utils.LIMITER：對本機假伺服器（tools/fake_fapi.py）狂打 klines，
+確認 0 次 429/418，且吞吐量接近權重上限；伺服器回 5xx 時一次 rest_call 只送出一次請求（urllib3 不在背後重打）。
+
+    python tools/check_rate_limiter.py
+"""
+import os, sys, threading, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_fapi import FakeFapi  # noqa: E402
+
+WINDOW_S = 5.0
+LIMIT = 200
+RUN_S = 12.0
+THREADS = 12
+
+srv = FakeFapi(symbols=50, weight_limit=LIMIT, window_s=WINDOW_S, latency_s=0.01)
+os.environ["FAPI_REST_HOSTS"] = srv.start()
+
+import utils  # noqa: E402  (需在設定 FAPI_REST_HOSTS 後才匯入)
+from rate_limiter import WeightLimiter, RateLimitBackoff  # noqa: E402
+
+# 縮短視窗讓檢查在十幾秒內跑完；邏輯與正式 60s 視窗相同
+utils.LIMITER = WeightLimiter(limit=LIMIT, window_s=WINDOW_S, safety=0.8, max_inflight=8)
+
+done = {"ok": 0, "err": 0, "backoff": 0}
+lock = threading.Lock()
+stop_at = time.time() + RUN_S
+
+
+def worker(i):
+    while time.time() < stop_at:
+        try:
+            utils._rest_json("/fapi/v1/klines", {"symbol": f"SYM{i:03d}USDT", "interval": "5m", "limit": 150}, tries=1)
+            k = "ok"
+        except RateLimitBackoff:
+            k = "backoff"
+        except Exception:
+            k = "err"
+        with lock:
+            done[k] += 1
+
+
+ths = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+t0 = time.time()
+for t in ths: t.start()
+for t in ths: t.join()
+elapsed = time.time() - t0
+
+budget = LIMIT * 0.8 / WINDOW_S * elapsed / 2  # 每個請求權重 2
+print(f"requests ok={done['ok']} err={done['err']} backoff={done['backoff']} in {elapsed:.1f}s")
+print(f"server 429={srv.count_429} 418={srv.count_418}")
+print(f"throughput {done['ok'] / elapsed:.1f} req/s (budget ≈ {budget / elapsed:.1f} req/s)")
+print("limiter:", utils.LIMITER.stats())
+
+# 5xx 不在 urllib3 內重打：一次 rest_call = 一次請求 = 一次權重
+hits0 = srv.hits.get("/fapi/v1/ticker/price", 0)
+srv.fail_next = 3
+r = utils.rest_call("GET", f"{srv.url}/fapi/v1/ticker/price", 2, params={"symbol": "SYM000USDT"}, timeout=5)
+sent = srv.hits.get("/fapi/v1/ticker/price", 0) - hits0
+srv.fail_next = 0
+print(f"503 response: {sent} request(s) sent for one rest_call (status {r.status_code})")
+srv.stop()
+
+ok = srv.count_429 == 0 and srv.count_418 == 0 and done["ok"] >= 0.8 * budget and sent == 1 and r.status_code == 503
+print("✅ PASS" if ok else "❌ FAIL")
+sys.exit(0 if ok else 1)
@@ -0,0 +1,118 @@
+"""
+離線驗證 WS_PROCESS 共享記憶體的 slot 換手（不啟動子行程：寫入端 / 讀取端的 _Slots 掛在同一段記憶體）：
+1) 讀取端拿到的 ring 綁定 (slot, tag)：slot 換給別的 symbol 之後，舊 ring 的 count / since / snapshot /
+   window_sums 都是空的，不會讀到新 symbol 的成交；重新取得的 ring 才看得到新 symbol
+2) snapshot 讀到一半 slot 換手（在 _sub 裡模擬）→ 回傳空快照，不混進新 symbol 的資料
+3) 換手時分片正寫到一半（已查到舊 symbol 的 ring、還沒 append）→ 子行程等它寫完才清空，新 symbol 的 slot 是乾淨的
+4) 非 x86-64：FeedProcess.start 拒絕啟動，start_ws 印警告並改回同行程收訊
+
+    python tools/check_shm_feed.py
+"""
+import asyncio, os, sys, threading, time
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from checklib import check, finish  # noqa: E402
+import shm_feed  # noqa: E402
+from agg_ring import AggRing  # noqa: E402
+
+CAP, WIN = 100, 5000
+
+
+def feed(ring, n, px, t0=1_000_000):
+    for i in range(n):
+        ring.append(t0 + 10 * i, px, 1.0, i % 2 == 0)
+
+
+shm = shared_memory.SharedMemory(create=True, size=shm_feed._FEED_HDR + 2 * shm_feed.slot_bytes(CAP))
+w = shm_feed._Slots(shm.buf, 2, CAP, WIN, writer=True)
+r = shm_feed._Slots(shm.buf, 2, CAP, WIN, writer=False)
+rings = shm_feed.ShmRings(r)
+
+print("slot reassigned while a reader holds the old ring")
+r.assign = {"AAAUSDT": (0, 1)}
+shm_feed._apply_assign(w, dict(r.assign))
+feed(shm_feed.ShmRings(w)["AAAUSDT"], 50, 10.0)
+old = rings["AAAUSDT"]
+check(old.count == 50 and old.snapshot(0).window.price[0] == 10.0, "reader sees AAAUSDT before the handover")
+
+r.assign = {"BBBUSDT": (0, 2)}          # 父行程：slot 0 換給 BBBUSDT
+shm_feed._apply_assign(w, dict(r.assign))
+feed(shm_feed.ShmRings(w)["BBBUSDT"], 70, 99.0, t0=2_000_000)
+snap = old.snapshot(0)
+check(old.count == 0 and len(old) == 0 and old.last_ts == 0, "old ring reports no trades after the handover")
+check(snap.seq == 0 and len(snap.window.price) == 0, "old ring snapshot is empty, not BBBUSDT's tape")
+check(len(old.since(0).price) == 0 and len(old.last(10).price) == 0, "old ring zero-copy views are empty")
+check(old.window_sums(2_000_700) == (0.0, 0.0, 0.0, 0.0) and old.window_sums(2_000_700, recent_ms=1000) is None,
+      "old ring window sums are empty")
+new = rings["BBBUSDT"]
+check(new.count == 70 and set(new.snapshot(0).window.price) == {99.0}, "fresh ring sees BBBUSDT")
+check("AAAUSDT" not in rings and len(rings) == 1, "AAAUSDT no longer listed")
+
+print("handover in the middle of a snapshot")
+r.assign = {"CCCUSDT": (1, 3)}
+shm_feed._apply_assign(w, dict(r.assign))
+feed(shm_feed.ShmRings(w)["CCCUSDT"], 60, 5.0)
+victim = rings["CCCUSDT"]
+
+
+def racy_sub(state, cutoff=None, _ring=victim):
+    # 讀取端算到一半，slot 1 換給 DDDUSDT 並寫入新成交
+    r.assign = {"DDDUSDT": (1, 4)}
+    shm_feed._apply_assign(w, dict(r.assign))
+    feed(shm_feed.ShmRings(w)["DDDUSDT"], 80, 77.0, t0=3_000_000)
+    return AggRing._sub(_ring, state, cutoff)
+
+
+orig = shm_feed.ShmAggRing._sub
+shm_feed.ShmAggRing._sub = lambda self, state, cutoff=None: racy_sub(state, cutoff) if self is victim else orig(self, state, cutoff)
+snap = victim.snapshot(0)
+shm_feed.ShmAggRing._sub = orig
+check(snap.seq == 0 and 77.0 not in set(snap.window.price), "snapshot racing a handover comes back empty")
+
+print("handover while a shard is mid-append")
+loop = asyncio.new_event_loop()
+threading.Thread(target=loop.run_forever, daemon=True).start()
+shard = SimpleNamespace(loop=loop)
+looked_up = threading.Event()
+
+
+def slow_append():
+    ring = shm_feed.ShmRings(w)["DDDUSDT"]     # 分片已查到舊 symbol 的 ring
+    looked_up.set()
+    time.sleep(0.2)
+    ring.append(2_100_000, 55.0, 1.0, True)
+
+
+loop.call_soon_threadsafe(slow_append)
+looked_up.wait(5)
+r.assign = {"FFFUSDT": (1, 5)}
+shm_feed._apply_assign(w, dict(r.assign), quiesce=lambda: shm_feed._quiesce([shard]))
+time.sleep(0.3)                             # 寫到一半的那筆此時一定已經落地
+fresh = rings["FFFUSDT"]
+check(fresh.count == 0 and 55.0 not in set(fresh.snapshot(0).window.price),
+      "new symbol's slot starts empty (stale append finished before the clear)")
+loop.call_soon_threadsafe(loop.stop)
+
+w.release()
+r.release()
+shm.close()
+shm.unlink()
+
+print("non-x86-64 machine")
+shm_feed.platform.machine = lambda: "aarch64"
+try:
+    shm_feed.FeedProcess(4, CAP, WIN).start(False, "ws://127.0.0.1:1", tuple)
+    refused = False
+except RuntimeError as e:
+    refused = "x86-64" in str(e)
+check(refused, "FeedProcess.start refuses to run")
+import ws_client  # noqa: E402
+ws_client.WS_ALL_TICKERS = False
+ws_client.WS_PROCESS = True
+ws_client.start_ws([], use_testnet=False)
+check(ws_client.WS_PROCESS is False and ws_client._FEED is None, "start_ws falls back to in-process shards")
+ws_client.stop_ws()
+
+finish()
@@ -0,0 +1,92 @@
+"""
+離線驗證 single-flight：同一資源的併發請求只送一次、TTL 內直接命中、失敗轉拋給所有等待者。
+
+    python tools/check_single_flight.py
+"""
+import os, sys, threading, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_fapi import FakeFapi  # noqa: E402
+
+THREADS = 32
+
+srv = FakeFapi(symbols=5, latency_s=0.05)
+os.environ["FAPI_REST_HOSTS"] = srv.start()
+
+import utils  # noqa: E402
+from single_flight import SingleFlight  # noqa: E402
+
+SYM = srv.symbols[0]
+
+
+def burst(fn):
+    """THREADS 個執行緒同時呼叫 fn，回傳 (結果, 例外)。"""
+    gate = threading.Barrier(THREADS)
+    out, errs = [], []
+
+    def run():
+        gate.wait()
+        try:
+            out.append(fn())
+        except Exception as e:
+            errs.append(e)
+    ts = [threading.Thread(target=run) for _ in range(THREADS)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return out, errs
+
+
+def sent(path, fn):
+    before = srv.hits.get(path, 0)
+    out, errs = burst(fn)
+    return srv.hits.get(path, 0) - before, out, errs
+
+
+fails = 0
+PRICE, KL = "/fapi/v1/ticker/price", "/fapi/v1/klines"
+kl_params = {"symbol": SYM, "interval": "5m", "limit": 50}
+
+utils.REST_COALESCE = False
+n_old, _, _ = sent(KL, lambda: utils._rest_json(KL, dict(kl_params)))
+utils.REST_COALESCE = True
+n_new, out, errs = sent(KL, lambda: utils._rest_json(KL, dict(kl_params)))
+print(f"klines x{THREADS} concurrent: {n_old} requests without coalescing, {n_new} with")
+if n_new != 1 or errs or any(o is not out[0] for o in out):
+    fails += 1; print("  klines not coalesced into one shared result")
+
+# 參數順序/型別不同但 query 相同 → 同一請求；不同 symbol 不合併
+n_mix, _, _ = sent(KL, lambda: utils._rest_json(KL, {"limit": "50", "interval": "5m", "symbol": SYM}))
+n_two, _, _ = sent(PRICE, lambda: [utils._rest_json(PRICE, {"symbol": s}, ttl=0) for s in srv.symbols[:2]])
+if n_mix != 1 or n_two != 2:
+    fails += 1; print(f"  key mismatch: reordered params sent {n_mix}, two symbols sent {n_two}")
+
+# ticker/price 有 TTL：TTL 內不再送出，過期後再送一次
+utils.FLIGHT.forget(("/fapi/v1/ticker/price", ("symbol", SYM)))
+n1, _, _ = sent(PRICE, lambda: utils._rest_json(PRICE, {"symbol": SYM}))
+n2, _, _ = sent(PRICE, lambda: utils._rest_json(PRICE, {"symbol": SYM}))
+time.sleep(utils.REST_PRICE_TTL_S + 0.05)
+n3, _, _ = sent(PRICE, lambda: utils._rest_json(PRICE, {"symbol": SYM}))
+print(f"ticker/price bursts (ttl {utils.REST_PRICE_TTL_S}s): sent {n1}, {n2} within ttl, {n3} after expiry")
+if (n1, n2, n3) != (1, 0, 1):
+    fails += 1; print("  ttl behaviour wrong")
+srv.stop()
+
+# 失敗：所有等待者收到同一個例外，且不快取
+sf = SingleFlight()
+calls = []
+
+
+def boom():
+    calls.append(1)
+    time.sleep(0.05)
+    raise ValueError("boom")
+_, errs = burst(lambda: sf.do("k", boom, ttl=10))
+ok_after = sf.do("k", lambda: 42, ttl=10)
+if len(calls) != 1 or len(errs) != THREADS or ok_after != 42:
+    fails += 1; print(f"  error sharing wrong: calls={len(calls)} errors={len(errs)} after={ok_after}")
+
+print("utils.FLIGHT:", utils.FLIGHT.stats())
+print("✅ PASS" if fails == 0 else f"❌ FAIL ({fails})")
+sys.exit(0 if fails == 0 else 1)
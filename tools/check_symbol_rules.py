@@ -0,0 +1,69 @@
+"""
+離線驗證精度規則快取（symbol_rules + utils.load_exchange_info）：
+1) 首次載入寫入磁碟快取；EXCHANGE_INFO 原地更新（先 import 的參考也看得到）
+2) 重啟情境：從磁碟快取即時載入，背景刷新後沒有任何 symbol 需要重建
+3) 交易所調整某檔 tickSize → 只重建那一檔，其餘沿用原物件
+4) SymbolRule 不可變、保留舊 dict 介面
+
+    python tools/check_symbol_rules.py
+"""
+import os, sys, tempfile, time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from checklib import check, finish  # noqa: E402
+from fake_fapi import FakeFapi  # noqa: E402
+
+srv = FakeFapi(symbols=300)
+os.environ["FAPI_REST_HOSTS"] = srv.start()
+cache = os.path.join(tempfile.mkdtemp(), "exchange_info.json")
+os.environ["EXCHANGE_INFO_CACHE"] = cache
+
+import utils  # noqa: E402
+from utils import EXCHANGE_INFO as early_ref  # noqa: E402
+
+
+def wait_refresh():
+    t = utils._INFO_REFRESH["thread"]
+    if t is not None:
+        t.join(10)
+
+
+utils.load_exchange_info()
+check(len(early_ref) == 300 and early_ref is utils.EXCHANGE_INFO, "first load fills the dict imported earlier")
+check(os.path.exists(cache), "disk cache written")
+
+r = early_ref["SYM001USDT"]
+check(r["tickSize"] == r.tick_str and r.get("minNotional") == Decimal("5") and r["quantityPrecision"] == 3,
+      "dict-style access compatible")
+try:
+    r.tick = 1.0
+    check(False, "SymbolRule is immutable")
+except AttributeError:
+    check(True, "SymbolRule is immutable")
+
+# 重啟：清空後從磁碟載入
+before = dict(early_ref)
+early_ref.clear()
+utils._INFO_REFRESH["at"] = 0.0
+hits = srv.hits.get("/fapi/v1/exchangeInfo", 0)
+t0 = time.perf_counter()
+utils.load_exchange_info()
+t_load = (time.perf_counter() - t0) * 1e3
+check(len(early_ref) == 300, f"restart: loaded from disk in {t_load:.1f} ms")
+wait_refresh()
+check(srv.hits.get("/fapi/v1/exchangeInfo", 0) == hits + 1, "background refresh ran once")
+check(all(early_ref[s].sig == v.sig for s, v in before.items()), "rules after restart equal the originals")
+
+# 交易所調整一檔 → 只重建一檔
+objs = dict(early_ref)
+srv.tick_override["SYM007USDT"] = "0.5"
+utils._INFO_REFRESH["at"] = 0.0
+check(utils.refresh_exchange_info_async(), "refresh_exchange_info_async started")
+check(not utils.refresh_exchange_info_async(), "second concurrent refresh is skipped")
+wait_refresh()
+changed = [s for s in objs if early_ref[s] is not objs[s]]
+check(changed == ["SYM007USDT"] and early_ref["SYM007USDT"].tick == 0.5, f"only the changed symbol rebuilt ({changed})")
+
+srv.stop()
+finish()
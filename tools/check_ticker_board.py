@@ -0,0 +1,76 @@
+"""
+TickerBoard（!ticker@arr 排行）離線驗證：
+1) 隨機推播批次後，top_gainers / top_losers 與整份排序結果一致
+2) TopN 進榜事件與前後兩次 TopN 成員差集一致
+3) 過期（事件時間落後 max_age_s）的列移出排行；eligible 於讀取時再檢查；NaN / inf 不入榜
+4) 每批（全市場 ~300 檔）套用成本與 TopN 讀取成本
+
+    python tools/check_ticker_board.py
+"""
+import os, random, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ticker_board import TickerBoard  # noqa: E402
+
+N_SYM, TOP_N = 300, 10
+rnd = random.Random(3)
+syms = [f"C{i:03d}USDT" for i in range(N_SYM)]
+state = {s: rnd.uniform(-20, 20) for s in syms}
+
+
+def batch(k):
+    out = []
+    for s in rnd.sample(syms, k):
+        state[s] += rnd.gauss(0, 0.5)
+        out.append({"s": s, "P": f"{state[s]:.3f}", "c": "1.0", "q": "1000"})
+    return out
+
+
+board = TickerBoard(eligible=lambda s: not s.startswith("C299"))
+board.watch(TOP_N)
+board.apply(batch(N_SYM))
+fails = 0
+for _ in range(500):
+    prev_g = {r[0] for r in board.top_gainers(TOP_N)}
+    prev_l = {r[0] for r in board.top_losers(TOP_N)}
+    board.apply(batch(rnd.randint(1, 120)))
+    rows = sorted(board._rows.values(), key=lambda r: (r[1], r[0]))
+    if board.top_gainers(TOP_N) != rows[::-1][:TOP_N] or board.top_losers(TOP_N) != rows[:TOP_N]:
+        fails += 1
+    ev = board.drain_events()
+    g = {r[0] for r in board.top_gainers(TOP_N)}
+    l = {r[0] for r in board.top_losers(TOP_N)}
+    if {e[1] for e in ev if e[0] == "gainer"} != g - prev_g or {e[1] for e in ev if e[0] == "loser"} != l - prev_l:
+        fails += 1
+if "C299USDT" in board._rows:
+    fails += 1
+
+
+def expect(cond, label):
+    global fails
+    print(("  ok   " if cond else "  FAIL ") + label)
+    if not cond:
+        fails += 1
+
+
+banned = set()
+aged = TickerBoard(eligible=lambda s: s not in banned, max_age_s=60)
+aged.apply([{"s": "OLDUSDT", "P": "90", "c": "1", "q": "1", "E": 1_000_000},
+            {"s": "BADUSDT", "P": "80", "c": "1", "q": "1", "E": 1_000_000}])
+aged.apply([{"s": f"A{i}USDT", "P": str(i), "c": "1", "q": "1", "E": 1_030_000} for i in range(5)])
+expect([r[0] for r in aged.top_gainers(2)] == ["OLDUSDT", "BADUSDT"], "rows within max_age_s stay ranked")
+banned.add("BADUSDT")
+expect([r[0] for r in aged.top_gainers(2)] == ["OLDUSDT", "A4USDT"], "eligible re-checked on read")
+aged.apply([{"s": "A0USDT", "P": "0", "c": "1", "q": "1", "E": 1_061_000}])
+expect("OLDUSDT" not in {r[0] for r in aged.top_gainers(10)} and aged.rank_of("OLDUSDT") is None,
+       "row older than max_age_s by event time evicted")
+aged.apply([{"s": "NANUSDT", "P": "nan", "c": "1", "q": "1"}, {"s": "A1USDT", "P": "inf", "c": "1", "q": "1"}])
+expect("NANUSDT" not in aged._rows and "A1USDT" not in aged._rows, "NaN / inf pct not ranked (and drops the old row)")
+expect(aged._ranked == sorted((r[1], r[0]) for r in aged._rows.values()), "ranked index consistent after evictions")
+
+full = batch(N_SYM)
+t_apply = timeit.timeit(lambda: board.apply(full), number=200) / 200 * 1e3
+t_top = timeit.timeit(lambda: board.top_gainers(TOP_N), number=20000) / 20000 * 1e6
+print(f"symbols={len(board)}  apply full batch {t_apply:.2f} ms  top{TOP_N} read {t_top:.1f} µs")
+print("✅ PASS" if fails == 0 else f"❌ FAIL ({fails})")
+sys.exit(0 if fails == 0 else 1)
@@ -0,0 +1,73 @@
+"""
+VboState 增量特徵 vs features_from_bars 整段重算：
+1) 模擬 WS 推播（形成中 bar 多次更新 → 收盤 → 新 bar）、REST 增量與整段重抓，每步比對
+2) 微基準：每次評估的成本（整段重算 vs 增量 peek）
+
+    python tools/check_vbo_state.py
+"""
+import math, os, random, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import KLINE_LIMIT  # noqa: E402
+from kline_store import KlineSeries  # noqa: E402
+from vbo_state import VboFeatures, features_from_bars  # noqa: E402
+
+STEP = 300_000
+rnd = random.Random(7)
+
+
+def close(a, b, tol=1e-9):
+    if a is None or b is None:
+        return a is None and b is None
+    return abs(a - b) <= tol * max(1.0, abs(a), abs(b))
+
+
+def same(f: VboFeatures, g: VboFeatures) -> bool:
+    if f is None or g is None:
+        return f is None and g is None
+    return f.n_bars == g.n_bars and all(close(a, b) for a, b in zip(f[1:], g[1:]))
+
+
+def bar(t, p):
+    h = p * (1 + rnd.uniform(0, 0.01)); l = p * (1 - rnd.uniform(0, 0.01))
+    return [t, p, h, l, rnd.uniform(l, h), rnd.lognormvariate(5, 1)]
+
+
+def ws(row):
+    return {"t": row[0], "o": row[1], "h": row[2], "l": row[3], "c": row[4], "v": row[5], "i": "5m"}
+
+
+s = KlineSeries(KLINE_LIMIT)
+p = 100.0
+history = [bar(i * STEP, p := p * math.exp(rnd.gauss(0, 0.01))) for i in range(KLINE_LIMIT)]
+s.merge(history)
+fails = checks = 0
+for step in range(3000):
+    t = history[-1][0]
+    r = rnd.random()
+    if r < 0.02:          # 整段重抓
+        s.bars.clear(); s.merge(history[-KLINE_LIMIT:])
+    elif r < 0.10:        # REST 增量：重送最後一根 + 新 bar
+        new = bar(t + STEP, p := p * math.exp(rnd.gauss(0, 0.01)))
+        history.append(new); s.merge(history[-2:])
+    elif r < 0.40:        # WS 新 bar 開始
+        new = bar(t + STEP, p := p * math.exp(rnd.gauss(0, 0.01)))
+        history.append(new); s.apply_ws(ws(new), STEP)
+    else:                 # WS 更新形成中 bar
+        cur = history[-1]
+        cur[2] = max(cur[2], cur[4] * 1.002); cur[4] = rnd.uniform(cur[3], cur[2]); cur[5] += rnd.uniform(0, 50)
+        s.apply_ws(ws(cur), STEP)
+    checks += 1
+    if not same(s.vbo_features(), features_from_bars(*s.view(KLINE_LIMIT))):
+        fails += 1
+        if fails <= 5:
+            print("mismatch at step", step, s.vbo_features(), features_from_bars(*s.view(KLINE_LIMIT)))
+
+print(f"parity: {checks} checks, {'OK' if fails == 0 else f'{fails} FAILURES'}")
+
+N = 5000
+t_full = timeit.timeit(lambda: features_from_bars(*s.view(KLINE_LIMIT)), number=N) / N * 1e6
+t_inc = timeit.timeit(s.vbo_features, number=N) / N * 1e6
+print(f"per evaluation: full recompute {t_full:.1f} µs, incremental {t_inc:.1f} µs (x{t_full / t_inc:.1f})")
+print(f"→ {1e6 / t_inc:,.0f} symbol-evaluations/s incremental")
+sys.exit(0 if fails == 0 else 1)
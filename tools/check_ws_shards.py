@@ -0,0 +1,73 @@
+"""
+離線驗證 WS 分片：串流依上限分散到多條連線、每個 symbol 只由一個分片負責；
+熱門 symbol 集中在同一分片時，依觀測訊息率重新平衡（只送 SUBSCRIBE/UNSUBSCRIBE，不重連、不丟快取）；
+stop_ws 先通知所有分片再一起 join，連線中的分片都會在期限內結束。
+
+    python tools/check_ws_shards.py [--symbols 100] [--per-conn 50]
+"""
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from checklib import check, finish, wait_for  # noqa: E402
+from fake_fstream import FakeFstream  # noqa: E402
+
+import ws_client  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--symbols", type=int, default=100)
+ap.add_argument("--per-conn", type=int, default=50)
+args = ap.parse_args()
+
+srv = FakeFstream(symbols=args.symbols, tick_s=0.05)
+ws_client._HOST["main"] = srv.start()
+ws_client.WS_ALL_TICKERS = False
+ws_client.WS_MAX_STREAMS_PER_CONN = args.per_conn
+ws_client.WS_REBALANCE_S = 3600.0  # 只在下面手動 ws_rebalance()
+ws_client._RECEIVED_TICKER_SYMBOLS.update(srv.symbols)  # 關掉首筆 ticker 的 debug 輸出
+syms = srv.symbols
+
+
+def shard_rates(dur=2.0):
+    m0 = [sh.msgs for sh in ws_client._SHARDS]
+    time.sleep(dur)
+    return [(sh.msgs - m) / dur for sh, m in zip(ws_client._SHARDS, m0)]
+
+
+ws_client.start_ws(syms, use_testnet=False)
+per_sym = len(ws_client._streams_for("x"))
+expect = -(-args.symbols * per_sym // args.per_conn)
+check(len(ws_client._SHARDS) == expect, f"{len(ws_client._SHARDS)} shards for {args.symbols * per_sym} streams")
+check(all(sh.streams() <= args.per_conn for sh in ws_client._SHARDS), "every shard within the stream limit")
+check(wait_for(lambda: all(len(ws_client._AGG.get(s, ())) > 0 for s in syms)), "every symbol receives aggTrades")
+check(srv.connects == expect, f"one connection per shard (connects={srv.connects})")
+
+# 把分片 0 一半的 symbol 變熱門（20 倍成交）
+hot = [s for s, o in ws_client._OWNER.items() if o is ws_client._SHARDS[0]]
+for s in hot[: len(hot) // 2]:
+    srv.trades[s] = 20
+ws_client._update_rates(time.time())  # 重設量測起點
+before = shard_rates()
+print("  msg/s per shard before:", [round(r) for r in before])
+hist = {s: len(ws_client._AGG[s]) for s in hot}
+moves = ws_client.ws_rebalance(max_moves=64)
+wait_for(lambda: all(not sh.pending for sh in ws_client._SHARDS), 5)
+time.sleep(0.5)
+after = shard_rates()
+print("  msg/s per shard after: ", [round(r) for r in after], f"({moves} symbols moved)")
+spread_b = max(before) / max(1.0, min(before))
+spread_a = max(after) / max(1.0, min(after))
+check(moves > 0 and spread_a < spread_b * 0.8, f"load spread {spread_b:.1f}x -> {spread_a:.1f}x")
+check(srv.connects == expect, "rebalance moved symbols without reconnecting")
+check(all(len(ws_client._AGG[s]) >= min(hist[s], 6000) for s in hot), "moved symbols kept their aggTrade history")
+check(len({s for sh in ws_client._SHARDS for s in sh.active}) == args.symbols
+      and sum(len(sh.active) for sh in ws_client._SHARDS) == args.symbols, "each symbol on exactly one shard")
+
+for r in ws_client.ws_stats()["shards"]:
+    print("  ", r)
+threads = [sh.thread for sh in ws_client._SHARDS]
+t0 = time.time()
+ws_client.stop_ws()
+dt = time.time() - t0
+check(not any(t.is_alive() for t in threads), f"stop_ws joined all {len(threads)} shard threads in {dt * 1000:.0f} ms")
+srv.stop()
+finish()
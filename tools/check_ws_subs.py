@@ -0,0 +1,70 @@
+"""
+離線驗證 WS 訂閱管理：symbol 集合變動時只送 SUBSCRIBE/UNSUBSCRIBE（不重連），
+留下的 symbol 逐筆成交歷史不被清掉、價格沒有空窗；斷線重連後訂閱恢復；
+斷線期間移除的 symbol 在重連時清掉快取；SUBSCRIBE 被拒會自行重送。
+
+    python tools/check_ws_subs.py
+"""
+import os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from checklib import check, finish, wait_for  # noqa: E402
+from fake_fstream import FakeFstream  # noqa: E402
+
+import ws_client  # noqa: E402
+
+srv = FakeFstream(symbols=20, tick_s=0.02)
+ws_client._HOST["main"] = srv.start()
+ws_client.WS_ALL_TICKERS = False  # 只看個別 symbol 的訂閱
+syms = srv.symbols
+
+
+ws_client.start_ws(syms[:8], use_testnet=False)
+check(wait_for(lambda: all(ws_client.ws_best_price(s) for s in syms[:8])), "initial 8 symbols priced")
+wait_for(lambda: len(ws_client._AGG.get(syms[0], ())) > 20)
+
+# 輪替：留下 0..5，移除 6..7，新增 8..11
+keep_before = {s: len(ws_client._AGG[s]) for s in syms[:6]}
+gaps, t_rot = [], time.time()
+ws_client.start_ws(syms[:6] + syms[8:12], use_testnet=False)
+for _ in range(50):  # 輪替期間持續讀價格，不應出現 None
+    gaps += [s for s in syms[:6] if ws_client.ws_best_price(s) is None]
+    time.sleep(0.01)
+check(wait_for(lambda: all(ws_client.ws_best_price(s) for s in syms[8:12])), "added symbols priced")
+check(wait_for(lambda: all(s not in ws_client._AGG for s in syms[6:8])), "removed symbols' caches dropped after ack")
+check(srv.connects == 1, f"no reconnect on rotation (connects={srv.connects})")
+check(not gaps, "kept symbols never lost their price")
+check(all(len(ws_client._AGG[s]) >= keep_before[s] for s in syms[:6]), "kept symbols' aggTrade history preserved")
+methods = [m["method"] for m in srv.controls]
+check(sorted(methods) == ["SUBSCRIBE", "UNSUBSCRIBE"], f"one SUBSCRIBE + one UNSUBSCRIBE sent ({methods})")
+
+# 相同集合 → 不送任何東西
+n = len(srv.controls)
+ws_client.start_ws(syms[:6] + syms[8:12], use_testnet=False)
+time.sleep(0.2)
+check(len(srv.controls) == n, "unchanged set sends nothing")
+
+# 斷線 → 以當下集合重連
+srv.drop_connections()
+check(wait_for(lambda: srv.connects == 2, 5), "reconnected after drop")
+ws_client.start_ws(syms[:3], use_testnet=False)
+check(wait_for(lambda: ws_client.ws_subscribed() == sorted(syms[:3])), "diff applied on the new connection")
+
+# 斷線期間移除 symbol → 不會有 UNSUBSCRIBE 確認，重連時直接清快取
+srv.drop_connections()
+ws_client.start_ws(syms[:1], use_testnet=False)
+check(wait_for(lambda: srv.connects == 3, 5), "reconnected with the smaller set")
+check(wait_for(lambda: all(s not in ws_client._AGG and ws_client._BOOK.get(s) is None and s not in ws_client._AGG_ID
+                           for s in syms[1:3]), 3), "symbols removed while disconnected have their caches dropped")
+
+# SUBSCRIBE 回 error → 不等其他變動，自行重送
+srv.reject_subscribe = 1
+n = len(srv.controls)
+ws_client.start_ws(syms[:1] + syms[15:16], use_testnet=False)
+check(wait_for(lambda: ws_client.ws_best_price(syms[15]) is not None, 5), "rejected SUBSCRIBE resent and priced")
+check(sum(1 for c in srv.controls[n:] if c.get("method") == "SUBSCRIBE") == 2, "exactly one resend after the error")
+print("  stats:", ws_client.ws_stats())
+
+ws_client.stop_ws()
+srv.stop()
+finish()
@@ -0,0 +1,35 @@
+"""
+tools/check_*.py 共用的小工具（與 fake_fapi / fake_fstream 放在一起，腳本直接 from checklib import ...）：
+
+- check(cond, label)：印一行 ok / FAIL，失敗計入 fails()
+- wait_for(pred, timeout)：輪詢到 pred() 為真或逾時，回傳最後結果
+- finish()：印 ✅ PASS / ❌ FAIL (n) 並以失敗數決定結束碼
+"""
+import sys, time
+
+_fails = []
+
+
+def check(cond, label: str) -> bool:
+    print(("  ok   " if cond else "  FAIL ") + label)
+    if not cond:
+        _fails.append(label)
+    return bool(cond)
+
+
+def fails() -> int:
+    return len(_fails)
+
+
+def wait_for(pred, timeout: float = 10.0, interval: float = 0.02) -> bool:
+    t0 = time.time()
+    while time.time() - t0 < timeout:
+        if pred():
+            return True
+        time.sleep(interval)
+    return False
+
+
+def finish():
+    print("✅ PASS" if not _fails else f"❌ FAIL ({len(_fails)})")
+    sys.exit(1 if _fails else 0)
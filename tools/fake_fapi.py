@@ -0,0 +1,255 @@
+"""
+本機假 Binance Futures REST 伺服器（離線測試/基準用）。
+
+- 模擬 /fapi/v1/time、ticker/24hr、ticker/price、klines（支援 startTime）、exchangeInfo；
+  aggTrades（fromId）交給 agg_source（例如 FakeFstream.agg_trades），沒設定時回空陣列
+- 每個固定視窗累計 IP 權重，回傳 X-MBX-USED-WEIGHT-1M；超過上限回 429 + Retry-After，
+  在封鎖期間仍持續打就回 418（和正式站行為一致）
+- 可注入延遲（latency_s）與長尾（spike_s：隨機 spike_p 比例，或固定每 spike_every 個請求一次），
+  方便比較序列/併發掃描與主機選擇
+- fail_next：接下來 N 個請求（照樣計權重）回 fail_status（預設 503），模擬主機暫時故障
+
+用法：
+    python tools/fake_fapi.py --port 8765 --symbols 300
+    FAPI_REST_HOSTS=http://127.0.0.1:8765 python main.py
+"""
+import json, math, os, random, socket, sys, threading, time, zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rate_limiter import endpoint_weight  # noqa: E402
+
+_INTERVAL_MS = {"1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+                "1h": 3_600_000, "4h": 14_400_000, "1d": 86_400_000}
+
+
+def _symbol_list(n: int):
+    return [f"SYM{i:03d}USDT" for i in range(n)]
+
+
+class FakeFapi:
+    def __init__(self, port: int = 0, symbols: int = 300, latency_s: float = 0.0,
+                 weight_limit: int = 2400, window_s: float = 60.0, retry_after_s: float = 2.0,
+                 spike_p: float = 0.0, spike_s: float = 0.0, spike_every: int = 0):
+        self.symbols = _symbol_list(symbols)
+        self.latency_s = latency_s
+        self.spike_p = spike_p      # 每個請求有 spike_p 機率額外延遲 spike_s（模擬長尾）
+        self.spike_s = spike_s
+        self.spike_every = spike_every  # > 0：第 spike_every、2*spike_every… 個請求延遲 spike_s（可重現）
+        self._n_req = 0
+        self.weight_limit = weight_limit
+        self.window_s = window_s
+        self.retry_after_s = retry_after_s
+        self._lock = threading.Lock()
+        self._window_id = None
+        self._used = 0
+        self._banned_until = 0.0
+        # 統計
+        self.hits = {}          # path -> 次數
+        self.bytes_out = 0
+        self.count_429 = 0
+        self.count_418 = 0
+        self.tick_override = {}  # symbol -> tickSize（模擬交易所調整篩選規則）
+        self.broken = False      # True：收到請求直接斷線（模擬主機故障；keep-alive 連線也會失敗）
+        self.fail_next = 0       # > 0：接下來這麼多個請求回 fail_status
+        self.fail_status = 503
+        self.agg_source = None   # (symbol, fromId, limit) -> [aggTrade]
+        self._srv = ThreadingHTTPServer(("127.0.0.1", port), self._handler_cls())
+        self._srv.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._srv.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._srv.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._srv.shutdown()
+        self._srv.server_close()
+
+    # --- 權重帳本 ---
+    def _charge(self, weight: int):
+        """回傳 (status, used)。"""
+        with self._lock:
+            now = time.time()
+            wid = int(now // self.window_s)
+            if wid != self._window_id:
+                self._window_id = wid
+                self._used = 0
+            if now < self._banned_until:
+                self.count_418 += 1
+                self._banned_until = now + self.retry_after_s * 4
+                return 418, self._used
+            self._used += weight
+            if self._used > self.weight_limit:
+                self.count_429 += 1
+                self._banned_until = now + self.retry_after_s
+                return 429, self._used
+            return 200, self._used
+
+    # --- 假資料 ---
+    @staticmethod
+    def _seed(sym: str) -> int:
+        return zlib.crc32(sym.encode())
+
+    def _price(self, sym: str, idx: int) -> float:
+        seed = self._seed(sym)
+        base = 0.5 + (seed % 50000) / 100.0
+        phase = (seed % 628) / 100.0
+        noise = random.Random(seed * 1_000_003 + idx).uniform(-0.002, 0.002)
+        return base * (1.0 + 0.03 * math.sin(idx / 17.0 + phase) + noise)
+
+    def _bar(self, sym: str, open_ms: int, interval_ms: int, now_ms: int):
+        idx = open_ms // interval_ms
+        o = self._price(sym, idx - 1)
+        c = self._price(sym, idx)
+        if open_ms + interval_ms > now_ms:  # 尚未收盤：依經過比例內插
+            frac = (now_ms - open_ms) / interval_ms
+            c = o + (c - o) * frac
+        rnd = random.Random(self._seed(sym) + idx)
+        h = max(o, c) * (1 + rnd.uniform(0, 0.003))
+        l = min(o, c) * (1 - rnd.uniform(0, 0.003))
+        v = rnd.uniform(100, 1000)
+        return [open_ms, f"{o:.6f}", f"{h:.6f}", f"{l:.6f}", f"{c:.6f}", f"{v:.3f}",
+                open_ms + interval_ms - 1, f"{v * c:.2f}", 100, f"{v / 2:.3f}", f"{v * c / 2:.2f}", "0"]
+
+    def klines(self, q):
+        sym = q.get("symbol", "SYM000USDT")
+        interval_ms = _INTERVAL_MS.get(q.get("interval", "5m"), 300_000)
+        limit = min(1500, int(q.get("limit", 500)))
+        now_ms = int(time.time() * 1000)
+        last_open = now_ms - now_ms % interval_ms
+        if "startTime" in q:
+            start = int(q["startTime"])
+            start -= start % interval_ms
+            opens = range(start, min(last_open, start + (limit - 1) * interval_ms) + 1, interval_ms)
+        else:
+            opens = range(last_open - (limit - 1) * interval_ms, last_open + 1, interval_ms)
+        return [self._bar(sym, t, interval_ms, now_ms) for t in opens]
+
+    def ticker_24hr(self, q):
+        now_idx = int(time.time() // 60)
+        rows = []
+        for s in self.symbols:
+            rnd = random.Random(self._seed(s) + now_idx)
+            last = self._price(s, now_idx)
+            rows.append({"symbol": s, "priceChange": "0", "priceChangePercent": f"{rnd.uniform(-15, 15):.3f}",
+                         "weightedAvgPrice": f"{last:.6f}", "lastPrice": f"{last:.6f}", "lastQty": "1",
+                         "openPrice": f"{last:.6f}", "highPrice": f"{last:.6f}", "lowPrice": f"{last:.6f}",
+                         "volume": "1000", "quoteVolume": f"{rnd.uniform(1e5, 1e8):.2f}",
+                         "openTime": 0, "closeTime": 0, "firstId": 0, "lastId": 0, "count": 100})
+        if q.get("symbol"):
+            rows = [r for r in rows if r["symbol"] == q["symbol"]]
+            return rows[0] if rows else {}
+        return rows
+
+    def exchange_info(self, q):
+        syms = []
+        for s in self.symbols:
+            seed = self._seed(s)
+            tick = self.tick_override.get(s) or ("0.0001", "0.001", "0.01", "0.00001")[seed % 4]
+            step = ("1", "0.1", "0.01", "0.001")[(seed // 4) % 4]
+            syms.append({"symbol": s, "contractType": "PERPETUAL", "status": "TRADING", "quoteAsset": "USDT",
+                         "maintMarginPercent": "2.5000", "pricePrecision": 6, "quantityPrecision": 3,
+                         "filters": [{"filterType": "PRICE_FILTER", "tickSize": tick},
+                                     {"filterType": "LOT_SIZE", "stepSize": step},
+                                     {"filterType": "MIN_NOTIONAL", "notional": "5"}]})
+        return {"timezone": "UTC", "serverTime": int(time.time() * 1000), "symbols": syms}
+
+    def ticker_price(self, q):
+        now_idx = int(time.time() // 60)
+        s = q.get("symbol", "SYM000USDT")
+        return {"symbol": s, "price": f"{self._price(s, now_idx):.6f}", "time": int(time.time() * 1000)}
+
+    def agg_trades(self, q):
+        if self.agg_source is None:
+            return []
+        return self.agg_source(q.get("symbol", "SYM000USDT"), int(q.get("fromId", 1)), int(q.get("limit", 500)))
+
+    def route(self, path, q):
+        return {
+            "/fapi/v1/time": lambda q: {"serverTime": int(time.time() * 1000)},
+            "/fapi/v1/klines": self.klines,
+            "/fapi/v1/ticker/24hr": self.ticker_24hr,
+            "/fapi/v1/ticker/price": self.ticker_price,
+            "/fapi/v1/exchangeInfo": self.exchange_info,
+            "/fapi/v1/aggTrades": self.agg_trades,
+        }.get(path)
+
+    def _handler_cls(self):
+        fake = self
+
+        class _H(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):  # 安靜
+                pass
+
+            def setup(self):
+                super().setup()
+                # header 與 body 分兩次寫出；不關 Nagle 會和 client 的 delayed ACK 疊出 ~40ms 假延遲
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _send(self, status, body: bytes, used: int, extra=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("X-MBX-USED-WEIGHT-1M", str(used))
+                for k, v in (extra or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+                with fake._lock:
+                    fake.bytes_out += len(body)
+
+            def do_GET(self):
+                if fake.broken:
+                    self.close_connection = True
+                    return
+                u = urlparse(self.path)
+                q = {k: v[-1] for k, v in parse_qs(u.query).items()}
+                with fake._lock:
+                    fake.hits[u.path] = fake.hits.get(u.path, 0) + 1
+                    fake._n_req += 1
+                    spike = (fake._n_req % fake.spike_every == 0) if fake.spike_every else \
+                        bool(fake.spike_p) and random.random() < fake.spike_p
+                    fail = fake.fail_next > 0
+                    if fail:
+                        fake.fail_next -= 1
+                delay = fake.latency_s + (fake.spike_s if spike else 0.0)
+                if delay > 0:
+                    time.sleep(delay)
+                status, used = fake._charge(endpoint_weight(u.path, q))
+                if status != 200:
+                    body = json.dumps({"code": -1003, "msg": "Too many requests"}).encode()
+                    return self._send(status, body, used, {"Retry-After": str(int(math.ceil(fake.retry_after_s)))})
+                if fail:
+                    return self._send(fake.fail_status, b'{"code":-1001,"msg":"Service unavailable"}', used)
+                fn = fake.route(u.path, q)
+                if fn is None:
+                    return self._send(404, b'{"code":-1,"msg":"not found"}', used)
+                return self._send(200, json.dumps(fn(q)).encode(), used)
+
+        return _H
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--symbols", type=int, default=300)
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--weight-limit", type=int, default=2400)
+    a = ap.parse_args()
+    srv = FakeFapi(port=a.port, symbols=a.symbols, latency_s=a.latency, weight_limit=a.weight_limit)
+    print(f"Fake FAPI listening on {srv.url}")
+    try:
+        srv._srv.serve_forever()
+    except KeyboardInterrupt:
+        srv.stop()
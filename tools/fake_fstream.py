@@ -0,0 +1,196 @@
+"""
+本機假 Binance Futures WebSocket（fstream）伺服器（離線測試/基準用）。
+
+- /stream?streams=a/b/c 組合串流；訊息包成 {"stream": ..., "data": ...}
+- 支援 SUBSCRIBE / UNSUBSCRIBE / LIST_SUBSCRIPTIONS 控制訊息（回 {"result": ..., "id": n}）
+- 每 tick_s 秒對每個已訂閱的 @aggTrade 推 trades_per_tick 筆逐筆成交（a 遞增；trades 可逐 symbol 覆寫），
+  @bookTicker 推一筆最佳買賣價（u 遞增），@ticker 推一筆（欄位同正式 24hrTicker；ticker_s > 0 時
+  每 ticker_s 秒才推一次，模擬交易所節流），!ticker@arr 推全市場一批（同樣受 ticker_s 節流）
+- 統計：connects / 控制訊息數 / 送出的訊息數；drop_aggtrade_p 可模擬漏訊息（a 跳號）；
+  reject_subscribe = n：接下來 n 個 SUBSCRIBE 回 error、不訂閱
+- keep_history=True 時保留產生過的每筆成交，agg_trades() 以 REST /fapi/v1/aggTrades 格式回傳
+  （接 FakeFapi.agg_source 做補洞測試）；advance(n) 產生成交但不推送（模擬斷線期間的成交）
+
+用法：
+    srv = FakeFstream(symbols=50); url = srv.start()   # ws://127.0.0.1:port
+    ws_client._HOST["main"] = url
+"""
+import asyncio, json, random, threading, time
+from typing import Dict, List, Set
+from urllib.parse import urlparse, parse_qs
+
+from websockets.asyncio.server import serve
+
+
+def _symbol_list(n: int):
+    return [f"SYM{i:03d}USDT" for i in range(n)]
+
+
+class FakeFstream:
+    def __init__(self, port: int = 0, symbols: int = 50, tick_s: float = 0.02, trades_per_tick: int = 1,
+                 drop_aggtrade_p: float = 0.0, seed: int = 7, ticker_s: float = 0.0, reuse_port: bool = False,
+                 keep_history: bool = False):
+        self.port = port
+        self.reuse_port = reuse_port   # 多個伺服器行程共用同一 port（壓力測試時分攤產生訊息的 CPU）
+        self.symbols = _symbol_list(symbols)
+        self.tick_s = tick_s
+        self.trades_per_tick = trades_per_tick
+        self.trades: Dict[str, int] = {}  # symbol -> 每 tick 筆數（覆寫 trades_per_tick，模擬熱門幣）
+        self.drop_aggtrade_p = drop_aggtrade_p
+        self.reject_subscribe = 0
+        self.ticker_s = ticker_s
+        self.sent_bytes: Dict[str, int] = {}   # 串流種類（bookTicker / ticker / ...）-> 送出 bytes
+        self.sent_msgs: Dict[str, int] = {}    # 串流種類 -> 送出訊息數
+        self._book_u = 1
+        self._rnd = random.Random(seed)
+        self._price: Dict[str, float] = {s: 1.0 + i for i, s in enumerate(self.symbols)}
+        self._agg_id: Dict[str, int] = {s: 1 for s in self.symbols}
+        self._hist: Dict[str, List[dict]] = {s: [] for s in self.symbols} if keep_history else {}  # 第 a-1 筆 = id a
+        self.connects = 0
+        self.controls: List[dict] = []   # 收到的控制訊息
+        self.sent = 0
+        self.live: Set[object] = set()
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._stop = None
+        self.url = ""
+
+    # --- 行情產生 ---
+    def _agg(self, sym: str) -> dict:
+        p = self._price[sym] = self._price[sym] * (1 + self._rnd.gauss(0, 0.001))
+        a = self._agg_id[sym]
+        self._agg_id[sym] = a + 1
+        d = {"e": "aggTrade", "E": int(time.time() * 1000), "s": sym, "a": a, "p": f"{p:.6f}",
+             "q": f"{self._rnd.lognormvariate(0, 1):.3f}", "f": a, "l": a,
+             "T": int(time.time() * 1000), "m": self._rnd.random() < 0.5}
+        if self._hist:
+            self._hist[sym].append({k: d[k] for k in ("a", "p", "q", "f", "l", "T", "m")})
+        return d
+
+    def agg_trades(self, sym: str, from_id: int, limit: int = 500) -> List[dict]:
+        """REST /fapi/v1/aggTrades?fromId= 的回應（需 keep_history=True）。"""
+        h = self._hist.get(sym, [])
+        return h[max(0, from_id - 1):max(0, from_id - 1) + min(1000, limit)]
+
+    def advance(self, n: int):
+        """每個 symbol 產生 n 筆成交但不推送（在伺服器的 event loop 上執行，不和推送搶 _rnd）。"""
+        async def gen():
+            for s in self.symbols:
+                for _ in range(n):
+                    self._agg(s)
+        asyncio.run_coroutine_threadsafe(gen(), self._loop).result(5)
+
+    def _ticker(self, sym: str) -> dict:
+        p = self._price[sym]
+        o = 1.0 + self.symbols.index(sym)
+        now = int(time.time() * 1000)
+        return {"e": "24hrTicker", "E": now, "s": sym, "p": f"{p - o:.6f}", "P": f"{(p / o - 1) * 100:.3f}",
+                "w": f"{(p + o) / 2:.6f}", "c": f"{p:.6f}", "Q": "1.000", "o": f"{o:.6f}",
+                "h": f"{max(p, o):.6f}", "l": f"{min(p, o):.6f}", "v": "1000000.000", "q": "1000000",
+                "O": now - 86_400_000, "C": now, "F": 1, "L": self._agg_id[sym], "n": self._agg_id[sym]}
+
+    def _book(self, sym: str) -> dict:
+        p = self._price[sym]
+        self._book_u += 1
+        now = int(time.time() * 1000)
+        return {"e": "bookTicker", "u": self._book_u, "s": sym, "b": f"{p * 0.9999:.6f}", "B": "12.000",
+                "a": f"{p * 1.0001:.6f}", "A": "9.000", "T": now, "E": now}
+
+    # --- 連線處理 ---
+    async def _handler(self, ws):
+        q = parse_qs(urlparse(ws.request.path).query)
+        subs = set(q.get("streams", [""])[0].split("/")) - {""}
+        self.connects += 1
+        self.live.add(ws)
+        pusher = asyncio.ensure_future(self._push(ws, subs))
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                self.controls.append(msg)
+                m, params, mid = msg.get("method"), msg.get("params") or [], msg.get("id")
+                if m == "SUBSCRIBE" and self.reject_subscribe > 0:
+                    self.reject_subscribe -= 1
+                    await ws.send(json.dumps({"error": {"code": -1, "msg": "Internal error"}, "id": mid}))
+                elif m == "SUBSCRIBE":
+                    subs.update(params)
+                    await ws.send(json.dumps({"result": None, "id": mid}))
+                elif m == "UNSUBSCRIBE":
+                    subs.difference_update(params)
+                    await ws.send(json.dumps({"result": None, "id": mid}))
+                elif m == "LIST_SUBSCRIPTIONS":
+                    await ws.send(json.dumps({"result": sorted(subs), "id": mid}))
+                else:
+                    await ws.send(json.dumps({"error": {"code": 2, "msg": "Invalid request"}, "id": mid}))
+        except Exception:
+            pass
+        finally:
+            pusher.cancel()
+            self.live.discard(ws)
+
+    async def _push(self, ws, subs: Set[str]):
+        next_ticker = 0.0
+        try:
+            while True:
+                await asyncio.sleep(self.tick_s)
+                tick_ticker = time.time() >= next_ticker
+                if tick_ticker and self.ticker_s:
+                    next_ticker = time.time() + self.ticker_s
+                for st in sorted(subs):
+                    if st == "!ticker@arr":
+                        if tick_ticker:
+                            await self._send(ws, st, [self._ticker(s) for s in self.symbols])
+                        continue
+                    sym, _, kind = st.partition("@")
+                    sym = sym.upper()
+                    if sym not in self._price:
+                        continue
+                    if kind == "aggTrade":
+                        for _ in range(self.trades.get(sym, self.trades_per_tick)):
+                            d = self._agg(sym)
+                            if self.drop_aggtrade_p and self._rnd.random() < self.drop_aggtrade_p:
+                                continue   # 模擬漏訊息：a 跳號
+                            await self._send(ws, st, d)
+                    elif kind == "bookTicker":
+                        await self._send(ws, st, self._book(sym))
+                    elif kind == "ticker" and tick_ticker:
+                        await self._send(ws, st, self._ticker(sym))
+        except Exception:
+            pass
+
+    async def _send(self, ws, stream: str, data):
+        raw = json.dumps({"stream": stream, "data": data})
+        await ws.send(raw)
+        self.sent += 1
+        kind = stream.partition("@")[2]
+        self.sent_bytes[kind] = self.sent_bytes.get(kind, 0) + len(raw)
+        self.sent_msgs[kind] = self.sent_msgs.get(kind, 0) + 1
+
+    # --- 生命週期 ---
+    async def _main(self):
+        self._stop = asyncio.Event()
+        async with serve(self._handler, "127.0.0.1", self.port, reuse_port=self.reuse_port or None) as server:
+            host, port = list(server.sockets)[0].getsockname()[:2]
+            self.url = f"ws://{host}:{port}"
+            self._ready.set()
+            await self._stop.wait()
+
+    def start(self) -> str:
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self._main())
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self.url
+
+    def drop_connections(self):
+        """強制斷開所有連線（測試重連）。"""
+        for ws in list(self.live):
+            asyncio.run_coroutine_threadsafe(ws.close(), self._loop)
+
+    def stop(self):
+        if self._loop and self._stop:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread:
+            self._thread.join(2)
@@ -0,0 +1,144 @@
+"""
+行情快取併發壓力測試（不需網路）：多個寫入執行緒透過 ws_client 的訊息處理函式狂寫 aggTrade / bookTicker /
+ticker，同時多個讀取執行緒不取鎖讀取，檢查每次讀到的都是一致的一份：
+
+- ws_snapshot / AggRing.snapshot：成交視窗連號（寫入端 price = 序號、qty / side 由序號決定，被覆寫就會斷號）、
+  ts 非遞減、視窗累計與複本逐筆重算完全相等（整數值浮點，無捨入）
+- bookTicker：ask - bid 恆為 0.5（bid/ask 來自同一筆更新）
+- 期間不斷 stop_ws()（換新 dict），讀取端不得丟例外
+- 對照組：零複製的 ring.since() 直接讀（改版前的讀法），統計讀到被覆寫（斷號）的次數
+
+    python tools/stress_market_state.py [--seconds 3] [--symbols 4] [--readers 4] [--capacity 64]
+"""
+import argparse, contextlib, io, os, sys, threading, time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ws_client  # noqa: E402
+from agg_ring import AggRing  # noqa: E402
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--seconds", type=float, default=3.0)
+ap.add_argument("--symbols", type=int, default=4)
+ap.add_argument("--readers", type=int, default=4)
+ap.add_argument("--capacity", type=int, default=64)   # 小容量：讓寫入端頻繁繞回覆寫
+args = ap.parse_args()
+
+sys.setswitchinterval(1e-5)   # 盡量增加執行緒交錯
+WINDOW_MS = 200
+factory = lambda: AggRing(args.capacity, window_ms=WINDOW_MS)  # noqa: E731
+ws_client._AGG = defaultdict(factory)
+SYMS = [f"S{i}USDT" for i in range(args.symbols)]
+ws_client._RECEIVED_TICKER_SYMBOLS.update(SYMS)  # 關掉首筆 ticker 的 debug 輸出
+stop = threading.Event()
+stats = defaultdict(int)
+errors = []
+
+
+def writer_agg(sym):
+    k = 0
+    while not stop.is_set():
+        k += 1
+        ws_client._on_aggtrade({"s": sym, "T": int(time.time() * 1000), "p": str(k), "q": str(k % 7 + 1), "m": k % 2 == 0})
+        stats["agg_writes"] += 1
+
+
+def writer_quotes(sym):
+    u = 0
+    while not stop.is_set():
+        u += 1
+        ws_client._on_book_ticker({"s": sym, "u": u, "b": str(u), "a": str(u + 0.5)})
+        ws_client._on_ticker({"s": sym, "c": str(u)})
+        stats["quote_writes"] += 1
+
+
+def resetter():
+    while not stop.wait(0.25):
+        with contextlib.redirect_stdout(io.StringIO()):
+            ws_client.stop_ws()
+        ws_client._AGG = defaultdict(factory)
+        ws_client._RECEIVED_TICKER_SYMBOLS.update(SYMS)
+        stats["resets"] += 1
+
+
+def contiguous(w):
+    px = list(w.price)
+    if any(b != a + 1 for a, b in zip(px, px[1:])):
+        return False
+    if any(q != p % 7 + 1 or s != (1 if int(p) % 2 else 0) for p, q, s in zip(px, w.qty, w.side)):
+        return False
+    ts = list(w.ts)
+    return all(a <= b for a, b in zip(ts, ts[1:]))
+
+
+def check_ring_snapshot(ring):
+    now_ms = int(time.time() * 1000)
+    snap = ring.snapshot(now_ms - WINDOW_MS, now_ms)
+    w = snap.window
+    if not contiguous(w) or len(w.ts) > snap.seq or (len(w.ts) and w.ts[-1] != snap.last_ts):
+        stats["bad_window"] += 1
+        return
+    bq = bpq = sq = spq = 0.0
+    for p, q, s in zip(w.price, w.qty, w.side):
+        if s:
+            bq += q; bpq += p * q
+        else:
+            sq += q; spq += p * q
+    if tuple(snap.sums) != (bq, bpq, sq, spq):
+        stats["bad_sums"] += 1
+
+
+def reader(naive: bool):
+    while not stop.is_set():
+        for sym in SYMS:
+            try:
+                ring = ws_client._AGG.get(sym)
+                if naive:
+                    if ring is not None:
+                        w = ring.since(int(time.time() * 1000) - WINDOW_MS)   # 零複製，讀的時候寫入端還在寫
+                        stats["naive_reads"] += 1
+                        if not contiguous(w):
+                            stats["naive_torn"] += 1
+                    continue
+                snap = ws_client.ws_snapshot(sym, window_s=WINDOW_MS / 1000)
+                stats["snapshots"] += 1
+                if snap.agg is not None and not contiguous(snap.agg.window):
+                    stats["bad_window"] += 1
+                b = snap.book
+                if b is not None and b.ask - b.bid != 0.5:
+                    stats["bad_book"] += 1
+                if ring is not None:
+                    check_ring_snapshot(ring)
+                ws_client.ws_best_price(sym)
+                ws_client.ws_agg_sums(sym, recent_s=1)
+                for s, lp in list(ws_client._PRICE.items()):   # 讀取端迭代整個快取
+                    float(lp.price)
+            except Exception as e:  # 任何例外都算失敗
+                errors.append(repr(e))
+                stats["exceptions"] += 1
+
+
+threads = [threading.Thread(target=writer_agg, args=(s,)) for s in SYMS]
+threads += [threading.Thread(target=writer_quotes, args=(s,)) for s in SYMS]
+threads += [threading.Thread(target=resetter)]
+threads += [threading.Thread(target=reader, args=(False,)) for _ in range(args.readers)]
+threads += [threading.Thread(target=reader, args=(True,))]
+for t in threads:
+    t.start()
+time.sleep(args.seconds)
+stop.set()
+for t in threads:
+    t.join()
+
+retries = sum(r.retries for r in ws_client._AGG.values())
+print(f"{args.seconds:.0f}s, {args.symbols} symbols, {args.readers} readers, ring capacity {args.capacity}:")
+print(f"  writes: {stats['agg_writes']} aggTrades, {stats['quote_writes']} quote updates, {stats['resets']} resets")
+print(f"  consistent reads: {stats['snapshots']} snapshots (+ ring snapshot each), "
+      f"{stats['bad_window']} bad windows, {stats['bad_sums']} bad sums, {stats['bad_book']} torn books, "
+      f"{stats['exceptions']} exceptions; snapshot retries on the live rings: {retries}")
+print(f"  naive zero-copy reads: {stats['naive_torn']} / {stats['naive_reads']} saw overwritten trades")
+for e in errors[:5]:
+    print("  ", e)
+ok = stats["snapshots"] > 0 and not (stats["bad_window"] or stats["bad_sums"] or stats["bad_book"] or stats["exceptions"])
+print("✅ PASS" if ok else "❌ FAIL")
+sys.exit(0 if ok else 1)
@@ -1,12 +1,25 @@
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import time,random
+import threading
 import statistics
 import requests
 from datetime import datetime, timezone
 import math, random
+import heapq
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from operator import itemgetter
 # 移除 MIN_NOTIONAL_FALLBACK 的 import，改從 config 讀
 from config import BINANCE_FUTURES_BASE, BINANCE_FUTURES_TEST_BASE, USE_TESTNET, SYMBOL_BLACKLIST, MIN_NOTIONAL_FALLBACK
+from config import FAPI_REST_HOSTS, REST_WEIGHT_LIMIT_1M, REST_WEIGHT_SAFETY, REST_MAX_INFLIGHT, REST_MAX_WAIT_S
+from config import REST_HEDGE, REST_HEDGE_MAX_WEIGHT, REST_COALESCE, REST_PRICE_TTL_S
+from config import KLINE_REFRESH_S, WS_KLINE_STALE_S, EXCHANGE_INFO_CACHE
+from rate_limiter import WeightLimiter, RateLimitBackoff, endpoint_weight
+from host_router import HostRouter
+from single_flight import SingleFlight, flight_key
+from kline_store import KlineStore
+from symbol_rules import SymbolRule, parse_exchange_info, load_cache, save_cache
+import indicators as _ind
 from typing import List, Optional
 from typing import Dict, Any
 from decimal import Decimal, ROUND_DOWN, ROUND_UP, InvalidOperation # <-- 新增 Decimal
@@ -15,7 +28,6 @@ SESSION = requests.Session()
 SESSION.headers.update({"User-Agent": "daily-gainer-bot/vC"})
 SESSION.headers.update({"Cache-Control": "no-cache"})
 EXCLUDE_KEYWORDS = ("UPUSDT", "DOWNUSDT", "BULLUSDT", "BEARUSDT", "BUSD")
-_KLINES_CACHE = {}  # key=(symbol, interval, limit) -> (ts, (closes, highs, lows, vols))
 
 # --- Binance REST endpoints（期貨 FAPI） ---
 _BINANCE_FAPI_BASES = [
@@ -40,89 +52,9 @@ def _choose_endpoint(path: str) -> str:
         return base + path
     return f"{base}/{path}"
 
-SESSION = requests.Session()
-_BASES = ["https://fapi1.binance.com", "https://fapi2.binance.com"]
-_base_idx = 0
-
-def _rest_json(path: str, params: Dict[str, Any] = None, timeout: float = 8.0, tries: int = 6) -> Dict[str, Any]:
-    """
-    穩健 REST：多 host 輪詢 + 202/429/418 重試 + 抽樣降噪 + 指數退避 + Retry-After 尊重
-    """
-    global _base_idx
-    params = params or {}
-    last_exc = None
-    backoff = 0.4
-
-    for attempt in range(tries):
-        base = _BASES[_base_idx % len(_BASES)]
-        url = f"{base}{path}"
-        try:
-            resp = SESSION.get(url, params=params, timeout=timeout)
-            # ----- 正常 2xx -----
-            if 200 <= resp.status_code < 300:
-                # 202: 後端忙，當成暫時失敗；抽樣 10% 印 log，並 jitter
-                if resp.status_code == 202:
-                    if random.random() < 0.10:
-                        print(f"Warning: Received 202 Accepted from {url}. Treating as temporary failure, retrying...")
-                    time.sleep(0.25 + 0.35 * random.random())
-                    # 輪下一個 base
-                    _base_idx += 1
-                    continue
-                return resp.json()
-
-            # ----- 429: Rate limit -----
-            if resp.status_code == 429:
-                ra = resp.headers.get("Retry-After") or resp.headers.get("x-mbx-retry-after")
-                used_weight = resp.headers.get("X-MBX-USED-WEIGHT-1M")
-                if ra:
-                    try:
-                        # 幣安有時是毫秒、有時是秒；>1000 當毫秒處理
-                        ra_f = float(ra)
-                        sleep_s = ra_f / 1000.0 if ra_f > 1000 else ra_f
-                        print(f"Warning: 429 from {url}. Retry-After={sleep_s:.2f}s (used-weight-1m={used_weight}).")
-                        time.sleep(sleep_s + 0.25 * random.random())
-                    except Exception:
-                        pass
-                else:
-                    # 沒給 Retry-After 就指數退避
-                    sleep_s = min(8.0, backoff * (2 ** attempt)) + 0.25 * random.random()
-                    print(f"Warning: 429 from {url}. Backing off {sleep_s:.2f}s.")
-                    time.sleep(sleep_s)
-                _base_idx += 1
-                continue
-
-            # ----- 418: IP 被暫時封（Too many requests）-----
-            if resp.status_code == 418:
-                print(f"Warning: 418 (IP temp banned) from {url}. Sleeping 60s.")
-                time.sleep(60.0 + 2.0 * random.random())
-                _base_idx += 1
-                continue
-
-            # 其他 5xx/4xx：簡單退避 + 換 host
-            if 500 <= resp.status_code < 600 or 400 <= resp.status_code < 500:
-                sleep_s = min(6.0, backoff * (1.8 ** attempt)) + 0.2 * random.random()
-                print(f"Warning: HTTP {resp.status_code} from {url}. Backing off {sleep_s:.2f}s.")
-                time.sleep(sleep_s)
-                _base_idx += 1
-                last_exc = requests.HTTPError(f"{resp.status_code} {resp.text}")
-                continue
-
-        except requests.RequestException as e:
-            # 網路層異常（含你看到的 too many 429 的聚合錯誤）
-            print(f"Warning: Network error contacting {base}: {e}")
-            sleep_s = min(6.0, backoff * (1.8 ** attempt)) + 0.2 * random.random()
-            time.sleep(sleep_s)
-            _base_idx += 1
-            last_exc = e
-            continue
-
-    # 全部重試失敗
-    if last_exc:
-        raise last_exc
-    raise RuntimeError(f"_rest_json failed for {path}")
 # --- 全域變數 ---
 TIME_OFFSET_MS = 0 # 時間偏移
-EXCHANGE_INFO = {} # 精度規則
+EXCHANGE_INFO: Dict[str, SymbolRule] = {} # 精度規則（symbol_rules.SymbolRule）
 
 def now_ts_ms():
     return int(datetime.now(timezone.utc).timestamp() * 1000)
@@ -134,140 +66,141 @@ def ws_best_price(symbol: str):
     except Exception:
         return None
 
-def fetch_top_gainers(limit=10):
-    rows = _rest_json("/fapi/v1/ticker/24hr", timeout=6, tries=3)
-    items = []
-    for x in rows:
-        s = x.get("symbol", "")
-        if (not s.endswith("USDT")) or any(k in s for k in EXCLUDE_KEYWORDS):
-            continue
-        if s in SYMBOL_BLACKLIST:
-            continue
-        try:
-            pct = float(x.get("priceChangePercent", 0.0))
-            last = float(x.get("lastPrice", 0.0))
-            quote_vol = float(x.get("quoteVolume", 0.0))
-        except (ValueError, TypeError):
-            continue
-        if last <= 0 or quote_vol <= 0:
-            continue
-        items.append((s, pct, last, quote_vol))
-    items.sort(key=lambda t: t[1], reverse=True)
-    return items[:limit]
-def fetch_top_losers(n: int = 10):
-    """
-    跌幅榜（和 fetch_top_gainers 結構一致）：
-    回傳 [(symbol, priceChangePercent, lastPrice, quoteVolume), ...] 取前 n 名。
-    """
+def ws_exec_price(symbol: str, side: str):
+    """BUY → 最佳賣價、SELL → 最佳買價；過期或沒有資料回傳 None"""
     try:
-        # ✅ 統一走 _rest_json（內含多主機輪詢 + 202/429/5xx 處理）
-        data = _rest_json("/fapi/v1/ticker/24hr", timeout=6, tries=3)
+        from ws_client import ws_exec_price as _ws
+        return _ws(symbol, side)
+    except Exception:
+        return None
 
-        rows = []
-        for item in data:
-            s = item.get("symbol")
-            if not s or not s.endswith("USDT"):
-                continue
-            if s in SYMBOL_BLACKLIST:
+def ws_snapshot(symbol: str, window_s: float = 30):
+    """ws_client.ws_snapshot：價格 / book / 成交累計取自同一時間點；WS 模組不可用時回傳 None"""
+    try:
+        from ws_client import ws_snapshot as _ws
+        return _ws(symbol, window_s)
+    except Exception:
+        return None
+
+# --- 可交易標的判斷 ---
+# load_exchange_info 成功後預先算好的集合（PERPETUAL/TRADING/USDT 且通過名稱規則）；
+# 尚未載入時退回名稱規則，結果以 dict 記憶，避免每列都做 EXCLUDE_KEYWORDS 子字串掃描
+ELIGIBLE_SYMBOLS: frozenset = frozenset()
+_NAME_OK: Dict[str, bool] = {}
+
+def _name_eligible(s: str) -> bool:
+    ok = _NAME_OK.get(s)
+    if ok is None:
+        ok = s.endswith("USDT") and not any(k in s for k in EXCLUDE_KEYWORDS) and s not in SYMBOL_BLACKLIST
+        _NAME_OK[s] = ok
+    return ok
+
+def is_eligible_symbol(s: str) -> bool:
+    if ELIGIBLE_SYMBOLS:
+        return s in ELIGIBLE_SYMBOLS
+    return _name_eligible(s)
+
+
+_PCT_KEY = itemgetter(1)
+
+class TickerSnapshot:
+    """
+    單次 /fapi/v1/ticker/24hr（weight 40）的快照；漲幅榜與跌幅榜共用同一份資料。
+    items: [(symbol, priceChangePercent, lastPrice, quoteVolume), ...]
+    """
+    __slots__ = ("ts", "items")
+
+    def __init__(self, items: List[tuple], ts: Optional[float] = None):
+        self.items = items
+        self.ts = ts if ts is not None else time.time()
+
+    @classmethod
+    def from_rows(cls, rows) -> "TickerSnapshot":
+        eligible = ELIGIBLE_SYMBOLS
+        items = []
+        append = items.append
+        for x in rows:
+            s = x.get("symbol")
+            if not s or not (s in eligible if eligible else _name_eligible(s)):
                 continue
+            # 只解析需要的三個欄位
             try:
-                pct  = float(item.get("priceChangePercent", 0.0))
-                last = float(item.get("lastPrice", 0.0))
-                vol  = float(item.get("quoteVolume", 0.0))
-            except Exception:
-                continue
-            # 僅保留有效數據
-            if last <= 0 or vol <= 0:
+                last = float(x["lastPrice"])
+                quote_vol = float(x["quoteVolume"])
+                if last <= 0 or quote_vol <= 0:
+                    continue
+                pct = float(x["priceChangePercent"])
+            except (KeyError, ValueError, TypeError):
                 continue
-            rows.append((s, pct, last, vol))
+            append((s, pct, last, quote_vol))
+        return cls(items)
+
+    def top_gainers(self, n: int = 10) -> List[tuple]:
+        return heapq.nlargest(n, self.items, key=_PCT_KEY)
+
+    def top_losers(self, n: int = 10) -> List[tuple]:
+        return heapq.nsmallest(n, self.items, key=_PCT_KEY)
 
-        # 依跌幅排序（最負在最前面）
-        rows.sort(key=lambda x: x[1])
-        return rows[:n]
+    def __len__(self):
+        return len(self.items)
+
+
+def fetch_ticker_snapshot() -> TickerSnapshot:
+    """拉一次全市場 24h ticker，建成 TickerSnapshot（掃描一輪只需呼叫一次）。"""
+    rows = _rest_json("/fapi/v1/ticker/24hr", timeout=6, tries=3)
+    return TickerSnapshot.from_rows(rows)
 
+def fetch_top_gainers(limit=10):
+    return fetch_ticker_snapshot().top_gainers(limit)
+
+def fetch_top_losers(n: int = 10):
+    """
+    跌幅榜（和 fetch_top_gainers 結構一致）：
+    回傳 [(symbol, priceChangePercent, lastPrice, quoteVolume), ...] 取前 n 名。
+    """
+    try:
+        return fetch_ticker_snapshot().top_losers(n)
     except Exception as e:
         print(f"Warning(fetch_top_losers): {e}")
         return []
 
-# 放在檔案頂部已有 import 後面（若無 random 請加上）
-import time, random
-
-# 簡單記憶體快取：（symbol, interval） -> { "ts": 上次成功時間, "data": (closes, highs, lows, vols) }
-_KLINE_CACHE = {}
-_KLINE_CACHE_TTL = 20.0  # 成功資料可沿用 20 秒，避免 202 時瘋狂打 API
+# K 線庫存：保留歷史、過期後只抓 startTime 之後的增量（lambda 讓 _rest_json 於呼叫時才解析）
+KLINE_STORE = KlineStore(lambda *a, **kw: _rest_json(*a, **kw), refresh_s=KLINE_REFRESH_S,
+                         ws_stale_s=WS_KLINE_STALE_S)
 
 def fetch_klines(symbol: str, interval: str, limit: int):
     """
-    回傳 (closes, highs, lows, vols)；含 30 秒 TTL 快取降低 429。
+    回傳 (closes, highs, lows, vols)；KLINE_REFRESH_S 內（或 WS kline 推播新鮮時）直接用庫存，過期只抓增量。
     """
-    import time
-    key = (symbol, interval, int(limit))
-    now = time.time()
-    rec = _KLINES_CACHE.get(key)
-    if rec and (now - rec[0] < 30.0):
-        return rec[1]
-
-    data = _rest_json("/fapi/v1/klines", params={
-        "symbol": symbol, "interval": interval, "limit": limit
-    }, tries=6)
+    return KLINE_STORE.get(symbol, interval, int(limit))
 
-    closes = [float(x[4]) for x in data]
-    highs  = [float(x[2]) for x in data]
-    lows   = [float(x[3]) for x in data]
-    vols   = [float(x[5]) for x in data]
-
-    tup = (closes, highs, lows, vols)
-    _KLINES_CACHE[key] = (now, tup)
-    return tup
+def fetch_klines_many(symbols: List[str], interval: str, limit: int, max_workers: Optional[int] = None):
+    """
+    併發抓多檔 K 線；依「完成順序」yield (symbol, (closes, highs, lows, vols) 或 None, 例外或 None)。
+    併發數預設跟 LIMITER 目前允許的在途請求數走，權重仍由 LIMITER 把關。
+    """
+    if not symbols:
+        return
+    workers = max(1, min(len(symbols), max_workers or LIMITER.concurrency))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="klines") as pool:
+        futs = {pool.submit(fetch_klines, s, interval, limit): s for s in symbols}
+        for fut in as_completed(futs):
+            sym = futs[fut]
+            try:
+                yield sym, fut.result(), None
+            except Exception as e:
+                yield sym, None, e
 
 
 def ema(vals, n):
-    if not vals or len(vals) < n or n <= 0: return None
-    try:
-        k = Decimal(2) / (Decimal(n) + Decimal(1))
-        e = to_decimal(vals[0])
-        if not e.is_finite(): # Handle potential NaN from to_decimal
-             # Find first finite value to start
-             for val_start in vals:
-                 e_start = to_decimal(val_start)
-                 if e_start.is_finite():
-                     e = e_start
-                     break
-             if not e.is_finite(): return None # Cannot start EMA
-
-        for v_str in vals[1:]:
-             v = to_decimal(v_str)
-             if v.is_finite(): # Only update EMA with valid numbers
-                 e = v * k + e * (Decimal(1) - k)
-        return float(e) if e.is_finite() else None
-    except (InvalidOperation, TypeError, IndexError):
-        return None # Return None if calculation fails
+    """EMA 最終值（float 版，見 indicators.ema；不再經 Decimal）。"""
+    return _ind.ema(vals, n)
 
 
 # --- ATR 計算 ---
 def calculate_atr(highs: List[float], lows: List[float], closes: List[float], period: int = 14) -> Optional[float]:
-    """計算 Average True Range (ATR)"""
-    if len(closes) < period + 1 or period <= 0:
-        return None # 數據不足或週期無效
-
-    true_ranges = []
-    for i in range(1, len(closes)):
-        try:
-            high = highs[i]
-            low = lows[i]
-            prev_close = closes[i-1]
-            tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
-            true_ranges.append(tr)
-        except (IndexError, TypeError, ValueError):
-             continue # Skip if data is bad
-
-    # 需要至少 period 個 TR 值才能計算 EMA
-    if len(true_ranges) < period:
-        return None
-
-    # 使用指數移動平均 (EMA / Wilder's smoothing) 計算 ATR
-    atr_float = ema(true_ranges, period) # 使用 ema 函數 (它內部用 Decimal)
-    return atr_float if atr_float is not None and atr_float > 0 else None # 確保回傳有效 ATR
+    """計算 Average True Range (ATR)：TR 的 EMA（float 版，見 indicators.atr）"""
+    return _ind.atr(highs, lows, closes, period)
 
 
 # --- Decimal 精度輔助函數 ---
@@ -335,28 +268,135 @@ def round_tick_decimal(value: Decimal, tick: Decimal, direction: int = 0) -> Dec
         return Decimal('NaN')
 
 
-# 安裝全域重試（429/5xx，帶退避）
-_retry = Retry(total=3, backoff_factor=0.4, status_forcelist=[429,500,502,503,504], allowed_methods=["GET","POST","DELETE"])
-SESSION.mount("https://", HTTPAdapter(max_retries=_retry))
-SESSION.mount("http://",  HTTPAdapter(max_retries=_retry))
+# urllib3 只重試「連線建立失敗」（請求沒送出、不計權重）；5xx 不在這裡重打：一次 rest_call 只送一次請求，
+# 權重與 X-MBX-USED-WEIGHT-1M 才對得上，簽名 POST/DELETE 也不會在限流器不知情下重送。
+# 5xx 重試交給 _rest_fetch（換主機）與 LiveAdapter._get（每次重新 acquire）
+_retry = Retry(total=2, connect=2, read=0, status=0, other=0, backoff_factor=0, raise_on_status=False)
+SESSION.mount("https://", HTTPAdapter(max_retries=_retry, pool_maxsize=max(10, REST_MAX_INFLIGHT * 2)))
+SESSION.mount("http://",  HTTPAdapter(max_retries=_retry, pool_maxsize=max(10, REST_MAX_INFLIGHT * 2)))
+# ROUTER 計時的公開 GET 用的 session：連線失敗也不在 urllib3 內重試，延遲樣本就是單次嘗試；失敗由 _rest_fetch 換主機
+_SINGLE_SESSION = requests.Session()
+_SINGLE_SESSION.headers.update(SESSION.headers)
+_SINGLE_SESSION.mount("https://", HTTPAdapter(max_retries=0, pool_maxsize=max(10, REST_MAX_INFLIGHT * 2)))
+_SINGLE_SESSION.mount("http://",  HTTPAdapter(max_retries=0, pool_maxsize=max(10, REST_MAX_INFLIGHT * 2)))
 
-FUTURES_HOSTS_MAIN  = ["https://fapi.binance.com", "https://fapi1.binance.com", "https://fapi2.binance.com"]
+FUTURES_HOSTS_MAIN  = FAPI_REST_HOSTS or ["https://fapi.binance.com", "https://fapi1.binance.com", "https://fapi2.binance.com"]
 FUTURES_HOSTS_TEST  = ["https://testnet.binancefuture.com"]
 
-def _rest_json(path: str, params=None, timeout=5, tries=3):
-    """對 Binance Futures REST 做多主機輪詢 + 退避重試 (優化版)。"""
-    hosts = FUTURES_HOSTS_TEST if USE_TESTNET else FUTURES_HOSTS_MAIN
+# 全域權重限流器：所有 REST（公開 + 簽名）都要經過
+LIMITER = WeightLimiter(limit=REST_WEIGHT_LIMIT_1M, safety=REST_WEIGHT_SAFETY, max_inflight=REST_MAX_INFLIGHT)
+
+def rest_call(method: str, url: str, weight: int, max_wait: float = None, session: requests.Session = None,
+              **kwargs) -> requests.Response:
+    """
+    經 LIMITER 送出單次 HTTP 請求（不重試、不解析），回傳 Response。
+    LiveAdapter 的簽名請求與 _rest_json 共用此入口，確保權重計算一致。session 預設 SESSION。
+    """
+    LIMITER.acquire(weight, max_wait=REST_MAX_WAIT_S if max_wait is None else max_wait)
+    r = None
+    try:
+        r = (session or SESSION).request(method, url, **kwargs)
+        return r
+    finally:
+        if r is not None:
+            LIMITER.release(weight, headers=r.headers, status=r.status_code)
+        else:
+            LIMITER.release(weight)
+
+# 主機選擇：EWMA 延遲 + 錯誤率排序；冪等 GET 可在 p95 後 hedge 到第二台
+ROUTER = HostRouter(FUTURES_HOSTS_TEST if USE_TESTNET else FUTURES_HOSTS_MAIN)
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=max(4, REST_MAX_INFLIGHT * 2), thread_name_prefix="rest-hedge")
+
+def _timed_get(base: str, path: str, weight: int, params, timeout) -> requests.Response:
+    """
+    單次 GET（不經 urllib3 重試）並把延遲/成敗回報給 ROUTER：5xx / 202 記為錯誤樣本，不算進延遲分布；
+    429/418 是 IP 層限制，不算主機錯誤。
+    """
+    t0 = time.perf_counter()
+    try:
+        r = rest_call("GET", f"{base}{path}", weight, params=params, timeout=timeout, session=_SINGLE_SESSION)
+    except RateLimitBackoff:
+        raise
+    except Exception:
+        ROUTER.record(base, time.perf_counter() - t0, ok=False)
+        raise
+    ROUTER.record(base, time.perf_counter() - t0, ok=r.status_code < 500 and r.status_code != 202)
+    return r
+
+def _hedged_get(hosts: List[str], path: str, weight: int, params, timeout, tried: Optional[set] = None):
+    """
+    送往 hosts[0]；超過該主機的 p95（ROUTER.hedge_delay）仍未回應時，對 hosts[1] 再送一次，先成功者勝。
+    權重大的請求（如全市場 ticker）不 hedge，避免雙倍權重。回傳 (base, Response)。
+    tried：實際送過的主機會加進去（呼叫端的後備重試跳過它們）。
+    """
+    tried = set() if tried is None else tried
+    delay = (ROUTER.hedge_delay(hosts[0])
+             if (REST_HEDGE and len(hosts) > 1 and weight <= REST_HEDGE_MAX_WEIGHT) else None)
+    tried.add(hosts[0])
+    if delay is None:
+        return hosts[0], _timed_get(hosts[0], path, weight, params, timeout)
+    first = _HEDGE_POOL.submit(_timed_get, hosts[0], path, weight, params, timeout)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return hosts[0], first.result()
+    tried.add(hosts[1])
+    second = _HEDGE_POOL.submit(_timed_get, hosts[1], path, weight, params, timeout)
+    futs = {first: hosts[0], second: hosts[1]}
+    err = None
+    for f in as_completed(futs):
+        try:
+            r = f.result()
+        except RateLimitBackoff:
+            raise
+        except Exception as e:
+            err = e
+            continue
+        if r.status_code < 500 and r.status_code != 202:
+            ROUTER.note_hedge(won=f is second)
+            return futs[f], r
+        err = requests.exceptions.HTTPError(f"{r.status_code} from {futs[f]}", response=r)
+    ROUTER.note_hedge(won=False)
+    raise err
+
+# 同一資源同時只送一次（single-flight）；部分端點的成功結果另保留短暫 TTL
+FLIGHT = SingleFlight()
+# exchangeInfo 只合併不快取：KeyError 觸發的刷新必須拿到新資料
+_RESULT_TTL_S = {
+    "/fapi/v1/ticker/price": REST_PRICE_TTL_S,
+}
+
+def _rest_json(path: str, params=None, timeout=5, tries=3, ttl: Optional[float] = None):
+    """
+    公開 GET 的統一入口：同 (path, params) 的併發呼叫共用一個在途請求與結果（FLIGHT）。
+    ttl=None 依 _RESULT_TTL_S；回傳的 JSON 物件可能與其他呼叫端共用，不可原地修改。
+    """
     params = params or {}
+    if not REST_COALESCE:
+        return _rest_fetch(path, params, timeout, tries)
+    if ttl is None:
+        ttl = _RESULT_TTL_S.get(path, 0.0)
+    return FLIGHT.do(flight_key(path, params), lambda: _rest_fetch(path, params, timeout, tries), ttl)
+
+def _rest_fetch(path: str, params, timeout=5, tries=3):
+    """對 Binance Futures REST 依 ROUTER 排序選主機 + 退避重試；權重由 LIMITER 控管。"""
+    weight = endpoint_weight(path, params)
     last_err = None
     for t in range(max(1, tries)):
-        # 嘗試隨機選擇主機，增加成功率
-        shuffled_hosts = random.sample(hosts, len(hosts))
-        for base in shuffled_hosts:
+        # 依延遲/錯誤率排序：第一台（可能 hedge）失敗才往後換
+        hosts = ROUTER.ranked()
+        tried = set()   # 本輪已送過（含 hedge）的主機，後備不再重送
+        for i, base in enumerate(hosts):
+            if i > 0 and base in tried:
+                continue
             try:
                 if not base.startswith(("http://", "https://")):
                      raise ValueError(f"Invalid base URL: {base}")
 
-                r = SESSION.get(f"{base}{path}", params=params, timeout=timeout)
+                # 封鎖期過長時 rest_call 會拋 RateLimitBackoff（不在下方 except 內吞掉）
+                if i == 0:
+                    base, r = _hedged_get(hosts, path, weight, params, timeout, tried)
+                else:
+                    r = _timed_get(base, path, weight, params, timeout)
 
                 # --- 核心修改：明確處理 202 ---
                 if r.status_code == 202:
@@ -365,12 +405,11 @@ def _rest_json(path: str, params=None, timeout=5, tries=3):
                     continue # 立刻嘗試下一個主機/重試
 
                 # --- 處理速率限制 (418/429) ---
+                # 限制是以 IP 計算，換 host 沒用；LIMITER 已依 Retry-After 設定封鎖，下一輪 acquire 會等待或放棄
                 if r.status_code == 418 or r.status_code == 429:
-                     print(f"Rate limit hit ({r.status_code}) on {base}, retrying...")
+                     print(f"Rate limit hit ({r.status_code}) on {base}, backing off via limiter...")
                      last_err = requests.exceptions.HTTPError(f"{r.status_code} Rate Limit", response=r)
-                     # 短暫等待後再嘗試下一個主機，讓 Retry 機制處理更長的退避
-                     time.sleep(0.1 + random.uniform(0, 0.2))
-                     continue
+                     break
 
                 # --- 檢查其他錯誤 ---
                 r.raise_for_status()
@@ -389,6 +428,8 @@ def _rest_json(path: str, params=None, timeout=5, tries=3):
                     last_err = ValueError(f"Non-JSON response received: {r.status_code}")
                     continue # 視為失敗，嘗試下一個
 
+            except RateLimitBackoff:
+                raise
             except requests.exceptions.Timeout:
                 last_err = requests.exceptions.Timeout(f"Timeout contacting {base}")
                 print(f"Warning: Timeout contacting {base}{path}")
@@ -445,83 +486,67 @@ def update_time_offset():
         return TIME_OFFSET_MS # 同步失敗時，維持舊的 offset
 
 # --- Exchange Info (精度規則) ---
-def load_exchange_info(force_refresh: bool = False, *_, **__):
-    """
-    獲取並緩存所有交易對的精度規則。
-    (main.py 會在 KeyError 時重新呼叫此函數)
-    """
-    global EXCHANGE_INFO
+# EXCHANGE_INFO 一律原地更新（不重新綁定），main/adapters 以 from utils import 拿到的參考永遠是最新的
+_INFO_LOCK = threading.Lock()
+_INFO_REFRESH = {"thread": None, "at": 0.0}
+
+def _apply_rules(rules: Dict[str, SymbolRule]):
+    global ELIGIBLE_SYMBOLS
+    with _INFO_LOCK:
+        for sym in [s for s in EXCHANGE_INFO if s not in rules]:
+            del EXCHANGE_INFO[sym]
+        for sym, rule in rules.items():
+            if EXCHANGE_INFO.get(sym) is not rule:
+                EXCHANGE_INFO[sym] = rule
+        ELIGIBLE_SYMBOLS = frozenset(s for s in rules if _name_eligible(s))
+
+def _refresh_exchange_info() -> bool:
+    """向交易所拉 exchangeInfo，只重建篩選欄位有變的 symbol；有變動才寫磁碟快取。"""
     try:
-        print("Attempting to load/refresh exchange info...") # Debug print
         info = _rest_json("/fapi/v1/exchangeInfo")
-        new_data = {}
-        processed_count = 0
-        skipped_count = 0
-        for s_info in info.get("symbols", []):
-            symbol = s_info.get("symbol")
-            # 增加更嚴格的檢查
-            if (symbol and
-                s_info.get('contractType') == 'PERPETUAL' and
-                s_info.get('status') == 'TRADING' and
-                s_info.get('quoteAsset') == 'USDT' and # Ensure it's USDT-M
-                s_info.get('maintMarginPercent') is not None): # Check for a valid margin percent as proxy for tradeable future
-
-                min_notional_dec = None
-                tick_size_str = None
-                step_size_str = None
-                price_prec = 8 # Default precision
-                qty_prec = 8 # Default precision
-
-                try:
-                    price_prec = int(s_info.get('pricePrecision', 8))
-                    qty_prec = int(s_info.get('quantityPrecision', 8))
-
-                    for f in s_info.get("filters", []):
-                        ftype = f.get("filterType")
-                        if ftype == "PRICE_FILTER":
-                            tick_size_str = f.get("tickSize")
-                        elif ftype == "LOT_SIZE":
-                            step_size_str = f.get("stepSize")
-                        elif ftype == "MIN_NOTIONAL":
-                             min_notional_str = f.get("notional")
-                             if min_notional_str: min_notional_dec = to_decimal(min_notional_str)
-                    
-                    # Ensure essential rules were found and parsed
-                    if tick_size_str is None or step_size_str is None:
-                         print(f"Warning: Missing tickSize or stepSize for {symbol}. Skipping.")
-                         skipped_count += 1
-                         continue
-                    
-                    # Store rules (keep original precision ints, but add Decimal versions for calculation)
-                    new_data[symbol] = {
-                        'pricePrecision': price_prec,
-                        'quantityPrecision': qty_prec,
-                        'tickSize': tick_size_str, # Store as string
-                        'stepSize': step_size_str, # Store as string
-                        'minNotional': min_notional_dec, # Store as Decimal or None
-                    }
-                    processed_count += 1
-                except (ValueError, TypeError, InvalidOperation) as e:
-                    print(f"Warning: Error parsing rules for {symbol}: {e}. Skipping.")
-                    skipped_count += 1
-                    continue
-            else:
-                 skipped_count += 1
-                 # Optional: Log skipped symbols if needed for debugging
-                 # if symbol: print(f"DEBUG: Skipping symbol {symbol} due to status/type mismatch.")
-
-        # Atomic update of the global cache
-        EXCHANGE_INFO = new_data
-        print(f"--- Successfully loaded/refreshed {processed_count} symbol precisions ({skipped_count} skipped) ---")
+        rules, rebuilt, skipped = parse_exchange_info(info, previous=dict(EXCHANGE_INFO))
+        if not rules:
+            raise ValueError("exchangeInfo contained no tradable symbols")
+        removed = len(set(EXCHANGE_INFO) - set(rules))
+        _apply_rules(rules)
+        _INFO_REFRESH["at"] = time.time()
+        if rebuilt or removed:
+            try:
+                save_cache(EXCHANGE_INFO_CACHE, rules)
+            except OSError as e:
+                print(f"Warning: cannot write exchange info cache {EXCHANGE_INFO_CACHE}: {e}")
+        print(f"--- Exchange info refreshed: {len(rules)} symbols ({rebuilt} rebuilt, {removed} removed, {skipped} skipped) ---")
+        return True
     except Exception as e:
-        # Make the error message more prominent
         print(f"--- FATAL: Failed to load/refresh Exchange Info: {type(e).__name__}: {e} ---")
-        print("--- Bot will likely fail placing orders due to unknown precision rules! ---")
-        # Consider if bot should exit here if EXCHANGE_INFO is empty or loading failed critically
-        if not EXCHANGE_INFO: # If cache is still empty after failure
-             print("--- CRITICAL: EXCHANGE_INFO is empty. Bot cannot function reliably. Exiting. ---")
-             # import sys
-             # sys.exit(1) # Uncomment to force exit on critical failure
+        if not EXCHANGE_INFO:
+            print("--- CRITICAL: EXCHANGE_INFO is empty. Bot cannot function reliably. ---")
+        return False
+
+def refresh_exchange_info_async(min_interval_s: float = 30.0) -> bool:
+    """背景刷新（同時最多一個；距上次刷新不足 min_interval_s 秒則略過）。回傳是否有啟動。"""
+    with _INFO_LOCK:
+        t = _INFO_REFRESH["thread"]
+        if (t is not None and t.is_alive()) or time.time() - _INFO_REFRESH["at"] < min_interval_s:
+            return False
+        t = _INFO_REFRESH["thread"] = threading.Thread(target=_refresh_exchange_info, daemon=True)
+    t.start()
+    return True
+
+def load_exchange_info(force_refresh: bool = False, *_, **__):
+    """
+    獲取並緩存所有交易對的精度規則（SymbolRule）。
+    尚未載入時先讀磁碟快取（即時可用）並改在背景刷新；沒有快取或 force_refresh 時同步拉取。
+    """
+    if not EXCHANGE_INFO and not force_refresh:
+        rules, ts = load_cache(EXCHANGE_INFO_CACHE)
+        if rules:
+            _apply_rules(rules)
+            print(f"--- Loaded {len(rules)} symbol rules from {EXCHANGE_INFO_CACHE} "
+                  f"(age {(time.time() - ts) / 60:.0f} min); refreshing in background ---")
+            refresh_exchange_info_async(min_interval_s=0)
+            return
+    _refresh_exchange_info()
 
 
 # === Helper to get rule safely ===
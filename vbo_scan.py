@@ -0,0 +1,134 @@
+# file: vbo_scan.py
+"""
+橫斷面 VBO 批次掃描：把各 symbol 最近 limit 根 K 線堆成 2-D NumPy 陣列（每列一檔），
+突破/過度延伸/量能/EMA/ATR 條件一次向量化算完，回傳依量能倍數排序的候選表。
+
+- 條件定義與 signal_volume_breakout.evaluate_vbo 相同（見 vbo_state.features_from_bars）
+- 輸入也可以是 VboFeatures（KLINE_STORE.vbo_features 的增量特徵，逐檔 O(1) 取得）：
+  只剩條件判斷，整批用特徵向量算（_scan_features），不必再堆疊整段 K 線
+- 長度不足 limit 的序列無法對齊堆疊 → 逐檔用 evaluate_vbo 補算，結果一致
+- 需要 numpy；沒有時整批退回逐檔 evaluate_vbo
+"""
+from typing import Dict, List, NamedTuple, Optional, Union
+
+from config import HH_N, VOL_BASE_WIN, VOL_SPIKE_K, OVEREXTEND_CAP, EMA_FAST, EMA_SLOW, ATR_PERIOD
+import indicators as _ind
+from indicators import np
+from signal_volume_breakout import evaluate_vbo
+from vbo_state import REQUIRED_LEN, CONFIRM_BARS, EMA_LEN, VboFeatures, features_from_bars
+
+
+class VboCandidate(NamedTuple):
+    symbol: str
+    long: bool
+    short: bool
+    atr: Optional[float]
+    vol_ratio: float        # 近 CONFIRM_BARS 根量和 / (VOL_SPIKE_K * 基準中位數 * CONFIRM_BARS)
+    breakout: float         # 突破（正）/ 跌破（負）前高前低的比例
+
+
+def _scan_matrix(closes, highs, lows, vols, allow_short: bool):
+    """S x L 陣列 → (long, short, atr, vol_ratio, breakout) 各一條長度 S 的向量。"""
+    S, L = closes.shape
+    c = closes[:, -1]
+    if HH_N <= 0 or HH_N + 1 >= L:
+        prev_high, prev_low = highs[:, -2], lows[:, -2]
+    else:
+        prev_high = highs[:, -(HH_N + 1):-1].max(axis=1)
+        prev_low = lows[:, -(HH_N + 1):-1].min(axis=1)
+    k = CONFIRM_BARS
+    if L >= VOL_BASE_WIN + k:
+        base_med = np.median(vols[:, -(VOL_BASE_WIN + k):-k], axis=1)
+    else:
+        base_med = np.full(S, np.nan)
+    recent = vols[:, -k:].sum(axis=1)
+    need = VOL_SPIKE_K * base_med * k
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol_ratio = np.where(need > 0, recent / need, np.inf)
+        up = np.where(prev_high > 0, (c - prev_high) / prev_high, 0.0)
+        down = np.where(prev_low > 0, (prev_low - c) / prev_low, 0.0)
+    vol_ok = recent >= need                      # base_med 為 NaN 時自然為 False
+    if L >= EMA_LEN:
+        seg = closes[:, -EMA_LEN:]
+        e_fast, e_slow = _ind.ema_np(seg, EMA_FAST), _ind.ema_np(seg, EMA_SLOW)
+    else:
+        e_fast = e_slow = np.full(S, np.nan)
+    atr = _ind.atr_np(highs, lows, closes, ATR_PERIOD) if L >= ATR_PERIOD + 1 else None
+    if atr is None:
+        atr = np.full(S, np.nan)
+    base_ok = vol_ok & ~np.isnan(atr) & (L >= REQUIRED_LEN)
+    long_ok = base_ok & (c > prev_high) & (up <= OVEREXTEND_CAP) & (e_fast > e_slow)
+    if allow_short:
+        short_ok = base_ok & (c < prev_low) & (down <= OVEREXTEND_CAP) & (e_fast < e_slow)
+    else:
+        short_ok = np.zeros(S, dtype=bool)
+    return long_ok, short_ok, atr, vol_ratio, np.where(c >= prev_high, up, -down)
+
+
+def _scan_features(feats: List[VboFeatures], allow_short: bool):
+    """S 組特徵 → 與 _scan_matrix 相同的五條向量（條件同 signal_volume_breakout._decide）。"""
+    nan = float("nan")
+    cols = np.array([(f.close, f.prev_high, f.prev_low, nan if f.base_med is None else f.base_med, f.recent_sum,
+                      nan if f.ema_fast is None else f.ema_fast, nan if f.ema_slow is None else f.ema_slow,
+                      nan if f.atr is None else f.atr) for f in feats], dtype=np.float64).T
+    c, prev_high, prev_low, base_med, recent, e_fast, e_slow, atr = cols
+    need = VOL_SPIKE_K * base_med * CONFIRM_BARS
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol_ratio = np.where(need > 0, recent / need, np.inf)
+        up = np.where(prev_high > 0, (c - prev_high) / prev_high, 0.0)
+        down = np.where(prev_low > 0, (prev_low - c) / prev_low, 0.0)
+    base_ok = (recent >= need) & ~np.isnan(e_fast) & ~np.isnan(e_slow) & ~np.isnan(atr)
+    long_ok = base_ok & (c > prev_high) & (up <= OVEREXTEND_CAP) & (e_fast > e_slow)
+    if allow_short:
+        short_ok = base_ok & (c < prev_low) & (down <= OVEREXTEND_CAP) & (e_fast < e_slow)
+    else:
+        short_ok = np.zeros(len(feats), dtype=bool)
+    return long_ok, short_ok, atr, vol_ratio, np.where(c >= prev_high, up, -down)
+
+
+def scan_vbo(bars_by_symbol: Dict[str, Union[tuple, VboFeatures]], limit: int,
+             allow_short: bool = True) -> List[VboCandidate]:
+    """
+    bars_by_symbol: {symbol: (closes, highs, lows, vols) 或 VboFeatures}
+    （fetch_klines / KlineStore.get 的回傳值，或 KLINE_STORE.vbo_features 的增量特徵）。
+    回傳成立（long 或 short）的候選，依 vol_ratio 由大到小排序。
+    """
+    out: List[VboCandidate] = []
+    stacked, featured, rest = [], [], []
+    for sym, bars in bars_by_symbol.items():
+        if isinstance(bars, VboFeatures):
+            (featured if np is not None else rest).append((sym, bars))
+        else:
+            (stacked if np is not None and min(len(x) for x in bars) >= limit else rest).append((sym, bars))
+
+    if featured:
+        long_ok, short_ok, atr, vol_ratio, brk = _scan_features([f for _, f in featured], allow_short)
+        for i in np.flatnonzero(long_ok | short_ok):
+            out.append(VboCandidate(featured[i][0], bool(long_ok[i]), bool(short_ok[i]),
+                                    float(atr[i]), float(vol_ratio[i]), float(brk[i])))
+
+    if stacked:
+        S = len(stacked)
+        mats = np.empty((4, S, limit), dtype=np.float64)
+        for i, (_, bars) in enumerate(stacked):
+            for j in range(4):
+                mats[j, i] = np.asarray(bars[j], dtype=np.float64)[-limit:]  # memoryview 不複製，直接寫入列
+        long_ok, short_ok, atr, vol_ratio, brk = _scan_matrix(*mats, allow_short=allow_short)
+        for i in np.flatnonzero(long_ok | short_ok):
+            out.append(VboCandidate(stacked[i][0], bool(long_ok[i]), bool(short_ok[i]),
+                                    float(atr[i]), float(vol_ratio[i]), float(brk[i])))
+
+    for sym, bars in rest:
+        f = bars if isinstance(bars, VboFeatures) else features_from_bars(*bars)
+        if f is None:
+            continue
+        r = evaluate_vbo(f, allow_short=allow_short)
+        if r.long or r.short:
+            need = VOL_SPIKE_K * f.base_med * CONFIRM_BARS
+            ref = f.prev_high if r.long else f.prev_low
+            out.append(VboCandidate(sym, r.long, r.short, r.atr,
+                                    f.recent_sum / need if need > 0 else float("inf"),
+                                    (f.close - ref) / ref if ref > 0 else 0.0))
+
+    out.sort(key=lambda x: -x.vol_ratio)
+    return out
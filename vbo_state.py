@@ -0,0 +1,116 @@
+# file: vbo_state.py
+"""
+VBO 特徵（前高/前低、量能中位數、近 N 根量和、EMA 快慢線、ATR）的增量引擎。
+
+- features_from_bars：由整段陣列一次算出（與舊 calculate_vbo_*_signal 相同的切片定義）
+- VboState：每根 bar 收盤時 push() 一次（O(1) / O(log n)），peek() 用形成中 bar 求出當下特徵，不改狀態
+- 視窗與 fetch_klines(limit) 相同：最近 limit 根（含形成中）；ATR 為這段內全部 TR 的 EMA
+"""
+import statistics
+from collections import deque
+from typing import NamedTuple, Optional
+
+from config import HH_N, VOL_BASE_WIN, VOL_LOOKBACK_CONFIRM, EMA_FAST, EMA_SLOW, ATR_PERIOD
+import indicators as _ind
+
+REQUIRED_LEN = max(HH_N, VOL_BASE_WIN, ATR_PERIOD) + VOL_LOOKBACK_CONFIRM + 2
+CONFIRM_BARS = VOL_LOOKBACK_CONFIRM if VOL_LOOKBACK_CONFIRM > 0 else 1
+EMA_LEN = EMA_SLOW + 10
+
+
+class VboFeatures(NamedTuple):
+    n_bars: int
+    close: float
+    prev_high: float
+    prev_low: float
+    base_med: Optional[float]   # 量能基準中位數；資料不足為 None
+    recent_sum: float           # 最近 CONFIRM_BARS 根（含形成中）量和
+    ema_fast: Optional[float]
+    ema_slow: Optional[float]
+    atr: Optional[float]        # <= 0 或資料不足為 None
+
+
+def features_from_bars(closes, highs, lows, vols) -> Optional[VboFeatures]:
+    """整段重算版本；資料長度不足 REQUIRED_LEN 時回傳 None。"""
+    n = min(len(closes), len(highs), len(lows), len(vols))
+    if n < REQUIRED_LEN:
+        return None
+    if HH_N <= 0 or HH_N + 1 >= n:
+        prev_high, prev_low = highs[-2], lows[-2]
+    else:
+        prev_high, prev_low = max(highs[-(HH_N + 1):-1]), min(lows[-(HH_N + 1):-1])
+    c = CONFIRM_BARS
+    base_med = statistics.median(vols[-(VOL_BASE_WIN + c):-c]) if n >= VOL_BASE_WIN + c else None
+    if n >= EMA_LEN:
+        seg = closes[-EMA_LEN:]
+        e_fast, e_slow = _ind.ema(seg, EMA_FAST), _ind.ema(seg, EMA_SLOW)
+    else:
+        e_fast = e_slow = None
+    return VboFeatures(n, closes[-1], prev_high, prev_low, base_med, sum(vols[-c:]),
+                       e_fast, e_slow, _ind.atr(highs, lows, closes, ATR_PERIOD))
+
+
+class VboState:
+    """
+    單一 symbol 的增量 VBO 狀態。push() 只接受已收盤 bar（依時間順序）；
+    形成中 bar 每次以 peek() 帶入，狀態維持在「最後一根已收盤」。
+    """
+    __slots__ = ("limit", "committed", "last_open_time", "_last_high", "_last_low", "_last_close",
+                 "_hh", "_ll", "_pending", "_base", "_ema_fast", "_ema_slow", "_atr")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.committed = 0
+        self.last_open_time = 0
+        self._last_high = self._last_low = self._last_close = None
+        self._hh = _ind.RollingExtreme(HH_N, maximum=True)
+        self._ll = _ind.RollingExtreme(HH_N, maximum=False)
+        self._pending = deque()                         # 最近 CONFIRM_BARS-1 根收盤量（尚未進基準窗）
+        self._base = _ind.SortedWindow(VOL_BASE_WIN)
+        self._ema_fast = _ind.SlidingEma(EMA_FAST, EMA_LEN)
+        self._ema_slow = _ind.SlidingEma(EMA_SLOW, EMA_LEN)
+        self._atr = _ind.SlidingEma(ATR_PERIOD, limit - 1)  # limit 根 → limit-1 個 TR
+
+    def push(self, open_time: int, h: float, l: float, c: float, v: float):
+        if self._last_close is not None:
+            self._atr.push(_true_range(h, l, self._last_close))
+        self._last_high, self._last_low, self._last_close = h, l, c
+        if HH_N > 0:
+            self._hh.push(h)
+            self._ll.push(l)
+        self._pending.append(v)
+        if len(self._pending) >= CONFIRM_BARS:
+            self._base.push(self._pending.popleft())
+        self._ema_fast.push(c)
+        self._ema_slow.push(c)
+        self.committed += 1
+        self.last_open_time = open_time
+
+    def peek(self, h: float, l: float, c: float, v: float) -> Optional[VboFeatures]:
+        """以形成中 bar (h, l, c, v) 求特徵；語意同 features_from_bars(最近 limit 根)。"""
+        n = min(self.committed, self.limit - 1) + 1
+        if n < REQUIRED_LEN or self._last_close is None:
+            return None
+        if HH_N <= 0 or HH_N + 1 >= n:
+            prev_high, prev_low = self._last_high, self._last_low
+        else:
+            prev_high, prev_low = self._hh.value(), self._ll.value()
+        base_med = self._base.median() if n >= VOL_BASE_WIN + CONFIRM_BARS else None
+        if n >= EMA_LEN:
+            e_fast, e_slow = self._ema_fast.peek(c), self._ema_slow.peek(c)
+        else:
+            e_fast = e_slow = None
+        atr = None
+        if ATR_PERIOD > 0 and n >= ATR_PERIOD + 1:
+            atr = self._atr.peek(_true_range(h, l, self._last_close))
+            if atr is not None and atr <= 0:
+                atr = None
+        return VboFeatures(n, c, prev_high, prev_low, base_med, sum(self._pending) + v,
+                           e_fast, e_slow, atr)
+
+
+def _true_range(h: float, l: float, prev_close: float) -> float:
+    hl = h - l
+    hc = abs(h - prev_close)
+    lc = abs(l - prev_close)
+    return hl if hl >= hc and hl >= lc else (hc if hc >= lc else lc)
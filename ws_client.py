@@ -1,41 +1,176 @@
-import json, threading, time, asyncio
-from typing import Dict, List, Optional
-from collections import deque, defaultdict
+import json, math, threading, time, asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+from collections import defaultdict
 import websockets
+from config import WS_KLINES, KLINE_INTERVAL, WS_ALL_TICKERS, WS_SHARDS, WS_MAX_STREAMS_PER_CONN, WS_REBALANCE_S
+from config import WS_AGG_CAPACITY, LARGE_TRADES_MERGE_S, WS_BOOK_TICKER, WS_BOOK_STALE_S, WS_TICKER_MAX_AGE_S
+from config import WS_PROCESS, WS_PROCESS_SLOTS, WS_AGG_BACKFILL, WS_AGG_BACKFILL_MAX
+from ticker_board import TickerBoard
+from agg_ring import AggRing, AggWindow, WindowSums, AggSnapshot
 
-_WS_THREAD = None
-_WS_STOP = False
-_SUBS: List[str] = [] # Track current subscriptions
+try:
+    import orjson
+    _loads = orjson.loads   # 比標準 json 快數倍（tools/bench_ws_decode.py）
+except ImportError:  # orjson 為可選依賴；沒有時用標準 json
+    orjson = None
+    _loads = json.loads
+
+_WANT: frozenset = frozenset()  # 呼叫端要的 symbol（start_ws 整個替換，跨執行緒讀取安全）
+_SHARDS: List["_Shard"] = []    # 每個分片一條連線 + 一個執行緒/event loop
+_OWNER: Dict[str, "_Shard"] = {}    # symbol -> 負責訂閱的分片
+_DELIVER: Dict[str, "_Shard"] = {}  # symbol -> 目前採用哪個分片的訊息（搬移時新分片收到第一筆才切換）
+_RATE: Dict[str, float] = {}        # symbol -> 觀測訊息率（msg/s，EWMA），分片負載平衡用
+_REBALANCE = {"at": 0.0, "moves": 0}
 _HOST = {"test": "wss://stream.binancefuture.com", "main": "wss://fstream.binance.com"}
 _RECEIVED_TICKER_SYMBOLS = set() # <--- 新增這一行
 
 # --- 全域快取 ---
-# 1. 價格快取
-_PRICE: Dict[str, float] = {}
+# 寫入端（各分片執行緒）只做「整筆替換」：每個值都是不可變的 tuple / 發布後的 AggRing 狀態，
+# 讀取端（主迴圈、面板、訊號）不取鎖也拿得到一致的一份；stop_ws 換新 dict 而不是 clear()。
+
+# 1. 價格快取（@ticker / !ticker@arr 的最新成交價）
+class LastPrice(NamedTuple):
+    price: float
+    at: float   # 本機收到時間（time.time()）
+
+_PRICE: Dict[str, LastPrice] = {}
+
+# 1a. 最佳買賣價（@bookTicker，逐筆即時）：{ "BTCUSDT": BookTop }，整筆替換（讀取端拿到的一定一致）
+class BookTop(NamedTuple):
+    bid: float
+    ask: float
+    at: float   # 本機收到時間（time.time()），判斷新鮮度用；不用交易所 E，避免時鐘偏差
+    u: int      # updateId，丟棄較舊的更新
+
+_BOOK: Dict[str, BookTop] = {}
+
+# 1b. 全市場漲跌幅排行（!ticker@arr）；重啟連線不清空，推播恢復後自然更新
+_BOARD = TickerBoard(max_age_s=WS_TICKER_MAX_AGE_S)
+
+# 2. 逐筆成交快取: { "BTCUSDT": AggRing }（ts/price/qty/side 四條 typed array，固定容量）
+#    寫入時同步維護大單訊號用的 MERGE_S 視窗買/賣累計（ws_agg_sums 讀取 O(1)）
+def _new_ring() -> AggRing:
+    return AggRing(WS_AGG_CAPACITY, window_ms=LARGE_TRADES_MERGE_S * 1000)
+
+_AGG: Dict[str, AggRing] = defaultdict(_new_ring)
+
+# 2a. 逐筆成交連續性：每個 symbol 最後套用的 aggregate trade id（a）。
+#     a 跳號（重連期間/漏訊息）→ 之後的即時成交先排進 _GAP，REST /fapi/v1/aggTrades?fromId= 補齊缺的那段
+#     並依序套用後才接回即時訊息，MERGE_S 視窗累計與大單歷史不會少算
+_AGG_ID: Dict[str, int] = {}
+_GAP: Dict[str, List[dict]] = {}    # symbol -> 補洞期間暫存的即時成交（依到達順序）
+_GAP_LOCK = threading.Lock()        # 暫存與補洞完成的交接（分片搬移時可能有兩個執行緒）
+_BACKFILL = {"gaps": 0, "filled": 0, "missing": 0, "failed": 0, "skipped": 0}  # skipped：缺口超過 WS_AGG_BACKFILL_MAX、刻意不補
+_BACKFILL_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ws-backfill")  # REST 不佔分片的 event loop
+
+# WS_PROCESS：逐筆成交 / bookTicker 由獨立行程收訊（shm_feed），_AGG / _BOOK 換成讀共享記憶體的對照表；
+# !ticker@arr 與 K 線仍由本行程的分片處理
+_FEED = None
+
+# 3. 一致快照：同一時間點的價格紀錄 + 逐筆成交（同一發布版本的唯讀視窗與累計）
+class MarketSnap(NamedTuple):
+    symbol: str
+    price: Optional[float]          # 同 ws_best_price，取自下面這份 book / last
+    price_at: float                 # 該價格的本機時間；沒有價格為 0
+    book: Optional[BookTop]
+    last: Optional[LastPrice]
+    agg: Optional[AggSnapshot]      # seq / last_ts / 唯讀成交視窗 / MERGE_S 視窗累計
+    taken_at: float                 # 取快照的本機時間
 
-# 2. 逐筆成交快取: { "BTCUSDT": deque([(ts_ms, price, qty, is_buy), ...]) }
-_AGG: Dict[str, deque] = defaultdict(lambda: deque(maxlen=6000))
+    def exec_price(self, side: str, max_age_s: Optional[float] = None) -> Optional[float]:
+        """同 ws_exec_price，但取自這份快照的 book（與 price / agg 同一時間點）"""
+        b = self.book
+        if b is None or self.taken_at - b.at > (WS_BOOK_STALE_S if max_age_s is None else max_age_s):
+            return None
+        return b.ask if side.upper() == "BUY" else b.bid
+
+    def agg_sums(self, recent_s: float = 0) -> Optional[WindowSums]:
+        """同 ws_agg_sums，但取自這份快照：recent_s > 0 且最後一筆成交早於 recent_s 秒前回傳 None"""
+        a = self.agg
+        if a is None or a.sums is None:
+            return None
+        if recent_s and a.last_ts < (self.taken_at - recent_s) * 1000:
+            return None
+        return a.sums
 
 # --- 讀取快取的函數 ---
 
+def _pick_price(book: Optional[BookTop], last: Optional[LastPrice], now: float):
+    if book is not None and now - book.at <= WS_BOOK_STALE_S:
+        return (book.bid + book.ask) / 2.0, book.at
+    if last is not None:
+        return last.price, last.at
+    return None, 0.0
+
 def ws_best_price(symbol: str) -> Optional[float]:
-    """讀取最新價格"""
-    return _PRICE.get(symbol.upper())
+    """讀取最新價格：最佳買賣價新鮮時用中間價，否則用 @ticker / !ticker@arr 的最新成交價"""
+    s = symbol.upper()
+    return _pick_price(_BOOK.get(s), _PRICE.get(s), time.time())[0]
+
+def ws_snapshot(symbol: str, window_s: float = 30) -> MarketSnap:
+    """
+    一次取得一致的 (價格, 時間, 近 window_s 秒成交視窗, 視窗累計)；不取鎖。
+    成交部分是複本（之後的寫入不影響），可以放心跨迴圈持有。
+    只要價格與累計時給 window_s=0，不複製成交。
+    """
+    s = symbol.upper()
+    now = time.time()
+    book, last, ring = _BOOK.get(s), _PRICE.get(s), _AGG.get(s)
+    price, at = _pick_price(book, last, now)
+    agg = ring.snapshot(int((now - window_s) * 1000), int(now * 1000)) if ring is not None else None
+    return MarketSnap(s, price, at, book, last, agg, now)
+
+def ws_book(symbol: str) -> Optional[BookTop]:
+    """最佳買賣價紀錄（不檢查新鮮度）；沒有資料回傳 None"""
+    return _BOOK.get(symbol.upper())
+
+def ws_book_age(symbol: str) -> float:
+    """最佳買賣價距今秒數；沒有資料回傳 inf"""
+    b = _BOOK.get(symbol.upper())
+    return time.time() - b.at if b is not None else math.inf
+
+def ws_exec_price(symbol: str, side: str, max_age_s: Optional[float] = None) -> Optional[float]:
+    """
+    依下單方向可成交的價格：BUY 吃 ask、SELL 吃 bid（平多 = SELL、平空 = BUY）。
+    超過 max_age_s（預設 WS_BOOK_STALE_S）沒更新視為過期，回傳 None。
+    """
+    b = _BOOK.get(symbol.upper())
+    if b is None:
+        return None
+    if time.time() - b.at > (WS_BOOK_STALE_S if max_age_s is None else max_age_s):
+        return None
+    return b.ask if side.upper() == "BUY" else b.bid
+
+def ws_agg_window(symbol: str, window_s: float = 30) -> Optional[AggWindow]:
+    """近 window_s 秒的逐筆成交（零複製 memoryview，由舊到新）；沒有資料回傳 None"""
+    ring = _AGG.get(symbol.upper())
+    if not ring:
+        return None
+    return ring.since(int(time.time() * 1000 - window_s * 1000))
+
+def ws_agg_sums(symbol: str, recent_s: float = 0) -> Optional[WindowSums]:
+    """
+    近 LARGE_TRADES_MERGE_S 秒的買/賣量與 px*qty 累計（寫入端維護，O(1)）。
+    recent_s > 0：最後一筆成交早於 recent_s 秒前視為沒有資料，回傳 None。
+    """
+    ring = _AGG.get(symbol.upper())
+    if not ring:
+        return None
+    return ring.window_sums(int(time.time() * 1000), int(recent_s * 1000))
 
 def ws_recent_agg(symbol: str, window_s: int = 30) -> List: # <--- 確認這行存在！
-    """讀取近 window_s 秒的逐筆成交"""
-    cutoff = int(time.time() * 1000) - window_s * 1000
-    dq = _AGG.get(symbol.upper())
-    if not dq: return []
-    results = []
-    # Iterate from right (newest) to left (oldest) for efficiency
-    for item in reversed(dq):
-        if item[0] >= cutoff:
-            results.append(item)
-        else:
-            break # Deque is time-ordered
-    # Results are newest-to-oldest, signal side doesn't care about order within window
-    return results
+    """讀取近 window_s 秒的逐筆成交 [(ts, price, qty, is_buy), ...]（新到舊；相容用，會建 list）"""
+    w = ws_agg_window(symbol, window_s)
+    if w is None:
+        return []
+    rows = [(t, p, q, bool(b)) for t, p, q, b in zip(w.ts, w.price, w.qty, w.side)]
+    rows.reverse()
+    return rows
+
+def ws_ticker_board() -> TickerBoard:
+    """全市場排行；用前以 age() 判斷是否新鮮（未訂閱 !ticker@arr 時永遠是 inf）"""
+    return _BOARD
 
 # --- WS 訊息處理 ---
 
@@ -51,102 +186,584 @@ def _on_ticker(msg: dict):
             _RECEIVED_TICKER_SYMBOLS.add(s)
         # --- 結束 Debug Print ---
         try:
-            _PRICE[s] = float(c)
+            _PRICE[s] = LastPrice(float(c), time.time())
         except ValueError:
             pass # Ignore conversion errors
 
+def _on_book_ticker(msg: dict):
+    """處理 @bookTicker 訊息（b/a = 最佳買/賣價，u = updateId）"""
+    s = msg.get("s")
+    if not s: return
+    try:
+        u = int(msg.get("u", 0))
+        prev = _BOOK.get(s)
+        if prev is not None and u < prev.u:
+            return
+        bid = float(msg["b"])
+        ask = float(msg["a"])
+    except (ValueError, KeyError, TypeError):
+        return # Ignore parsing errors
+    if bid > 0 and ask > 0:
+        _BOOK[s] = BookTop(bid, ask, time.time(), u)
+
 def _on_aggtrade(msg: dict):
-    """處理 @aggTrade 訊息"""
+    """處理 @aggTrade 訊息（只取 s / a / T / p / q / m）；a 跳號時先補洞再套用"""
     s = msg.get("s")
     if not s: return
+    if s in _GAP:
+        with _GAP_LOCK:
+            if s in _GAP:
+                _GAP[s].append(msg)
+                return
+    a = msg.get("a")
+    last = _AGG_ID.get(s)
+    if a is not None and last is not None:
+        if a <= last:
+            return # 補洞已套用 / 分片搬移時的重複
+        if a > last + 1 and WS_AGG_BACKFILL:
+            _start_backfill(s, last + 1, a, msg)
+            return
+    _apply_agg(s, msg)
+
+def _apply_agg(s: str, t: dict):
+    """套用一筆成交（WS 訊息或 REST aggTrades 的一列，欄位名稱相同）"""
     try:
-        ts = int(msg.get("T", 0))
-        p  = float(msg.get("p", 0) or 0)
-        q  = float(msg.get("q", 0) or 0)
-        is_buy = not bool(msg.get("m", False)) # Taker Buy
+        ts = int(t["T"])
+        p  = float(t["p"])
+        q  = float(t["q"])
         if p > 0 and q > 0 and ts > 0:
-            _AGG[s].append((ts, p, q, is_buy))
+            _AGG[s].append(ts, p, q, not t.get("m", False)) # m=False → Taker Buy
     except (ValueError, KeyError, TypeError):
         pass # Ignore parsing errors
+    a = t.get("a")
+    if a is not None:
+        _AGG_ID[s] = a
+
+def _start_backfill(s: str, from_id: int, upto_id: int, first: dict):
+    """缺 [from_id, upto_id)：first 與之後的即時成交先暫存，REST 抓完後回到本分片的 event loop 套用"""
+    _BACKFILL["gaps"] += 1
+    if upto_id - from_id > WS_AGG_BACKFILL_MAX:
+        _BACKFILL["skipped"] += 1
+        _BACKFILL["missing"] += upto_id - from_id
+        print(f"WebSocket aggTrade gap of {upto_id - from_id} for {s} exceeds WS_AGG_BACKFILL_MAX={WS_AGG_BACKFILL_MAX}, not backfilled")
+        _apply_agg(s, first) # 接受缺口，之後不再對同一段重補
+        return
+    with _GAP_LOCK:
+        _GAP[s] = [first]
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None # 不在分片執行緒內（工具直接重播）：同步補
+    if loop is None:
+        try:
+            _finish_backfill(s, upto_id, _fetch_aggtrades(s, from_id, upto_id))
+        except Exception as e:
+            _finish_backfill(s, upto_id, None, e)
+        return
+    fut = loop.run_in_executor(_BACKFILL_POOL, _fetch_aggtrades, s, from_id, upto_id)
+    fut.add_done_callback(lambda f: _backfill_done(s, upto_id, f))
 
-async def _run_ws(loop_syms: List[str], use_testnet: bool):
-    global _PRICE, _AGG
-    url_base = (_HOST["test"] if use_testnet else _HOST["main"])
+def _backfill_done(s: str, upto_id: int, f: asyncio.Future):
+    """補洞 future 結束（含被取消）都要收尾，否則 _GAP[s] 會一直暫存下去"""
+    if f.cancelled():
+        _finish_backfill(s, upto_id, None, asyncio.CancelledError("backfill cancelled"))
+        return
+    err = f.exception()
+    _finish_backfill(s, upto_id, None if err else f.result(), err)
 
-    streams = []
-    for s in loop_syms:
-        s_low = s.lower()
-        streams.append(f"{s_low}@ticker")
-        streams.append(f"{s_low}@aggTrade")
+def _fetch_aggtrades(s: str, from_id: int, upto_id: int) -> List[dict]:
+    """/fapi/v1/aggTrades?fromId= 每次 1000 筆（權重 20，經 LIMITER 控管）；只回傳 a < upto_id 的部分"""
+    from utils import _rest_json  # 延遲匯入，避免 ws_client 載入時就做網路校時
+    rows: List[dict] = []
+    while from_id < upto_id:
+        got = _rest_json("/fapi/v1/aggTrades", {"symbol": s, "fromId": from_id, "limit": min(1000, upto_id - from_id)},
+                         timeout=5, tries=2)
+        if not got:
+            break
+        rows.extend(t for t in got if t["a"] < upto_id)
+        from_id = got[-1]["a"] + 1
+    return rows
 
-    url = f"{url_base}/stream?streams={'/'.join(streams)}"
+def _finish_backfill(s: str, upto_id: int, rows: Optional[List[dict]], err: Optional[BaseException] = None):
+    if s not in _GAP:
+        return # 補洞期間已退訂 / stop_ws
+    if err is not None:
+        _BACKFILL["failed"] += 1
+        print(f"WebSocket aggTrade backfill for {s} failed: {err}")
+    rows = rows or []
+    last = _AGG_ID.get(s, -1)
+    for t in rows:
+        if t["a"] > last:
+            _apply_agg(s, t)
+    _BACKFILL["filled"] += len(rows)
+    _BACKFILL["missing"] += max(0, upto_id - 1 - _AGG_ID.get(s, upto_id - 1))
+    _AGG_ID[s] = max(_AGG_ID.get(s, 0), upto_id - 1)   # 補不到的就接受，之後不再對同一段重補
+    with _GAP_LOCK:
+        pending = _GAP.pop(s, [])
+    for m in pending:
+        _on_aggtrade(m) # 暫存中若又跳號，會開新的補洞並把剩下的重新暫存
 
-    while not _WS_STOP:
-        try:
-            async with websockets.connect(url, ping_interval=15, ping_timeout=15) as ws:
-                while not _WS_STOP:
-                    msg_raw = await asyncio.wait_for(ws.recv(), timeout=30)
-                    d = json.loads(msg_raw)
-
-                    data = d.get("data")
-                    stream_name = d.get("stream") # Get stream name to identify type
-                    if not data or not stream_name:
-                        continue
-
-                    # Determine message type based on stream name or event type
-                    if "@ticker" in stream_name:
-                         _on_ticker(data)
-                    elif "@aggTrade" in stream_name:
-                         _on_aggtrade(data)
-                    # Fallback check using event type if stream name wasn't clear
-                    elif data.get("e") == "ticker":
-                         _on_ticker(data)
-                    elif data.get("e") == "aggTrade":
-                         _on_aggtrade(data)
-
-        except (asyncio.TimeoutError, websockets.exceptions.ConnectionClosed):
-            print("WebSocket timeout or closed, reconnecting...")
-            await asyncio.sleep(1.0) # Wait before reconnecting
-        except Exception as e:
-            print(f"WebSocket error: {e}, reconnecting...")
-            await asyncio.sleep(1.0) # Wait before reconnecting
+def _on_ticker_arr(data: list):
+    """處理 !ticker@arr：整批更新排行，順便更新價格快取"""
+    if _BOARD.eligible is None:
+        from utils import is_eligible_symbol  # 延遲匯入，避免 ws_client 載入時就做網路校時
+        _BOARD.eligible = is_eligible_symbol
+    _BOARD.apply(data)
+    now = time.time()
+    for t in data:
+        s, c = t.get("s"), t.get("c")
+        if s and c:
+            try:
+                _PRICE[s] = LastPrice(float(c), now)
+            except ValueError:
+                pass
+
+_KLINE_STORE = None
+
+def _on_kline(msg: dict):
+    """處理 @kline_<interval> 訊息：直接更新 utils.KLINE_STORE 內已播種的序列"""
+    global _KLINE_STORE
+    s = msg.get("s")
+    k = msg.get("k")
+    if not s or not k: return
+    if _KLINE_STORE is None:
+        from utils import KLINE_STORE as _store  # 延遲匯入：只有開啟 WS_KLINES 才需要
+        _KLINE_STORE = _store
+    try:
+        _KLINE_STORE.apply_ws_kline(s, k)
+    except (ValueError, KeyError, TypeError):
+        pass # Ignore parsing errors
+
+def _on_event(msg: dict):
+    """串流名稱對不到 handler 時的後備：依事件類型 e 分派"""
+    h = _EVENTS.get(msg.get("e"))
+    if h is not None:
+        h(msg)
+
+# 串流後綴（"btcusdt@aggTrade" 的 "aggTrade"；kline_<interval> 取 "kline"）-> handler
+_HANDLERS: Dict[str, Callable[[dict], None]] = {
+    "bookTicker": _on_book_ticker, "ticker": _on_ticker, "aggTrade": _on_aggtrade, "kline": _on_kline}
+_EVENTS: Dict[str, Callable[[dict], None]] = {
+    "bookTicker": _on_book_ticker, "24hrTicker": _on_ticker, "ticker": _on_ticker,
+    "aggTrade": _on_aggtrade, "kline": _on_kline}
+# 完整串流名稱 -> handler；每個串流名稱第一次出現時解析一次，之後查表（串流數受訂閱上限約束）
+_ROUTES: Dict[str, Callable[[dict], None]] = {}
+
+def _route(stream: str) -> Callable[[dict], None]:
+    suffix = stream.partition("@")[2]
+    h = _ROUTES[stream] = _HANDLERS.get(suffix.partition("_")[0], _on_event)
+    return h
+
+def _streams_for(sym: str) -> List[str]:
+    s_low = sym.lower()
+    # @bookTicker 逐筆推最佳買賣價且 payload 小；@ticker 約 1 秒一筆、帶整包 24h 統計
+    # WS_PROCESS 時這兩條由 feed 行程訂閱，本行程只剩 K 線
+    out = [] if WS_PROCESS else [f"{s_low}@bookTicker" if WS_BOOK_TICKER else f"{s_low}@ticker", f"{s_low}@aggTrade"]
+    if WS_KLINES:
+        out.append(f"{s_low}@kline_{KLINE_INTERVAL}")
+    return out
+
+def _drop_symbol_cache(sym: str):
+    """退訂確認後清掉該 symbol 的快取（!ticker@arr 開著時價格仍會持續更新，保留）"""
+    _AGG.pop(sym, None)
+    _AGG_ID.pop(sym, None)
+    with _GAP_LOCK:
+        _GAP.pop(sym, None)
+    _BOOK.pop(sym, None)
+    _DELIVER.pop(sym, None)
+    _RECEIVED_TICKER_SYMBOLS.discard(sym)
+    if not WS_ALL_TICKERS:
+        _PRICE.pop(sym, None)
+
+_LAG_ALPHA = 0.05
+
+class _Shard:
+    """
+    一條 WS 連線：自己的執行緒 + event loop + reader。
+    want 由 start_ws 整個替換；差異以 SUBSCRIBE/UNSUBSCRIBE 送到目前連線，重連時以當下 want 組 URL。
+    """
+    def __init__(self, idx: int):
+        self.idx = idx
+        self.all_tickers = idx == 0 and WS_ALL_TICKERS  # !ticker@arr 固定放在第 0 片
+        self.want: frozenset = frozenset()
+        self.active: set = set()
+        self.pending: Dict[int, tuple] = {}  # 控制訊息 id -> (method, symbols)
+        self.next_id = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.kick: Optional[asyncio.Event] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = False
+        # 統計（只由本分片的執行緒寫入）
+        self.msgs = 0
+        self.sym_msgs: Dict[str, int] = {}   # 由 _update_rates 整個換掉後累加
+        self.rate = 0.0                      # msg/s（每秒滾動一次的 EWMA）
+        self.lag_ms = 0.0                    # 本機時間 - 事件時間 E 的 EWMA（含本機與交易所的時鐘差）
+        self.lag_max_ms = 0.0
+        self._sec_t = 0.0
+        self._sec_n = 0
+        self.stats = {"connects": 0, "subscribe": 0, "unsubscribe": 0, "errors": 0}
+
+    def streams(self) -> int:
+        return len(self.want) * len(_streams_for("x")) + int(self.all_tickers)
+
+    # --- 跨執行緒控制 ---
+    def set_want(self, want: frozenset):
+        if want == self.want:
+            return
+        self.want = want
+        self._wake()
+
+    def _wake(self):
+        if self.loop is not None and self.kick is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.kick.set)
+            except RuntimeError:
+                pass  # loop 已關閉
+
+    def start(self, use_testnet: bool):
+        def _t():
+            # Set up a new event loop for the thread
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self.loop = loop
+            try:
+                loop.run_until_complete(self._run(use_testnet))
+            finally:
+                self.loop = None
+                loop.close()
+        self.thread = threading.Thread(target=_t, daemon=True, name=f"ws-shard-{self.idx}")
+        self.thread.start()
+
+    def stop(self):
+        """只送出停止訊號；stop_ws 先通知所有分片，再以同一個期限 join"""
+        self.stopped = True
+        self._wake()
+
+    def join(self, timeout: float):
+        if self.thread and self.thread.is_alive():
+            try:
+                self.thread.join(timeout=timeout)
+            except Exception as e:
+                print(f"Error stopping WebSocket shard {self.idx}: {e}")
+
+    # --- 連線內 ---
+    async def _sync_subs(self, ws):
+        """把 want 與已訂閱集合的差異以 SUBSCRIBE/UNSUBSCRIBE 送出（同一連線、不重連）"""
+        want = self.want
+        added = sorted(want - self.active)
+        removed = sorted(self.active - want)
+        for method, syms in (("SUBSCRIBE", added), ("UNSUBSCRIBE", removed)):
+            if not syms:
+                continue
+            params = [st for s in syms for st in _streams_for(s)]
+            self.next_id += 1
+            self.pending[self.next_id] = (method, syms)
+            await ws.send(json.dumps({"method": method, "params": params, "id": self.next_id}))
+            self.stats["subscribe" if method == "SUBSCRIBE" else "unsubscribe"] += len(syms)
+            if method == "SUBSCRIBE":
+                self.active.update(syms)
+            else:
+                self.active.difference_update(syms)
+
+    def _on_control_reply(self, d: dict):
+        """{"result": null, "id": n}：UNSUBSCRIBE 確認之後不會再有該 stream 的訊息 → 此時才清快取"""
+        method, syms = self.pending.pop(d.get("id"), (None, ()))
+        if d.get("error"):
+            print(f"WebSocket shard {self.idx} {method} failed for {list(syms)}: {d['error']}")
+            self.stats["errors"] += 1
+            if method == "SUBSCRIBE":
+                self.active.difference_update(syms)  # 1 秒後 kick 重送（不等其他變動；持續失敗也不會狂送）
+                if self.loop is not None:
+                    self.loop.call_later(1.0, self._wake)
+            return
+        if method == "UNSUBSCRIBE":
+            for s in syms:
+                if s not in _WANT:      # 搬到別的分片的 symbol 快取要留著
+                    _drop_symbol_cache(s)
+
+    async def _control(self, ws):
+        """等 start_ws 叫醒（kick），把訂閱差異送到目前連線"""
+        while not self.stopped:
+            await self.kick.wait()
+            self.kick.clear()
+            await self._sync_subs(ws)
+
+    def _count(self, data):
+        now = time.time()
+        self.msgs += 1
+        self._sec_n += 1
+        if now - self._sec_t >= 1.0:
+            if self._sec_t:
+                r = self._sec_n / (now - self._sec_t)
+                self.rate = r if not self.rate else 0.7 * self.rate + 0.3 * r
+            self._sec_t, self._sec_n = now, 0
+        e = data.get("E") if isinstance(data, dict) else None
+        if e:
+            lag = now * 1000.0 - e
+            self.lag_ms += _LAG_ALPHA * (lag - self.lag_ms)
+            if lag > self.lag_max_ms:
+                self.lag_max_ms = lag
+
+    async def _reader(self, ws):
+        while not self.stopped:
+            self._on_frame(await asyncio.wait_for(ws.recv(), timeout=30))
+
+    def _on_frame(self, msg_raw):
+        """解一個 WS frame 並分派（同步；tools/bench_ws_decode.py 直接重播錄下的 frame）"""
+        d = _loads(msg_raw)
+
+        data = d.get("data")
+        stream_name = d.get("stream") # Get stream name to identify type
+        if not data or not stream_name:
+            if "id" in d:
+                self._on_control_reply(d)
+            return
+        self._count(data)
+
+        if stream_name == "!ticker@arr":
+            c = self.sym_msgs
+            c[stream_name] = c.get(stream_name, 0) + 1
+            _on_ticker_arr(data)
+            return
+        sym = data.get("s")
+        if sym:
+            c = self.sym_msgs
+            c[sym] = c.get(sym, 0) + 1
+            owner = _DELIVER.get(sym)
+            if owner is not self:
+                # 搬移中：新分片收到第一筆後才改用它，舊分片之後的訊息丟掉（不重複寫入快取）
+                if owner is not None and _OWNER.get(sym) is not self:
+                    return
+                _DELIVER[sym] = self
+
+        h = _ROUTES.get(stream_name)
+        (h or _route(stream_name))(data)
+
+    async def _run(self, use_testnet: bool):
+        url_base = (_HOST["test"] if use_testnet else _HOST["main"])
+        self.kick = asyncio.Event()
+
+        while not self.stopped:
+            # (重)連線時以當下的 want 組 URL；之後的變動都走 SUBSCRIBE/UNSUBSCRIBE
+            syms = sorted(self.want)
+            streams = ["!ticker@arr"] if self.all_tickers else []
+            for s in syms:
+                streams.extend(_streams_for(s))
+            if not streams:
+                # 空分片不連線，等到有 symbol 分配進來
+                await self.kick.wait()
+                self.kick.clear()
+                continue
+            url = f"{url_base}/stream?streams={'/'.join(streams)}"
+            tasks = []
+            try:
+                # close_timeout：停止時 reader 已不再讀，滿載下等不到對方的 close frame，預設要卡 10 秒
+                async with websockets.connect(url, ping_interval=15, ping_timeout=15, close_timeout=1) as ws:
+                    self.stats["connects"] += 1
+                    # 斷線期間被移除的 symbol 不會再有 UNSUBSCRIBE 確認：新連線沒訂閱它，直接清快取
+                    gone = self.active.union(*(s for m, s in self.pending.values() if m == "UNSUBSCRIBE"))
+                    self.active = set(syms)
+                    self.pending.clear()
+                    for s in gone - self.active:
+                        if s not in _WANT:      # 搬到別的分片的 symbol 快取要留著
+                            _drop_symbol_cache(s)
+                    self.kick.set()  # 連線期間 want 若已變動，立刻補送差異
+                    tasks = [asyncio.ensure_future(self._reader(ws)), asyncio.ensure_future(self._control(ws))]
+                    # 任一個結束（停止訊號 / 斷線例外）就收掉另一個，不必等 reader 的 recv 逾時
+                    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for t in pending:
+                        t.cancel()
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    for t in done:
+                        t.result()  # 把例外丟到下面的重連處理
+
+            except (asyncio.TimeoutError, websockets.exceptions.ConnectionClosed):
+                print(f"WebSocket shard {self.idx} timeout or closed, reconnecting...")
+                await asyncio.sleep(1.0) # Wait before reconnecting
+            except Exception as e:
+                print(f"WebSocket shard {self.idx} error: {e}, reconnecting...")
+                await asyncio.sleep(1.0) # Wait before reconnecting
+            finally:
+                for t in tasks:
+                    t.cancel()
+
+    def report(self) -> Dict[str, float]:
+        return {"shard": self.idx, "symbols": len(self.want), "streams": self.streams(),
+                "msgs": self.msgs, "msgs_per_s": round(self.rate, 1), "lag_ms": round(self.lag_ms, 1),
+                "lag_max_ms": round(self.lag_max_ms, 1), "pending": len(self.pending), **self.stats}
+
+
+# --- 分片分配 / 負載平衡 ---
+
+def _update_rates(now: float):
+    """把各分片累計的每 symbol 訊息數換算成 msg/s EWMA（_RATE）"""
+    dt = now - _REBALANCE["at"] if _REBALANCE["at"] else 0.0
+    for sh in _SHARDS:
+        counts, sh.sym_msgs = sh.sym_msgs, {}
+        if dt <= 0:
+            continue
+        for sym, n in counts.items():
+            r = n / dt
+            old = _RATE.get(sym)
+            _RATE[sym] = r if old is None else 0.5 * old + 0.5 * r
+    _REBALANCE["at"] = now
+
+def _load(sh: "_Shard") -> float:
+    base = _RATE.get("!ticker@arr", 0.0) if sh.all_tickers else 0.0
+    return base + sum(_RATE.get(s, 0.0) for s, o in _OWNER.items() if o is sh)
+
+def _rebalance(max_moves: int = 4, tolerance: float = 1.2) -> int:
+    """
+    把最忙分片中「訊息率約為差距一半」的 symbol 搬到最閒的分片；
+    最閒分片已達串流上限時改為交換（換回它最閒的 symbol）。回傳搬移的 symbol 數。
+    """
+    if len(_SHARDS) < 2:
+        return 0
+    loads = {sh: _load(sh) for sh in _SHARDS}
+    per_sym = len(_streams_for("x"))
+    moves = 0
+    while moves < max_moves:
+        hot = max(_SHARDS, key=loads.get)
+        cold = min(_SHARDS, key=loads.get)
+        gap = loads[hot] - loads[cold]
+        if loads[hot] <= loads[cold] * tolerance + 1.0:
+            break
+        back, r_back = None, 0.0
+        if cold.streams() + per_sym > WS_MAX_STREAMS_PER_CONN:
+            cold_syms = [s for s, o in _OWNER.items() if o is cold]
+            if not cold_syms:
+                break
+            back = min(cold_syms, key=lambda s: _RATE.get(s, 0.0))
+            r_back = _RATE.get(back, 0.0)
+        movable = [(r - r_back, s) for s, o in _OWNER.items()
+                   if o is hot and 0 < (r := _RATE.get(s, 0.0)) - r_back <= gap / 2]
+        if not movable:
+            break
+        delta, s = max(movable)
+        _OWNER[s] = cold
+        if back is not None:
+            _OWNER[back] = hot
+            moves += 1
+        loads[hot] -= delta
+        loads[cold] += delta
+        moves += 1
+    _REBALANCE["moves"] += moves
+    return moves
+
+def _assign(want: frozenset):
+    """新 symbol 放到目前負載最低、且未超過串流上限的分片；移除的 symbol 取消分配"""
+    for s in [s for s in _OWNER if s not in want]:
+        del _OWNER[s]
+    per_sym = len(_streams_for("x"))
+    counts = {sh: sum(1 for o in _OWNER.values() if o is sh) for sh in _SHARDS}
+    loads = {sh: _load(sh) for sh in _SHARDS}
+    for s in sorted(want - _OWNER.keys()):
+        room = [sh for sh in _SHARDS
+                if counts[sh] * per_sym + int(sh.all_tickers) + per_sym <= WS_MAX_STREAMS_PER_CONN]
+        sh = min(room or _SHARDS, key=lambda x: (loads[x], counts[x]))
+        _OWNER[s] = sh
+        counts[sh] += 1
+        loads[sh] += _RATE.get(s, 0.0)
 
 def start_ws(symbols: List[str], use_testnet: bool):
-    """啟動/更新訂閱；重複呼叫會更新 _SUBS 並重啟 thread。"""
-    global _WS_THREAD, _WS_STOP, _SUBS
-    syms = [s.upper() for s in symbols]
-    # Only restart if symbols actually changed or thread died
-    if syms == _SUBS and _WS_THREAD and _WS_THREAD.is_alive():
-        return
-    _SUBS = syms
-    stop_ws() # Ensure previous thread is stopped
-    _WS_STOP = False
-    def _t():
-        # Set up a new event loop for the thread
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(_run_ws(_SUBS, use_testnet))
-        finally:
-            loop.close()
+    """
+    設定要訂閱的 symbol 集合，分散到多條連線（分片）。連線已在跑時只送 SUBSCRIBE/UNSUBSCRIBE 差異
+    （不重連、不清快取），仍留在集合內的 symbol 其價格/逐筆成交歷史完整保留。
+    分片數 = max(WS_SHARDS, 串流數 / WS_MAX_STREAMS_PER_CONN)；每 WS_REBALANCE_S 秒依觀測訊息率重新平衡。
+    """
+    global _WANT, WS_PROCESS
+    want = frozenset(s.upper() for s in symbols)
+    if WS_PROCESS:
+        from shm_feed import seqlock_safe  # 延遲匯入：只有 WS_PROCESS 才需要
+        if not seqlock_safe():
+            import platform
+            print(f"--- WARNING: WS_PROCESS disabled: the shared-memory seqlock needs x86-64 memory ordering "
+                  f"(this machine: {platform.machine()}); receiving in-process instead ---")
+            WS_PROCESS = False
+    if WS_PROCESS:
+        _feed_symbols(want, use_testnet)
+    per_sym = len(_streams_for("x"))
+    shard_want = want if per_sym else frozenset()
+    n_streams = len(shard_want) * per_sym + int(WS_ALL_TICKERS)
+    need = max(1, WS_SHARDS, math.ceil(n_streams / max(1, WS_MAX_STREAMS_PER_CONN)))
+    started = 0
+    while len(_SHARDS) < need:
+        _SHARDS.append(_Shard(len(_SHARDS)))
+    for sh in _SHARDS:
+        if sh.thread is None or not sh.thread.is_alive():
+            sh.stopped = False
+            sh.start(use_testnet)
+            started += 1
+
+    _WANT = want
+    now = time.time()
+    if not _REBALANCE["at"]:
+        _REBALANCE["at"] = now
+    elif now - _REBALANCE["at"] >= WS_REBALANCE_S:
+        _update_rates(now)
+        _rebalance()
+    _assign(shard_want)
+    for sh in _SHARDS:
+        sh.set_want(frozenset(s for s, o in _OWNER.items() if o is sh))
+    if started:
+        print(f"WebSocket started: {len(want)} symbols on {len(_SHARDS)} shard(s).")
 
-    _WS_THREAD = threading.Thread(target=_t, daemon=True)
-    _WS_THREAD.start()
-    print(f"WebSocket started/restarted for {len(syms)} symbols.")
+def _feed_symbols(want: frozenset, use_testnet: bool):
+    """WS_PROCESS：第一次（或 feed 行程掛掉後）啟動 feed 行程，再把 symbol 集合交給它"""
+    global _FEED, _AGG, _BOOK
+    if _FEED is None or not _FEED.alive():
+        from shm_feed import FeedProcess  # 延遲匯入：只有 WS_PROCESS 才需要
+        if _FEED is not None:
+            print("WebSocket feed process exited, restarting...")
+            _FEED.stop()
+        _FEED = FeedProcess(WS_PROCESS_SLOTS, WS_AGG_CAPACITY, LARGE_TRADES_MERGE_S * 1000)
+        _FEED.start(use_testnet, _HOST["test" if use_testnet else "main"], BookTop, backfill=_fetch_aggtrades)
+        _AGG, _BOOK = _FEED.rings, _FEED.books
+    _FEED.set_symbols(want)
+
+def ws_rebalance(max_moves: int = 4) -> int:
+    """立即依目前觀測的訊息率重新平衡（工具/測試用）；回傳搬移數"""
+    _update_rates(time.time())
+    moves = _rebalance(max_moves)
+    if moves:
+        for sh in _SHARDS:
+            sh.set_want(frozenset(s for s, o in _OWNER.items() if o is sh))
+    return moves
+
+def ws_subscribed() -> List[str]:
+    """目前各連線上已送出訂閱的 symbol（不含 !ticker@arr）"""
+    return sorted(s for sh in _SHARDS for s in sh.active)
+
+def ws_stats() -> Dict[str, object]:
+    """每個分片的訊息率 / 延遲 / 訂閱數，以及總計"""
+    shards = [sh.report() for sh in _SHARDS]
+    return {"wanted": len(_WANT), "active": sum(len(sh.active) for sh in _SHARDS),
+            "msgs_per_s": round(sum(r["msgs_per_s"] for r in shards), 1),
+            "rebalance_moves": _REBALANCE["moves"], "backfill": dict(_BACKFILL), "shards": shards,
+            "feed": _FEED.stats() if _FEED is not None else None}
 
 
 def stop_ws():
-    """停止 WebSocket 執行緒並清除快取"""
-    global _WS_THREAD, _WS_STOP
-    _WS_STOP = True
-    if _WS_THREAD and _WS_THREAD.is_alive():
-        try:
-            _WS_THREAD.join(timeout=1.0) # Give more time to join
-        except Exception as e:
-            print(f"Error stopping WebSocket thread: {e}")
-    _WS_THREAD = None
-    _PRICE.clear() # Clear cache on stop
-    _AGG.clear()
-    _SUBS = [] # Clear subscriptions list
+    """停止所有分片並清除快取（程式結束用；換訂閱請直接呼叫 start_ws）"""
+    global _WANT, _PRICE, _BOOK, _AGG, _FEED
+    for sh in _SHARDS:
+        sh.stop()
+    deadline = time.time() + 2.0
+    for sh in _SHARDS:
+        sh.join(max(0.0, deadline - time.time()))
+    _SHARDS.clear()
+    _OWNER.clear()
+    _DELIVER.clear()
+    _RATE.clear()
+    _REBALANCE.update(at=0.0, moves=0)
+    # 換新 dict（不 clear）：還在讀舊 dict 的執行緒不會遇到迭代中被清空
+    _PRICE, _BOOK, _AGG = {}, {}, defaultdict(_new_ring)
+    _AGG_ID.clear()
+    with _GAP_LOCK:
+        _GAP.clear()
+    if _FEED is not None:
+        _FEED.stop()
+        _FEED = None
+    _WANT = frozenset()
     _RECEIVED_TICKER_SYMBOLS.clear() # <--- 新增這一行
     print("WebSocket stopped.")